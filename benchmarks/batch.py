@@ -0,0 +1,49 @@
+# coding=utf-8
+# python -m benchmarks.batch [lemmas]
+from __future__ import print_function, unicode_literals
+
+import io
+import random
+import sys
+import timeit
+
+from finnsyll import FinnSyll
+from finnsyll.syllabifier import SUFFIXES, TRAINING_FILE
+
+
+def lemma_grouped_vocabulary(n=2000, seed=0):
+    '''Return 'n' lemmas from the training data, each inflected with every
+    ending in SUFFIXES, in random order.'''
+    with io.open(TRAINING_FILE, encoding='utf-8') as f:
+        lemmas = sorted(set(w for w in f.read().split() if w.isalpha()))
+
+    random.seed(seed)
+    lemmas = random.sample(lemmas, min(n, len(lemmas)))
+    words = [lemma + suffix for lemma in lemmas for suffix in [''] + SUFFIXES]
+    random.shuffle(words)
+
+    return words
+
+
+def main(n=2000, repeat=3):
+    words = lemma_grouped_vocabulary(n)
+    F = FinnSyll(split=False)
+
+    print('%s words (%s lemmas x %s endings)' % (
+        len(words), n, len(SUFFIXES) + 1))
+
+    if F.syllabify_batch(words) != [F.syllabify(w) for w in words]:
+        raise AssertionError('Batch and per-word output differ.')
+
+    single = min(timeit.repeat(
+        lambda: [F.syllabify(w) for w in words], number=1, repeat=repeat))
+    batch = min(timeit.repeat(
+        lambda: F.syllabify_batch(words), number=1, repeat=repeat))
+
+    print('per-word: %.3f s (%.1f us/word)' % (single, 1e6 * single / len(words)))  # noqa
+    print('batch:    %.3f s (%.1f us/word)' % (batch, 1e6 * batch / len(words)))  # noqa
+    print('speedup:  %.2fx' % (single / batch))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,112 @@
+# coding=utf-8
+# python -m benchmarks.model_memory [--output ...]
+from __future__ import division, print_function, unicode_literals
+
+try:
+    import cpickle as pickle
+
+except ImportError:
+    import pickle
+
+import argparse
+import gc
+import io
+import json
+import platform
+import sys
+import tracemalloc
+
+from timeit import default_timer as timer
+
+from finnsyll import ngrams
+from finnsyll.syllabifier import LEGACY_NGRAM_FILE, NGRAM_FILE
+
+
+# Loaders ---------------------------------------------------------------------
+
+def legacy(data):
+    # the n-gram dictionary and vocabulary set, as FinnSeg used to load them
+    return pickle.loads(data)
+
+
+def slim(data):
+    # the separate n-gram tables, with just the vocabulary size
+    return ngrams.loads(data)
+
+
+# Measurement -----------------------------------------------------------------
+
+def measure(loader, filename, loads=5):
+    '''Return the memory that 'loader' allocates for the n-gram file
+    'filename' and still holds once it has loaded (in kilobytes), and its
+    fastest load time (in milliseconds).'''
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    times = []
+
+    for _ in range(loads):
+        start = timer()
+        loader(data)
+        times.append(timer() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    model = loader(data)
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del model
+
+    return {
+        'file': filename,
+        'file_kb': len(data) // 1024,
+        'resident_kb': memory // 1024,
+        'load_ms': min(times) * 1000,
+        }
+
+
+def run(log=sys.stderr):
+    '''Measure the legacy loader and the slim loader, on both the legacy
+    pickle and the slim n-gram file, returning a dictionary of results.'''
+    results = {
+        'legacy': measure(legacy, LEGACY_NGRAM_FILE),
+        'slim (legacy file)': measure(slim, LEGACY_NGRAM_FILE),
+        'slim': measure(slim, NGRAM_FILE),
+        }
+
+    for name, result in sorted(results.items()):
+        print('%-20s %8d KB resident  %8.1f ms load  %8d KB file' % (
+            name,
+            result['resident_kb'],
+            result['load_ms'],
+            result['file_kb'],
+            ), file=log)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compare the memory and load time of n-gram formats.')
+    parser.add_argument(
+        '--output', help='write the JSON results here (default: stdout)')
+    args = parser.parse_args(argv)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': run(),
+        }
+    text = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
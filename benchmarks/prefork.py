@@ -0,0 +1,142 @@
+# coding=utf-8
+# python -m benchmarks.prefork [--workers 4] [--seconds 30] [--no-preload]
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import gc
+import io
+import json
+import multiprocessing
+import platform
+import sys
+import time
+
+from finnsyll import FinnSyll
+from finnsyll.prefork import preload
+from finnsyll.syllabifier import TRAINING_FILE
+
+from .throughput import load_corpus
+
+# the memory fields of /proc/<pid>/smaps_rollup that are reported
+FIELDS = (
+    'Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean',
+    'Private_Dirty',
+    )
+
+
+# Measurement -----------------------------------------------------------------
+
+def memory():
+    '''Return this process's shared, private, and proportional memory, in
+    kilobytes (Linux only).'''
+    fields = {}
+
+    with io.open('/proc/self/smaps_rollup', encoding='utf-8') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+
+            if name in FIELDS:
+                fields[name] = int(value.split()[0])
+
+    return {
+        'rss_kb': fields['Rss'],
+        'pss_kb': fields['Pss'],
+        'shared_kb': fields['Shared_Clean'] + fields['Shared_Dirty'],
+        'private_kb': fields['Private_Clean'] + fields['Private_Dirty'],
+        }
+
+
+def work(syllabifier, corpus, seconds, results):
+    # syllabify 'corpus' over and over for 'seconds', in a forked worker,
+    # then report the worker's memory
+    deadline = time.time() + seconds
+    words = 0
+
+    while time.time() < deadline:
+        for word in corpus:
+            syllabifier.syllabify(word)
+
+        words += len(corpus)
+
+    # a long-running worker eventually runs a full collection, which touches
+    # every object that is not frozen
+    gc.collect()
+    result = memory()
+    result['words'] = words
+    results.put(result)
+
+
+# Benchmark -------------------------------------------------------------------
+
+def run(corpus, workers=4, seconds=30, preloaded=True, log=sys.stderr):
+    '''Load the models (with preload(), if 'preloaded' is True), fork
+    'workers' processes that each syllabify 'corpus' for 'seconds', and
+    return each worker's memory afterward (Linux only).'''
+    syllabifier = preload() if preloaded else FinnSyll()
+    parent = memory()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=work, args=(syllabifier, corpus, seconds, results))
+        for _ in range(workers)
+        ]
+
+    for process in processes:
+        process.start()
+
+    reports = [results.get() for _ in processes]
+
+    for process in processes:
+        process.join()
+
+    for i, report in enumerate(reports):
+        print('worker %d: shared %8d KB  private %8d KB  pss %8d KB' % (
+            i, report['shared_kb'], report['private_kb'], report['pss_kb']),
+            file=log)
+
+    return {'parent': parent, 'workers': reports}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Measure the memory that pre-forked workers share.')
+    parser.add_argument(
+        '--corpus', default=TRAINING_FILE,
+        help='whitespace-delimited corpus (default: the training data)')
+    parser.add_argument(
+        '--size', type=int, default=2000, help='words to take from --corpus')
+    parser.add_argument(
+        '--workers', type=int, default=4, help='worker processes to fork')
+    parser.add_argument(
+        '--seconds', type=float, default=30,
+        help='how long each worker syllabifies before it is measured')
+    parser.add_argument(
+        '--no-preload', action='store_true',
+        help='load the models with FinnSyll() instead of preload()')
+    parser.add_argument(
+        '--output', help='write the JSON results here (default: stdout)')
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus, args.size)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {'file': args.corpus, 'size': len(corpus)},
+        'preload': not args.no_preload,
+        'results': run(
+            corpus, args.workers, args.seconds, not args.no_preload),
+        }
+    text = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
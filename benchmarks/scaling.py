@@ -0,0 +1,253 @@
+# coding=utf-8
+# python -m benchmarks.scaling [--budget] [--output report.json]
+from __future__ import print_function, unicode_literals
+
+import argparse
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from finnsyll import Budget, FinnSyll
+from finnsyll.syllabifier import SIMPLEX_FILE, read_lexicon
+
+# Synthetic words -------------------------------------------------------------
+
+ONSETS = 'hjklmnprstv'
+SHORT_VOWELS = 'aeiouy'
+VOWEL_SEQUENCES = ['aa', 'ee', 'ii', 'oo', 'uu', 'ie', 'uo', 'ea', 'oa', 'ia']
+U_Y_FINAL_DIPHTHONGS = ['au', 'eu', 'ou', 'iu', 'ey']
+CODAS = ['', '', '', 'n', 's', 't', 'l']
+
+DEFAULTS = {
+    'syllables': 4,
+    'vowel_density': 0.25,
+    'diphthongs': 2,
+    'morphs': 1,
+    'words': 1,
+    }
+
+# without a Budget, greater values take minutes (or more) per input
+SWEEPS = {
+    'syllables': [2, 4, 8, 12],
+    'vowel_density': [0.0, 0.25, 0.5, 0.75, 1.0],
+    'diphthongs': [0, 4, 8, 12, 16, 20],
+    'morphs': [1, 2, 3],
+    'words': [1, 2, 4, 8, 12],
+    }
+
+
+def synthesize(
+        rng,
+        syllables=4,
+        vowel_density=0.25,
+        diphthongs=2,
+        morphs=1,
+        words=1,
+        lexicon=(),
+        ):
+    '''Return a synthetic Finnish-like text.
+
+    The text contains "words" words, each of which joins "morphs" stems. The
+    first stem has "syllables" CV(V)(C) syllables (or one more than
+    "diphthongs", if greater), of which "diphthongs" non-initial syllables
+    have a /u,y/-final diphthong (which T4 may split) and a proportion of
+    "vowel_density" of the rest have a vowel sequence as their nucleus; any
+    further stems are drawn from 'lexicon'.
+    '''
+    syllables = max(syllables, diphthongs + 1)
+    text = []
+
+    for _ in range(words):
+        nuclei = []
+
+        for i in range(syllables):
+            if 0 < i <= diphthongs:
+                nuclei.append(rng.choice(U_Y_FINAL_DIPHTHONGS))
+
+            elif rng.random() < vowel_density:
+                nuclei.append(rng.choice(VOWEL_SEQUENCES))
+
+            else:
+                nuclei.append(rng.choice(SHORT_VOWELS))
+
+        word = ''
+
+        for i, nucleus in enumerate(nuclei):
+            # a diphthong must be followed by a consonant for T4 to apply
+            coda = 't' if 0 < i <= diphthongs else rng.choice(CODAS)
+            word += rng.choice(ONSETS) + nucleus + coda
+
+        for _ in range(morphs - 1):
+            word += rng.choice(lexicon)
+
+        text.append(word)
+
+    return ' '.join(text)
+
+
+# Measurement -----------------------------------------------------------------
+
+def measure(func, inputs, cutoff=None, max_bytes=None):
+    '''Return the outputs, the mean seconds per input, and the peak traced
+    memory (in bytes) of applying 'func' to each of 'inputs'.
+
+    Once an input takes longer than 'cutoff' seconds or the peak exceeds
+    'max_bytes', the remaining inputs are skipped (and the means are over the
+    inputs measured).
+    '''
+    outputs = []
+    tracemalloc.start()
+    start = time.time()
+
+    for i in inputs:
+        before = time.time()
+        outputs.append(func(i))
+
+        if cutoff is not None and time.time() - before > cutoff:
+            break
+
+        if max_bytes is not None and \
+                tracemalloc.get_traced_memory()[1] > max_bytes:
+            break
+
+    seconds = (time.time() - start) / len(outputs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return outputs, seconds, peak
+
+
+def run(
+        samples=5,
+        budget=None,
+        seed=0,
+        cutoff=1.0,
+        max_bytes=256 * 1024 * 1024,
+        sweeps=SWEEPS,
+        log=sys.stderr,
+        ):
+    '''Sweep each parameter (holding the others at DEFAULTS) and return a
+    report of the time and peak memory of syllabify() (with and without
+    splitting), split(), and annotate().
+
+    Once an operation takes longer than 'cutoff' seconds for an input or
+    peaks above 'max_bytes' bytes, it is skipped for the remaining inputs and
+    the remaining (greater) values of the parameter.
+    '''
+    lexicon = [w for w in read_lexicon(SIMPLEX_FILE)[1] if len(w) > 3]
+
+    budget = Budget() if budget else None
+    F = FinnSyll(budget=budget)
+    G = FinnSyll(split=False, budget=budget)
+
+    # syllabifying without splitting isolates T4 and _syllabify_complex(),
+    # while split() isolates FinnSeg.segment()
+    operations = [
+        ('syllabify', F.syllabify),
+        ('syllabify-nosplit', G.syllabify),
+        ('split', F.split),
+        ('annotate', F.annotate),
+        ]
+    results = []
+
+    for parameter, values in sorted(sweeps.items()):
+        skipped = set()
+
+        for value in values:
+            kwargs = dict(DEFAULTS)
+            kwargs[parameter] = value
+
+            # the same seed yields the same inputs on every run
+            rng = random.Random('%s %s %s' % (seed, parameter, value))
+            inputs = [
+                synthesize(rng, lexicon=lexicon, **kwargs)
+                for _ in range(samples)
+                ]
+
+            # the number of variants, before any ranking or splitting
+            variants = None
+            rows = []
+
+            for name, func in operations:
+                if name in skipped:
+                    continue
+
+                outputs, seconds, peak = measure(
+                    func, inputs, cutoff=cutoff, max_bytes=max_bytes)
+
+                if seconds > cutoff or peak > max_bytes or \
+                        len(outputs) < len(inputs):
+                    skipped.add(name)
+
+                if name == 'syllabify-nosplit':
+                    variants = sum(map(len, outputs)) / float(len(outputs))
+
+                rows.append({
+                    'parameter': parameter,
+                    'value': value,
+                    'operation': name,
+                    'samples': len(outputs),
+                    'seconds': seconds,
+                    'peak_bytes': peak,
+                    'mean_length': sum(map(len, inputs)) / float(samples),
+                    })
+
+                print('%-14s %6s  %-17s  %10.6f s  %12d B' % (
+                    parameter, value, name, seconds, peak), file=log)
+
+            for row in rows:
+                row['mean_variants'] = variants
+
+            results.extend(rows)
+
+    return {
+        'samples': samples,
+        'seed': seed,
+        'budget': repr(budget),
+        'cutoff': cutoff,
+        'max_bytes': max_bytes,
+        'defaults': DEFAULTS,
+        'results': results,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Measure how FinnSyll scales on pathological input.')
+    parser.add_argument(
+        '--samples', type=int, default=5, help='inputs per parameter value')
+    parser.add_argument(
+        '--seed', type=int, default=0, help='random seed')
+    parser.add_argument(
+        '--cutoff', type=float, default=1.0,
+        help='seconds per input after which to stop growing a parameter')
+    parser.add_argument(
+        '--max-bytes', type=int, default=256 * 1024 * 1024,
+        help='peak memory after which to stop growing a parameter')
+    parser.add_argument(
+        '--budget', action='store_true', help='apply the default Budget')
+    parser.add_argument(
+        '--output', help='write the JSON report here (default: stdout)')
+    args = parser.parse_args(argv)
+
+    report = run(
+        samples=args.samples,
+        budget=args.budget,
+        seed=args.seed,
+        cutoff=args.cutoff,
+        max_bytes=args.max_bytes,
+        )
+
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(report, indent=2, sort_keys=True))
+
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+# coding=utf-8
+# python -m benchmarks.throughput [--baseline baseline.json] [--output ...]
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import io
+import itertools
+import json
+import platform
+import resource
+import subprocess
+import sys
+
+from timeit import default_timer as timer
+
+from finnsyll import FinnSeg, FinnSyll
+from finnsyll.syllabifier import TRAINING_FILE
+
+KWARGS = ('split', 'variation', 'rules', 'stress')
+
+
+# Corpus ----------------------------------------------------------------------
+
+def load_corpus(filename=TRAINING_FILE, size=2000):
+    '''Return a fixed corpus of 'size' words, taken at even intervals from
+    'filename' (by default, the training data), so that the same file always
+    yields the same corpus.'''
+    with io.open(filename, encoding='utf-8') as f:
+        words = f.read().split()
+
+    step = max(1, len(words) // size)
+
+    return words[::step][:size]
+
+
+# Measurement -----------------------------------------------------------------
+
+def percentile(latencies, p):
+    '''Return the p-th percentile of the sorted 'latencies'.'''
+    i = int(round(p / 100.0 * (len(latencies) - 1)))
+
+    return latencies[i]
+
+
+def peak_rss():
+    '''Return the peak resident set size of this process, in kilobytes.'''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # macOS reports bytes, Linux kilobytes
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def summarize(latencies, words):
+    '''Return the throughput and latency statistics of a run, given the
+    latency of each call (in seconds) and the number of words processed.'''
+    latencies = sorted(latencies)
+    total = sum(latencies)
+
+    return {
+        'calls': len(latencies),
+        'words_per_second': words / total if total else None,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_rss_kb': peak_rss(),
+        }
+
+
+def per_word(func, corpus):
+    '''Time 'func' on each word of 'corpus'.'''
+    latencies = []
+
+    for word in corpus:
+        start = timer()
+        func(word)
+        latencies.append(timer() - start)
+
+    return summarize(latencies, len(corpus))
+
+
+def per_batch(func, corpus, size=100):
+    '''Time 'func' on batches of 'size' words from 'corpus'.'''
+    latencies = []
+
+    for i in range(0, len(corpus), size):
+        batch = corpus[i:i + size]
+        start = timer()
+        func(batch)
+        latencies.append(timer() - start)
+
+    return summarize(latencies, len(corpus))
+
+
+def repeated(func, n):
+    '''Time 'n' calls of 'func', which each process a single "word".'''
+    return per_word(lambda _: func(), [None] * n)
+
+
+def cold_import():
+    # time importing finnsyll in a fresh interpreter
+    start = timer()
+    subprocess.check_call([sys.executable, '-c', 'import finnsyll'])
+
+    return timer() - start
+
+
+# Benchmarks ------------------------------------------------------------------
+
+def run(corpus, loads=3, log=sys.stderr):
+    '''Run each benchmark on 'corpus', returning a dictionary of results.'''
+    results = {}
+
+    def record(name, result):
+        results[name] = result
+        print('%-66s %9.0f words/s  p50 %8.3f ms  p99 %8.3f ms  %8d KB' % (
+            name,
+            result['words_per_second'] or 0,
+            result['p50_ms'],
+            result['p99_ms'],
+            result['peak_rss_kb'],
+            ), file=log)
+
+    latencies = [cold_import() for _ in range(loads)]
+    record('import (cold)', summarize(latencies, loads))
+    record('FinnSeg()', repeated(FinnSeg, loads))
+
+    # every combination of the FinnSyll kwargs
+    for values in itertools.product([True, False], repeat=len(KWARGS)):
+        kwargs = dict(zip(KWARGS, values))
+        F = FinnSyll(**kwargs)
+        name = 'syllabify(%s)' % ', '.join(
+            '%s=%s' % (k, kwargs[k]) for k in KWARGS)
+        record(name, per_word(F.syllabify, corpus))
+
+    F = FinnSyll()
+    record('split', per_word(F.split, corpus))
+    record('annotate', per_word(F.annotate, corpus))
+    record('is_complex', per_word(F.is_complex, corpus))
+    record('syllabify_batch', per_batch(F.syllabify_batch, corpus))
+    record('is_complex_batch', per_batch(F.is_complex_batch, corpus))
+
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    '''Return a list of regressions from 'baseline' to 'results', i.e.,
+    benchmarks whose throughput fell or whose p99 latency rose by more than
+    'tolerance' (a proportion).'''
+    regressions = []
+
+    for name, old in sorted(baseline.items()):
+        new = results.get(name)
+
+        if not new:
+            continue
+
+        if old['words_per_second'] and new['words_per_second'] and (
+                new['words_per_second'] < old['words_per_second'] * (
+                    1 - tolerance)):
+            regressions.append('%s: %.0f -> %.0f words/s' % (
+                name, old['words_per_second'], new['words_per_second']))
+
+        if new['p99_ms'] > old['p99_ms'] * (1 + tolerance):
+            regressions.append('%s: p99 %.3f -> %.3f ms' % (
+                name, old['p99_ms'], new['p99_ms']))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Measure FinnSyll throughput and latency.')
+    parser.add_argument(
+        '--corpus', default=TRAINING_FILE,
+        help='whitespace-delimited corpus (default: the training data)')
+    parser.add_argument(
+        '--size', type=int, default=2000, help='words to take from --corpus')
+    parser.add_argument(
+        '--loads', type=int, default=3,
+        help='repetitions of the import and model load benchmarks')
+    parser.add_argument(
+        '--output', help='write the JSON results here (default: stdout)')
+    parser.add_argument(
+        '--baseline', help='compare against these saved JSON results')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help='proportional slowdown to flag as a regression')
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus, args.size)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {'file': args.corpus, 'size': len(corpus)},
+        'results': run(corpus, loads=args.loads),
+        }
+    text = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    else:
+        print(text)
+
+    if args.baseline:
+        with io.open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+        regressions = compare(
+            report['results'], baseline['results'], args.tolerance)
+
+        for regression in regressions:
+            print('REGRESSION ' + regression, file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
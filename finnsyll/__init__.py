@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
-__all__ = ['FinnSyll', 'FinnSeg']
+__all__ = ['Budget', 'FinnSyll', 'FinnSeg']
 
+from .budget import Budget
 from .syllabifier import FinnSyll, FinnSeg
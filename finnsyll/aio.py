@@ -0,0 +1,289 @@
+# coding=utf-8
+# (Python 3 only)
+import asyncio
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .syllabifier import FinnSyll
+
+# the FinnSyll object of each worker process (see _initialize())
+_syllabifier = None
+
+
+def _initialize(kwargs):
+    global _syllabifier
+
+    _syllabifier = FinnSyll(**kwargs)
+
+
+def _run(method, words):
+    # apply 'method' to each of 'words', in a worker process
+    if method == 'syllabify':
+        return _syllabifier.syllabify_batch(words)
+
+    return [getattr(_syllabifier, method)(w) for w in words]
+
+
+def _copy(result):
+    # return a copy of 'result' that the caller may change without changing
+    # the cached result (the lists' items are immutable)
+    return list(result) if isinstance(result, list) else result
+
+
+def _call_soon(loop, callback):
+    # call 'callback' in the thread of 'loop', unless the loop is closed
+    try:
+        loop.call_soon_threadsafe(callback)
+
+    except RuntimeError:
+        pass
+
+
+class AsyncFinnSyll(object):
+    '''An asyncio wrapper around FinnSyll, which runs the work in a pool of
+    'workers' processes (by default, one per CPU) so that long texts do not
+    block the event loop.
+
+    Any other kwargs (split, variation, etc.) are passed to the FinnSyll
+    object of each worker.
+
+    At most 'max_pending' jobs are run in the pool at once; any further jobs
+    wait their turn (backpressure). Each call may take a 'timeout' in seconds
+    (by default, the 'timeout' given here), after which it raises
+    asyncio.TimeoutError. Work whose callers have all timed out or been
+    cancelled is withdrawn from the pool if it has not yet started;
+    otherwise, it keeps its turn until it finishes, and its result is
+    discarded.
+
+    Results are cached in this process (up to 'cache_size' of them), so that
+    hot words return without a round trip to the pool, and concurrent calls
+    for the same word share a single round trip (each caller still waits no
+    longer than its own timeout). Each call returns its own copy of a cached
+    result. To pick up retrained models, call reload().
+    '''
+
+    def __init__(
+        self,
+        workers=None,
+        max_pending=64,
+        timeout=None,
+        cache_size=65536,
+        **kwargs
+            ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._kwargs = kwargs
+        self._executor = self._start()
+        self._semaphore = None  # created in the event loop (see _submit())
+        self._cache = {}  # (method, word): result
+        self._pending = {}  # (method, word): (asyncio.Future, index)
+        self._waiters = {}  # asyncio.Future: number of callers awaiting it
+
+    def __repr__(self):
+        return '<AsyncFinnSyll: workers=%s max_pending=%s>' % (
+            self.workers, self.max_pending)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        '''Shut down the worker processes.'''
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown)
+
+    def reload(self):
+        '''Start a new pool of workers, which load the models afresh, and
+        discard the cached results. Calls already in progress finish in the
+        old pool, which then shuts down; their results are not cached.'''
+        executor, self._executor = self._executor, self._start()
+        executor.shutdown(wait=False)
+        self._cache, self._pending = {}, {}
+
+    def _start(self):
+        return ProcessPoolExecutor(
+            self.workers, initializer=_initialize, initargs=(self._kwargs, ))
+
+    # public methods ----------------------------------------------------------
+
+    async def syllabify(self, word, timeout=None):
+        '''Return FinnSyll.syllabify() of 'word'.'''
+        return await self._call('syllabify', word, timeout)
+
+    async def split(self, word, timeout=None):
+        '''Return FinnSyll.split() of 'word'.'''
+        return await self._call('split', word, timeout)
+
+    async def annotate(self, word, timeout=None):
+        '''Return FinnSyll.annotate() of 'word'.'''
+        return await self._call('annotate', word, timeout)
+
+    async def is_complex(self, word, timeout=None):
+        '''Return FinnSyll.is_complex() of 'word'.'''
+        return await self._call('is_complex', word, timeout)
+
+    async def syllabify_batch(self, words, timeout=None):
+        '''Return FinnSyll.syllabify() of each of 'words', as a list.'''
+        return await self._call_batch('syllabify', words, timeout)
+
+    async def is_complex_batch(self, words, timeout=None):
+        '''Return FinnSyll.is_complex() of each of 'words', as a list.'''
+        return await self._call_batch('is_complex', words, timeout)
+
+    # execution ---------------------------------------------------------------
+
+    async def _call(self, method, word, timeout):
+        key = (method, word)
+
+        try:
+            return _copy(self._cache[key])
+
+        except KeyError:
+            pass
+
+        future, i = self._pending.get(key) or (self._submit(method, [key]), 0)
+        await self._wait([future], timeout)
+
+        return _copy(future.result()[i])
+
+    async def _call_batch(self, method, words, timeout):
+        words = list(words)
+        results = {}  # key: result, for cached words
+        slots = {}  # key: (future, index), for words to compute
+        keys = []
+
+        for word in words:
+            key = (method, word)
+
+            if key in results or key in slots:
+                continue
+
+            if key in self._cache:
+                results[key] = self._cache[key]
+
+            elif key in self._pending:
+                slots[key] = self._pending[key]
+
+            else:
+                keys.append(key)
+
+        # submit the rest in a chunk per worker
+        size = max(1, -(-len(keys) // self.workers))
+
+        for i in range(0, len(keys), size):
+            chunk = keys[i:i + size]
+            future = self._submit(method, chunk)
+            slots.update((key, (future, j)) for j, key in enumerate(chunk))
+
+        await self._wait(set(f for f, _ in slots.values()), timeout)
+
+        for key, (future, i) in slots.items():
+            results[key] = future.result()[i]
+
+        return [_copy(results[(method, w)]) for w in words]
+
+    def _submit(self, method, keys):
+        # schedule the words of 'keys' to run in the pool, registering the
+        # returned future under 'keys' until it is done
+        future = asyncio.ensure_future(
+            self._run(method, [w for _, w in keys]))
+
+        # reload() replaces both dictionaries, so that work begun before
+        # reloading is neither shared nor cached afterwards
+        cache, pending = self._cache, self._pending
+
+        for i, key in enumerate(keys):
+            pending[key] = future, i
+
+        def done(future):
+            # a cancelled future may already have made way for another
+            for key in keys:
+                if pending.get(key, (None, ))[0] is future:
+                    del pending[key]
+
+            if cache is self._cache and not future.cancelled() and \
+                    future.exception() is None:
+                self._store(keys, future.result())
+
+        future.add_done_callback(done)
+
+        return future
+
+    async def _wait(self, futures, timeout):
+        # wait for 'futures', which may be shared with other callers, for up
+        # to 'timeout' seconds (by default, self.timeout); if the caller times
+        # out or is cancelled, cancel any futures that no one else awaits
+        if not futures:
+            return
+
+        timeout = self.timeout if timeout is None else timeout
+
+        for future in futures:
+            self._waiters[future] = self._waiters.get(future, 0) + 1
+
+        # the futures outlive a caller that gives up on them, so retrieve
+        # their outcome regardless
+        gathered = asyncio.gather(*futures)
+        gathered.add_done_callback(
+            lambda f: f.cancelled() or f.exception())
+        abandoned = False
+
+        try:
+            await asyncio.wait_for(asyncio.shield(gathered), timeout)
+
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            abandoned = True
+            raise
+
+        finally:
+            for future in futures:
+                self._waiters[future] -= 1
+
+                if not self._waiters[future]:
+                    del self._waiters[future]
+
+                    # withdraw the future before cancelling it, so that no
+                    # new caller joins it while it is being cancelled
+                    if abandoned:
+                        for key, (f, _) in list(self._pending.items()):
+                            if f is future:
+                                del self._pending[key]
+
+                        future.cancel()
+
+    async def _run(self, method, words):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore
+        await semaphore.acquire()
+
+        try:
+            job = self._executor.submit(_run, method, words)
+
+        except BaseException:
+            semaphore.release()
+            raise
+
+        # a job that is cancelled once it is running runs to the end anyway,
+        # so release its turn when it is done, rather than when its future is
+        # cancelled
+        job.add_done_callback(
+            lambda _: _call_soon(loop, semaphore.release))
+
+        return await asyncio.wrap_future(job)
+
+    def _store(self, keys, results):
+        if not self.cache_size:
+            return
+
+        if len(self._cache) + len(keys) > self.cache_size:
+            self._cache.clear()
+
+        self._cache.update(zip(keys, results))
@@ -0,0 +1,112 @@
+# coding=utf-8
+# python -m finnsyll.bake [--morfessor FILE] [--ngrams FILE] [--weights FILE]
+#     [--output FILE]
+from __future__ import print_function, unicode_literals
+
+try:
+    from os import replace
+
+except ImportError:  # Python 2
+
+    def replace(src, dst):
+        # os.rename() replaces 'dst' atomically on POSIX, but refuses to
+        # replace it on Windows, where it must be removed first
+        if os.name == 'nt' and exists(dst):
+            os.remove(dst)
+
+        os.rename(src, dst)
+
+import argparse
+import os
+import stat
+import sys
+import tempfile
+
+from os.path import abspath, dirname, exists
+from timeit import default_timer as timer
+
+from .phonology import load_weights
+from .syllabifier import (
+    COMPILED_FILE,
+    MORFESSOR_FILE,
+    NGRAM_FILE,
+    CompiledModel,
+    LanguageModel,
+    )
+
+
+def bake(
+    output=COMPILED_FILE,
+    morfessor_file=MORFESSOR_FILE,
+    ngram_file=NGRAM_FILE,
+    weights=None,
+        ):
+    '''Compile the Morfessor model 'morfessor_file', the n-gram counts
+    'ngram_file' (slim or legacy), and any constraint 'weights' (a file; see
+    phonology.load_weights()) into the file 'output', and return the model's
+    version.
+
+    The file is replaced atomically (except under Python 2 on Windows), so
+    that a FinnSeg watching it (see FinnSeg.watch()) never reads it
+    half-written.
+    '''
+    directory = dirname(abspath(output))
+    lm = LanguageModel(morfessor_file, ngram_file)
+    data = lm.compile(
+        load_weights(weights) if weights else None,
+        directory,
+        )
+    fd, temp = tempfile.mkstemp(dir=directory)
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        # mkstemp() makes the file private; keep the mode of the file it
+        # replaces, or make it world-readable like the other models
+        try:
+            mode = stat.S_IMODE(os.stat(output).st_mode)
+
+        except OSError:
+            mode = 0o644
+
+        os.chmod(temp, mode)
+        replace(temp, output)
+
+    except Exception:
+        os.remove(temp)
+        raise
+
+    return lm.version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compile the segmenter\'s models into a single file.')
+    parser.add_argument(
+        '--morfessor', default=MORFESSOR_FILE,
+        help='Morfessor binary model or compiled lexicon')
+    parser.add_argument(
+        '--ngrams', default=NGRAM_FILE, help='slim or legacy n-gram file')
+    parser.add_argument('--weights', help='TSV file of constraint weights')
+    parser.add_argument(
+        '--output', default=COMPILED_FILE,
+        help='write the compiled model here (default: the bundled model)')
+    args = parser.parse_args(argv)
+
+    version = bake(args.output, args.morfessor, args.ngrams, args.weights)
+
+    start = timer()
+    CompiledModel.open(args.output)
+    seconds = timer() - start
+
+    print('%s: version %s, %d KB, loads in %.1f ms' % (
+        args.output,
+        version,
+        os.path.getsize(args.output) // 1024,
+        seconds * 1000,
+        ), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
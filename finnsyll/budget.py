@@ -0,0 +1,98 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+import copy
+import time
+
+
+class Budget(object):
+    '''Limits on the work done for a single input.
+
+    Some inputs blow up combinatorially: many /u,y/-final diphthongs multiply
+    T4's variants, many morphemes multiply the segmenter's candidates, and
+    many words multiply the variants of a text. A Budget caps this work:
+
+        max_variants    the most variants to produce for a single word or text
+        max_candidates  the most candidate segmentations to score for a single
+                        component
+        max_length      the longest component (in characters) to segment
+        seconds         the time allotted to a single call
+
+    Any limit set to None is lifted; any other limit must be positive. When a
+    limit is hit, the result degrades deterministically:
+
+        - T4 keeps only "max_variants" of its variants, starting from the
+          variant that splits no diphthongs
+        - a text whose words would combine into more than "max_variants"
+          variants keeps only the most preferred variant of each word
+        - a component that is too long or has too many candidates is left
+          unsegmented (i.e., the simplex fallback)
+        - once the time is spent, any remaining components are left
+          unsegmented and any remaining words keep only their first variant
+
+    The names of the limits that were hit are collected in "degraded".
+    '''
+
+    def __init__(
+        self,
+        max_variants=256,
+        max_candidates=1024,
+        max_length=64,
+        seconds=None,
+            ):
+        for limit, maximum in [
+                ('max_variants', max_variants),
+                ('max_candidates', max_candidates),
+                ('max_length', max_length),
+                ('seconds', seconds),
+                ]:
+            if maximum is not None and maximum <= 0:
+                raise ValueError('%s must be positive: %r' % (limit, maximum))
+
+        self.max_variants = max_variants
+        self.max_candidates = max_candidates
+        self.max_length = max_length
+        self.seconds = seconds
+        self.deadline = None
+        self.degraded = set()
+
+    def __repr__(self):
+        return (
+            '<Budget: max_variants=%s max_candidates=%s max_length=%s '
+            'seconds=%s>' % (
+                self.max_variants,
+                self.max_candidates,
+                self.max_length,
+                self.seconds,
+                ))
+
+    def start(self):
+        '''Return a copy of this budget for a single call, with its clock
+        started.'''
+        budget = copy.copy(self)
+        budget.degraded = set()
+
+        if self.seconds is not None:
+            budget.deadline = time.time() + self.seconds
+
+        return budget
+
+    def exceeded(self, limit, amount):
+        '''Return True if 'amount' exceeds the limit named 'limit' (e.g.,
+        'max_variants'), recording the limit as hit; else, False.'''
+        maximum = getattr(self, limit)
+
+        if maximum is not None and amount > maximum:
+            self.degraded.add(limit)
+            return True
+
+        return False
+
+    def expired(self):
+        '''Return True if the time allotted to this call is spent, recording
+        the time limit as hit; else, False.'''
+        if self.deadline is not None and time.time() > self.deadline:
+            self.degraded.add('seconds')
+            return True
+
+        return False
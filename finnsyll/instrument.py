@@ -0,0 +1,208 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+import atexit
+import io
+import json
+import os
+import random
+import sys
+import threading
+
+from collections import defaultdict
+from functools import wraps
+from inspect import isgeneratorfunction
+from timeit import default_timer as timer
+
+# if the FINNSYLL_DEV environment variable is set when finnsyll is imported,
+# record the cumulative time and number of calls of each pipeline stage (see
+# timed()); otherwise, the stages run uninstrumented
+DEV = bool(os.environ.get('FINNSYLL_DEV'))
+
+# if the FINNSYLL_DEV_DUMP environment variable is also set, dump the stats
+# to the file it names ('-' for stderr) when the interpreter exits
+DUMP = os.environ.get('FINNSYLL_DEV_DUMP')
+
+# stage: [calls, seconds]
+STATS = defaultdict(lambda: [0, 0.0])
+
+
+def timed(stage):
+    '''Return a decorator that records each call of a function under 'stage'
+    if DEV is True, or else returns the function untouched (so that disabled
+    instrumentation costs nothing).
+
+    The time of a generator function covers producing each of its items, but
+    not whatever the caller does in between.
+    '''
+    def decorator(func):
+        if not DEV:
+            return func
+
+        if isgeneratorfunction(func):
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = timer()
+                items = func(*args, **kwargs)
+                seconds = timer() - start
+
+                try:
+                    while True:
+                        start = timer()
+
+                        try:
+                            item = next(items)
+
+                        except StopIteration:
+                            break
+
+                        finally:
+                            seconds += timer() - start
+
+                        yield item
+
+                finally:
+                    _record(stage, seconds)
+
+        else:
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = timer()
+
+                try:
+                    return func(*args, **kwargs)
+
+                finally:
+                    _record(stage, timer() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def _record(stage, seconds):
+    stat = STATS[stage]
+    stat[0] += 1
+    stat[1] += seconds
+
+
+def stats():
+    '''Return the number of calls and cumulative seconds of each stage, e.g.,
+    {'T1': {'calls': 12, 'seconds': 0.0004}, ...}.'''
+    return {
+        stage: {'calls': calls, 'seconds': seconds}
+        for stage, (calls, seconds) in STATS.items()
+        }
+
+
+def reset_stats():
+    '''Discard all recorded stats.'''
+    STATS.clear()
+
+
+def dump(filename='-'):
+    '''Write the stats as JSON to 'filename' ('-' for stderr).'''
+    text = json.dumps(stats(), indent=2, sort_keys=True)
+
+    if filename == '-':
+        sys.stderr.write(text + '\n')
+
+    else:
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+if DEV and DUMP:
+    atexit.register(dump, DUMP)
+
+
+# Tracing ---------------------------------------------------------------------
+
+# registered hooks, as (callback, rate) tuples (see add_hook())
+HOOKS = ()
+
+# True if any hooks are registered; callers check this before building an
+# event, so that tracing costs a single branch when unused, e.g.:
+#
+#   if instrument.TRACING:
+#       instrument.emit('T4', word=word, variants=len(WORDS))
+#
+TRACING = False
+
+
+# the hooks sampled for the top-level call in progress on each thread (see
+# traced())
+_sampled = threading.local()
+
+
+def add_hook(callback, rate=1.0):
+    '''Register 'callback' to receive tracing events, sampled with probability
+    'rate' per top-level call (see traced()), so that a sampled call delivers
+    all of its events.
+
+    Each event is passed to 'callback' as a dictionary, e.g.:
+
+        {'event': 'T4', 'word': 'lau.kaus', 'variants': 2}
+
+    The events are:
+
+        T4       T4 produced "variants" variants of "word"
+        rank     rank() ordered "variants" into "ranked" ("reordered" is
+                 True if the order changed)
+        segment  FinnSeg scored "candidates" candidate segmentations of
+                 "component", of which "survived" survived the constraints,
+                 and chose "segmentation"
+    '''
+    global HOOKS, TRACING
+
+    HOOKS = HOOKS + ((callback, rate), )
+    TRACING = True
+
+
+def remove_hook(callback):
+    '''Unregister 'callback'.'''
+    global HOOKS, TRACING
+
+    HOOKS = tuple(h for h in HOOKS if h[0] != callback)
+    TRACING = bool(HOOKS)
+
+
+def _sample():
+    # return the callbacks of the hooks that sample the current call
+    return tuple(
+        callback for callback, rate in HOOKS
+        if rate >= 1.0 or random.random() < rate
+        )
+
+
+def traced(func):
+    '''Decorate 'func' as a top-level call, for which each hook is sampled
+    once: the events emitted during the call (including any nested top-level
+    calls) go to the same hooks.'''
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not TRACING or getattr(_sampled, 'hooks', None) is not None:
+            return func(*args, **kwargs)
+
+        _sampled.hooks = _sample()
+
+        try:
+            return func(*args, **kwargs)
+
+        finally:
+            _sampled.hooks = None
+
+    return wrapper
+
+
+def emit(event, **fields):
+    '''Pass the event named 'event', with 'fields', to each hook sampled for
+    the current top-level call (or, outside of one, to each hook sampled for
+    this event alone).'''
+    fields['event'] = event
+    hooks = getattr(_sampled, 'hooks', None)
+
+    for callback in _sample() if hooks is None else hooks:
+        callback(dict(fields))
@@ -0,0 +1,144 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+try:
+    import cpickle as pickle
+
+except ImportError:
+    import pickle
+
+import sys
+
+from array import array
+
+try:
+    array('Q')
+    _KEY_TYPECODE = 'Q'
+
+except ValueError:  # Python 2, whose 'L' is as wide on 64-bit Unix
+    _KEY_TYPECODE = 'L'
+
+# N-gram tables ---------------------------------------------------------------
+
+# The segmenter's language model counts morph unigrams, bigrams, and
+# trigrams. Each morph has an id (its index in the list of morphs), and the
+# counts of each order are kept in their own table:
+#
+#   unigrams: an array of counts, indexed by morph id
+#   bigrams: a dictionary of counts, keyed by key(B, C)
+#   trigrams: a dictionary of counts, keyed by key(A, B, C)
+#
+# where key() combines morph ids into a single int (see key()). The legacy
+# pickle instead holds one dictionary of counts, keyed by space-joined morphs,
+# plus the full set of morphs, of which only the size is ever used.
+
+# the first bytes of a slim n-gram file (see dumps())
+MAGIC = b'FSYLNGR1'
+
+
+def key(size, *ids):
+    '''Return the table key of the morph 'ids', given the number of morphs
+    'size'.'''
+    k = 0
+
+    for i in ids:
+        k = k * size + i
+
+    return k
+
+
+def split_orders(ngrams):
+    '''Return the ids, unigram counts, bigram counts, and trigram counts of
+    the legacy dictionary 'ngrams'.'''
+    unigrams = sorted(k for k in ngrams if ' ' not in k)
+    ids = dict(zip(unigrams, range(len(unigrams))))
+    size = len(ids)
+    bigrams, trigrams = {}, {}
+
+    for ngram, count in ngrams.items():
+        morphs = ngram.split(' ')
+
+        if len(morphs) == 2:
+            bigrams[key(size, *map(ids.get, morphs))] = count
+
+        elif len(morphs) == 3:
+            trigrams[key(size, *map(ids.get, morphs))] = count
+
+    counts = array('I', [ngrams[m] for m in unigrams])
+
+    return ids, counts, bigrams, trigrams
+
+
+def dumps(ids, unigrams, bigrams, trigrams, total):
+    '''Return the n-gram tables and total morph count as a slim n-gram
+    file.'''
+    morphs = sorted(ids, key=ids.get)
+
+    return MAGIC + pickle.dumps((
+        sys.byteorder,
+        total,
+        '\n'.join(morphs),
+        _bytes('I', unigrams),
+        _bytes(_KEY_TYPECODE, bigrams.keys()),
+        _bytes('I', bigrams.values()),
+        _bytes(_KEY_TYPECODE, trigrams.keys()),
+        _bytes('I', trigrams.values()),
+        ), 2)
+
+
+def _bytes(typecode, values):
+    a = array(typecode, values)
+
+    try:
+        return a.tobytes()
+
+    except AttributeError:  # Python 2
+        return a.tostring()
+
+
+def _array(typecode, data, byteorder):
+    a = array(typecode)
+
+    try:
+        a.frombytes(data)
+
+    except AttributeError:  # Python 2
+        a.fromstring(data)
+
+    if byteorder != sys.byteorder:
+        a.byteswap()
+
+    return a
+
+
+def loads(data):
+    '''Return the ids, unigram counts, bigram counts, trigram counts, and
+    total morph count of the slim or legacy n-gram file 'data'.'''
+    if not data.startswith(MAGIC):
+        ngrams, _, total = pickle.loads(data)
+
+        return split_orders(ngrams) + (total, )
+
+    byteorder, total, morphs, unigrams, b_keys, b_counts, t_keys, t_counts = \
+        pickle.loads(data[len(MAGIC):])
+    morphs = morphs.split('\n') if morphs else []
+
+    return (
+        dict(zip(morphs, range(len(morphs)))),
+        _array('I', unigrams, byteorder),
+        dict(zip(_array(_KEY_TYPECODE, b_keys, byteorder),
+                 _array('I', b_counts, byteorder))),
+        dict(zip(_array(_KEY_TYPECODE, t_keys, byteorder),
+                 _array('I', t_counts, byteorder))),
+        total,
+        )
+
+
+def convert(legacy, output):
+    '''Convert the legacy n-gram pickle 'legacy' into the slim n-gram file
+    'output'.'''
+    with open(legacy, 'rb') as f:
+        tables = loads(f.read())
+
+    with open(output, 'wb') as f:
+        f.write(dumps(*tables))
@@ -1,7 +1,10 @@
 # coding=utf-8
 from __future__ import unicode_literals
+from .instrument import timed
 from .utilities import FLAGS
 
+import io
+import math
 import re
 
 
@@ -34,6 +37,21 @@ ONSETS = [
     ]
 
 
+# Regex -----------------------------------------------------------------------
+
+# the firstmost vowel
+VOWEL = re.compile(r'([ieaouäöy]{1})', flags=FLAGS)
+
+# a light (CV) syllable
+LIGHT = re.compile(r'(^|[^ieaouäöy]+)[ieaouäöy]{1}$', flags=FLAGS)
+
+# vowel/consonant chunking
+VOWEL_SPLIT = re.compile(r'([ieaouäöy]+)', flags=FLAGS)
+
+# constituent delimiters
+CONSTITUENT_SPLIT = re.compile(r'-| |=')
+
+
 # Phonotactic functions -------------------------------------------------------
 
 def is_vowel(ch):
@@ -41,6 +59,11 @@ def is_vowel(ch):
     return ch.lower() in VOWELS
 
 
+def count_vowels(word):
+    '''Return the number of Finnish vowels in 'word'.'''
+    return len(VOWEL.findall(word))
+
+
 def is_diphthong(chars):
     '''Return True if 'chars' is a Finnish diphthong.'''
     return chars.lower() in DIPHTHONGS
@@ -87,7 +110,7 @@ def is_sonorant(ch):
 
 def get_vowel(syll):
     '''Return the firstmost vowel in 'syll'.'''
-    return re.search(r'([ieaouäöy]{1})', syll, flags=FLAGS).group(1).upper()
+    return VOWEL.search(syll).group(1).upper()
 
 
 def get_weight(syll):
@@ -97,7 +120,7 @@ def get_weight(syll):
 
 def is_light(syll):
     '''Return True if 'syll' is light.'''
-    return re.match(r'(^|[^ieaouäöy]+)[ieaouäöy]{1}$', syll, flags=FLAGS)
+    return LIGHT.match(syll)
 
 
 def is_heavy(syll):
@@ -105,6 +128,7 @@ def is_heavy(syll):
     return not is_light(syll)
 
 
+@timed('stress')
 def stress(syllabified_simplex_word):
     '''Assign primary and secondary stress to 'syllabified_simplex_word'.'''
     syllables = syllabified_simplex_word.split('.')
@@ -153,7 +177,7 @@ def min_word(word):
 
 def sonseq(word):
     '''Return True if 'word' does not violate sonority sequencing.'''
-    parts = re.split(r'([ieaouäöy]+)', word, flags=re.I | re.U)
+    parts = VOWEL_SPLIT.split(word)
     onset, coda = parts[0], parts[-1]
 
     #  simplex onset      Finnish complex onset
@@ -203,6 +227,77 @@ CONSTRAINTS = [
     ]
 
 
+# Harmonic Grammar ------------------------------------------------------------
+
+def load_weights(filename):
+    '''Load constraint weights from the TSV file 'filename', e.g.:
+
+        MnWrd\t4.5
+        SonSeq\t2.0
+
+    Return a dictionary mapping constraint names to weights.
+    '''
+    weights = {}
+
+    with io.open(filename, encoding='utf-8') as f:
+        for n, line in enumerate(f, start=1):
+            fields = line.split()
+
+            if not fields:
+                continue
+
+            try:
+                name, weight = fields
+                weights[name] = float(weight)
+
+            except ValueError:
+                raise ValueError(
+                    '%s, line %s: expected a name and a weight' % (
+                        filename, n))
+
+    return weights
+
+
+def weigh(constraints, weights):
+    '''Return copies of 'constraints' with the weights in the dictionary
+    'weights'; any constraint missing from 'weights' keeps its weight.'''
+    return [
+        Constraint(c.name, c.test, weights.get(c.name, c.weight))
+        for c in constraints
+        ]
+
+
+def harmony(tableau, weights):
+    '''Return the harmony of each candidate in 'tableau'.
+
+    The tableau holds one row of violation counts per constraint, with one
+    column per candidate, and 'weights' holds one weight per constraint. A
+    candidate's harmony is the negated sum of its weighted violations.
+    '''
+    harmonies = [0.0] * len(tableau[0]) if tableau else []
+
+    for weight, row in zip(weights, tableau):
+        if weight:
+            for j, violations in enumerate(row):
+                harmonies[j] -= weight * violations
+
+    return harmonies
+
+
+def maxent(harmonies):
+    '''Return the Maximum Entropy probability of each candidate, given the
+    candidates' harmonies.'''
+    if not harmonies:
+        return []
+
+    # subtract the highest harmony to avoid overflow
+    top = max(harmonies)
+    scores = [math.exp(h - top) for h in harmonies]
+    total = sum(scores)
+
+    return [s / total for s in scores]
+
+
 # Foreign word detection ------------------------------------------------------
 
 def is_foreign(word):
@@ -230,7 +325,7 @@ def _has_foreign_characters(word):
 
 
 def _violates_constraint(word):
-    for constituent in re.split(r'-| |=', word):
+    for constituent in CONSTITUENT_SPLIT.split(word):
         for costraint in [min_word, sonseq, word_final, harmonic]:
             if not costraint(constituent):
                 return True
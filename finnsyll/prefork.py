@@ -0,0 +1,61 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+import gc
+
+from .syllabifier import FinnSyll
+
+
+def _share_counts(*tables):
+    # make equal counts share a single int object, so that looking counts up
+    # updates the refcounts of a handful of objects (and pages), rather than
+    # those of one object per n-gram
+    counts = {}
+
+    for table in tables:
+        for key, count in table.items():
+            table[key] = counts.setdefault(count, count)
+
+
+def freeze():
+    '''Collect any garbage, then move every remaining object into the garbage
+    collector's permanent generation, so that collections in forked
+    processes never write to the objects' pages (Python 3.7+; otherwise, only
+    collect).'''
+    gc.collect()
+
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+def preload(**kwargs):
+    '''Return FinnSyll(**kwargs), with its models laid out to stay shared
+    between the worker processes that a pre-forking server (e.g., gunicorn
+    with --preload) forks from this one.
+
+    The models are loaded with the garbage collector disabled, so that no
+    freed holes are left among their objects, and are then frozen (see
+    freeze()). Call preload() in the parent, after importing everything else
+    the workers need and right before forking.
+
+    A model swapped in later by FinnSeg.reload() is private to the process
+    that loads it.
+    '''
+    enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        syllabifier = FinnSyll(**kwargs)
+        lm = syllabifier.segmenter.lm
+
+        # a compiled model keeps its tables in a flat buffer, with no
+        # per-n-gram objects to share
+        if isinstance(lm.bigrams, dict):
+            _share_counts(lm.bigrams, lm.trigrams)
+        freeze()
+
+    finally:
+        if enabled:
+            gc.enable()
+
+    return syllabifier
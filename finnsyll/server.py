@@ -0,0 +1,554 @@
+# coding=utf-8
+# python -m finnsyll.server (--socket PATH | --port PORT) [options]
+from __future__ import unicode_literals
+
+try:
+    import socketserver
+
+except ImportError:
+    import SocketServer as socketserver
+
+try:
+    import queue
+
+except ImportError:
+    import Queue as queue
+
+try:
+    import msgpack
+
+except ImportError:
+    msgpack = None
+
+try:
+    _STRINGS = (str, unicode)
+
+except NameError:
+    _STRINGS = (str, )
+
+import argparse
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+from .syllabifier import FinnSyll
+
+# the methods that the server serves
+METHODS = ('syllabify', 'split', 'annotate')
+
+
+# Frames ----------------------------------------------------------------------
+
+# each frame is a message prefixed by its length in bytes (4-byte big-endian)
+HEADER = struct.Struct('>I')
+
+FORMATS = ('json', 'msgpack')
+
+# the largest frame (in bytes) to accept, so that a corrupt or hostile length
+# prefix cannot make the reader allocate without bound
+MAX_FRAME = 16 * 1024 * 1024
+
+
+def _check_format(format):
+    if format not in FORMATS:
+        raise ValueError('Unknown frame format: %r' % format)
+
+    if format == 'msgpack' and msgpack is None:
+        raise ValueError('The msgpack format requires the msgpack package.')
+
+
+def encode(message, format='json'):
+    '''Encode 'message' as a length-prefixed frame.'''
+    if format == 'msgpack':
+        data = msgpack.packb(message, use_bin_type=True)
+
+    else:
+        data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+
+    return HEADER.pack(len(data)) + data
+
+
+def _receive(sock, size):
+    # read exactly 'size' bytes from 'sock', or None if it closes first
+    chunks = []
+
+    while size:
+        chunk = sock.recv(min(size, 65536))
+
+        if not chunk:
+            return None
+
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def receive(sock, format='json', max_size=MAX_FRAME):
+    '''Read and decode a single frame from 'sock', or return None if the
+    connection closes between frames.
+
+    Raise ValueError if the frame is longer than 'max_size' bytes, in which
+    case the rest of the frame is left unread.
+    '''
+    header = _receive(sock, HEADER.size)
+
+    if header is None:
+        return None
+
+    size = HEADER.unpack(header)[0]
+
+    if max_size is not None and size > max_size:
+        raise ValueError(
+            'Frame of %d bytes exceeds the limit of %d.' % (size, max_size))
+
+    data = _receive(sock, size)
+
+    if data is None:
+        raise EOFError('Connection closed mid-frame.')
+
+    if format == 'msgpack':
+        return msgpack.unpackb(data, raw=False)
+
+    return json.loads(data.decode('utf-8'))
+
+
+# Micro-batching --------------------------------------------------------------
+
+class _Request(object):
+
+    def __init__(self, method, words):
+        self.method = method
+        self.words = words
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class Batcher(object):
+    '''Collect concurrent requests into micro-batches.
+
+    A single thread waits for a request, then collects any others that arrive
+    within "window" seconds (up to "max_batch" words in all). Each distinct
+    word in the batch is processed once per method, and syllabified words
+    share work via FinnSyll.syllabify_batch(). Results are cached (up to
+    "cache_size" of them), so that repeated words skip the syllabifier
+    altogether, until the segmenter's model is reloaded (see
+    FinnSeg.reload()).
+    '''
+
+    def __init__(self, syllabifier, window=0.002, max_batch=256,
+                 cache_size=65536):
+        self.syllabifier = syllabifier
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._cache = {}  # (method, word): result
+        self._version = None  # the model version of the cached results
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, method, words):
+        '''Return the result of 'method' for each of 'words', once its batch
+        has been processed.'''
+        if method not in METHODS:
+            raise ValueError('Unknown method: %r' % (method, ))
+
+        if not isinstance(words, list) or \
+                not all(isinstance(w, _STRINGS) for w in words):
+            raise TypeError('Expected a list of strings: %r' % (words, ))
+
+        request = _Request(method, words)
+        self._queue.put(request)
+        request.done.wait()
+
+        if request.error is not None:
+            raise request.error
+
+        return request.results
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+
+            if request is None:
+                return
+
+            batch = [request]
+            size = len(request.words)
+            deadline = time.time() + self.window
+
+            # collect whatever else arrives within the window
+            while size < self.max_batch:
+                timeout = deadline - time.time()
+
+                try:
+                    request = self._queue.get(timeout=max(timeout, 0))
+
+                except queue.Empty:
+                    break
+
+                if request is None:
+                    self._process(batch)
+                    return
+
+                batch.append(request)
+                size += len(request.words)
+
+            self._process(batch)
+
+    def _process(self, batch):
+        for method in METHODS:
+            requests = [r for r in batch if r.method == method]
+
+            if not requests:
+                continue
+
+            try:
+                self._compute(method, requests)
+
+            except Exception:
+                # process each request alone, so that a request that fails
+                # does not fail the others
+                for request in requests:
+                    try:
+                        self._compute(method, [request])
+
+                    except Exception as error:
+                        request.error = error
+
+        for request in batch:
+            request.done.set()
+
+    def _compute(self, method, requests):
+        version = self.syllabifier.segmenter.version
+
+        # discard results computed with an old model
+        if version != self._version:
+            self._cache.clear()
+            self._version = version
+
+        cache = self._cache
+        words = []
+        seen = set()
+
+        # find each distinct, uncached word
+        for request in requests:
+            for word in request.words:
+                if word not in seen and (method, word) not in cache:
+                    seen.add(word)
+                    words.append(word)
+
+        if method == 'syllabify':
+            results = self.syllabifier.syllabify_batch(words)
+
+        else:
+            results = list(map(getattr(self.syllabifier, method), words))
+
+        results = dict(zip(words, results))
+
+        for request in requests:
+            request.results = [
+                results[w] if w in results else cache[(method, w)]
+                for w in request.words
+                ]
+
+        if self.cache_size:
+            if len(cache) + len(results) > self.cache_size:
+                cache.clear()
+
+            for word, result in results.items():
+                cache[(method, word)] = result
+
+
+# Server ----------------------------------------------------------------------
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        batcher = self.server.batcher
+        format = self.server.format
+
+        while True:
+            try:
+                message = receive(
+                    self.request, format, self.server.max_frame)
+
+            except ValueError as error:
+                # the rest of the frame is unread, so the connection is no
+                # longer in sync and must be closed
+                reply = {'error': '%s: %s' % (type(error).__name__, error)}
+                self.request.sendall(encode(reply, format))
+                return
+
+            if message is None:
+                return
+
+            try:
+                results = batcher.submit(message['method'], message['words'])
+                reply = {'results': results}
+
+            except Exception as error:
+                reply = {'error': '%s: %s' % (type(error).__name__, error)}
+
+            self.request.sendall(encode(reply, format))
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socket, 'AF_UNIX'):
+
+    class _UnixServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class Server(object):
+    '''Serve syllabify(), split(), and annotate() over a Unix domain socket
+    (if 'address' is a path) or TCP (if 'address' is a (host, port) tuple).
+
+    The models are loaded once, into 'syllabifier' (by default, FinnSyll()),
+    and requests from every connection are micro-batched (see Batcher). The
+    frames are length-prefixed JSON or, if 'format' is 'msgpack', msgpack;
+    a connection that sends a frame longer than 'max_frame' bytes is closed.
+    '''
+
+    def __init__(
+        self,
+        address,
+        syllabifier=None,
+        window=0.002,
+        max_batch=256,
+        cache_size=65536,
+        format='json',
+        max_frame=MAX_FRAME,
+            ):
+        _check_format(format)
+        self.syllabifier = syllabifier or FinnSyll()
+        self.batcher = Batcher(
+            self.syllabifier, window, max_batch, cache_size)
+
+        if isinstance(address, tuple):
+            self._server = _TCPServer(address, _Handler)
+
+        else:
+            self._server = _UnixServer(address, _Handler)
+
+        self._server.batcher = self.batcher
+        self._server.format = format
+        self._server.max_frame = max_frame
+        self._thread = None
+
+        # the bound address, e.g., with the port that the OS chose for port 0
+        self.address = self._server.server_address
+
+    def __repr__(self):
+        return '<Server: address=%r>' % (self.address, )
+
+    def serve_forever(self):
+        '''Serve requests until close() is called.'''
+        self.batcher.start()
+        self._server.serve_forever()
+
+    def start(self):
+        '''Serve requests in a background thread, returning the server.'''
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self
+
+    def close(self):
+        '''Stop serving and release the socket.'''
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+
+        self._server.server_close()
+        self.batcher.stop()
+
+        if not isinstance(self.address, tuple):
+            try:
+                os.unlink(self.address)
+
+            except OSError:
+                pass
+
+
+# Client ----------------------------------------------------------------------
+
+class ServerError(Exception):
+    '''An error raised by the server while processing a request.'''
+
+
+class Client(object):
+    '''A client for Server, which keeps up to 'pool_size' idle connections
+    open for reuse and is safe to share between threads.
+
+    Tuples in the server's results (e.g., tracked rules) arrive as lists,
+    except for the rows of annotate().
+    '''
+
+    def __init__(self, address, pool_size=4, timeout=None, format='json'):
+        _check_format(format)
+        self.address = address
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.format = format
+        self._pool = queue.LifoQueue()
+
+    def __repr__(self):
+        return '<Client: address=%r>' % (self.address, )
+
+    def _connect(self):
+        if isinstance(self.address, tuple):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        sock.settimeout(self.timeout)
+        sock.connect(self.address)
+
+        return sock
+
+    def _call(self, method, words):
+        try:
+            sock = self._pool.get_nowait()
+
+        except queue.Empty:
+            sock = self._connect()
+
+        try:
+            message = {'method': method, 'words': words}
+            sock.sendall(encode(message, self.format))
+            # the server's replies are trusted, however long
+            reply = receive(sock, self.format, None)
+
+            if reply is None:
+                raise EOFError('Connection closed by the server.')
+
+        except Exception:
+            # discard the connection, whose state is unknown
+            sock.close()
+            raise
+
+        if self._pool.qsize() < self.pool_size:
+            self._pool.put(sock)
+
+        else:
+            sock.close()
+
+        if 'error' in reply:
+            raise ServerError(reply['error'])
+
+        return reply['results']
+
+    def syllabify(self, word):
+        '''Return the server's syllabify() of 'word'.'''
+        return self._call('syllabify', [word])[0]
+
+    def syllabify_batch(self, words):
+        '''Return the server's syllabify() of each of 'words', as a list.'''
+        return self._call('syllabify', list(words))
+
+    def split(self, word):
+        '''Return the server's split() of 'word'.'''
+        return self._call('split', [word])[0]
+
+    def annotate(self, word):
+        '''Return the server's annotate() of 'word'.'''
+        return [tuple(row) for row in self._call('annotate', [word])[0]]
+
+    def close(self):
+        '''Close every idle connection.'''
+        while True:
+            try:
+                self._pool.get_nowait().close()
+
+            except queue.Empty:
+                return
+
+
+# Command line ----------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve FinnSyll over a local socket.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--socket', help='listen on this Unix domain socket')
+    group.add_argument('--port', type=int, help='listen on this TCP port')
+    parser.add_argument(
+        '--host', default='127.0.0.1', help='TCP host (default: 127.0.0.1)')
+    parser.add_argument(
+        '--window', type=float, default=2.0,
+        help='micro-batching window, in milliseconds')
+    parser.add_argument(
+        '--max-batch', type=int, default=256, help='most words per batch')
+    parser.add_argument(
+        '--cache-size', type=int, default=65536, help='most cached results')
+    parser.add_argument('--format', choices=FORMATS, default='json')
+    parser.add_argument(
+        '--max-frame', type=int, default=MAX_FRAME,
+        help='largest request frame to accept, in bytes')
+    parser.add_argument(
+        '--watch', type=float, metavar='SECONDS',
+        help='reload the models when their files change, polling this often')
+    parser.add_argument('--no-split', action='store_true')
+    parser.add_argument('--no-variation', action='store_true')
+    parser.add_argument('--rules', action='store_true')
+    parser.add_argument('--stress', action='store_true')
+    args = parser.parse_args(argv)
+
+    syllabifier = FinnSyll(
+        split=not args.no_split,
+        variation=not args.no_variation,
+        rules=args.rules,
+        stress=args.stress,
+        )
+
+    if args.watch:
+        syllabifier.segmenter.watch(args.watch)
+
+    server = Server(
+        args.socket or (args.host, args.port),
+        syllabifier,
+        window=args.window / 1000.0,
+        max_batch=args.max_batch,
+        cache_size=args.cache_size,
+        format=args.format,
+        max_frame=args.max_frame,
+        )
+
+    try:
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
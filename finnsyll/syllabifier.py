@@ -1,26 +1,133 @@
 # coding=utf-8
 from __future__ import unicode_literals
 
-try:
-    import cpickle as pickle
-
-except ImportError:
-    import pickle
-
 try:
     from itertools import zip_longest as izip, product
 
 except ImportError:
     from itertools import izip_longest as izip, product
 
+import hashlib
+import io
 import math
+import mmap
 import morfessor
 import os
+import threading
+import warnings
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
 
-from os.path import dirname, join
-from .phonology import CONSTRAINTS, get_weight, get_vowel
-from .utilities import nonalpha_split, syllable_split
-from .v13 import syllabify
+except ImportError:
+    shared_memory = None
+
+from array import array
+from collections import Counter, namedtuple
+from functools import partial
+from os.path import dirname, isfile, join
+from . import instrument, ngrams
+from .budget import Budget
+from .phonology import (
+    CONSTRAINTS,
+    count_vowels,
+    get_weight,
+    get_vowel,
+    harmony,
+    load_weights,
+    weigh,
+    )
+from .tables import (
+    LEXICON_MAGIC,
+    compile_model,
+    compiled_size,
+    load_lexicon,
+    load_model,
+    )
+from .utilities import (
+    ALPHA,
+    boundary_mask,
+    mask_split,
+    nonalpha_split,
+    scan,
+    syllable_split,
+    )
+from .v13 import (
+    T1_batch,
+    _post_process,
+    _syllabify_tokens,
+    probabilities,
+    syllabify_tokens,
+    )
+
+
+DIR = join(dirname(__file__), 'data')
+
+# the segmenter's language models (see LanguageModel); the n-gram counts are
+# also available in the legacy pickle format (see ngrams.py)
+MORFESSOR_FILE = join(DIR, 'finnsyll-morfessor.bin')
+NGRAM_FILE = join(DIR, 'finnsyll-ngrams.slim')
+LEGACY_NGRAM_FILE = join(DIR, 'finnsyll-ngrams.pickle')
+
+# both models, compiled into a single file (see CompiledModel and bake.py)
+COMPILED_FILE = join(DIR, 'finnsyll-compiled.bin')
+
+# the corpus used to train the segmenter's language models
+TRAINING_FILE = join(DIR, 'finnsyll-training.txt')
+
+# known simplex forms (see FinnSeg.build_lexicon()), headed by the version of
+# the model that they are simplex under (see FinnSeg.write_lexicon())
+SIMPLEX_FILE = join(DIR, 'finnsyll-simplex.txt')
+
+# common inflectional endings (case, number, possessive, and clitic suffixes),
+# which the segmenter's stem cache strips from words (see FinnSeg())
+SUFFIXES = [
+    'n', 't', 'a', 'ä', 'ta', 'tä', 'na', 'nä', 'ksi', 'ssa', 'ssä', 'sta',
+    'stä', 'lla', 'llä', 'lta', 'ltä', 'lle', 'tta', 'ttä', 'ne', 'an', 'än',
+    'en', 'in', 'on', 'un', 'yn', 'hin', 'seen', 'jen',
+    'iden', 'itten', 'ja', 'jä', 'ita', 'itä', 'ina', 'inä', 'iksi', 'issa',
+    'issä', 'ista', 'istä', 'iin', 'ihin', 'illa', 'illä', 'ilta', 'iltä',
+    'ille', 'itta', 'ittä', 'ine', 'ni', 'si', 'mme', 'nne', 'nsa', 'nsä',
+    'kin', 'kaan', 'kään', 'han', 'hän', 'pa', 'pä', 'ko', 'kö',
+    ]
+
+
+def _suffix_trie(suffixes):
+    # compile 'suffixes' into a trie of their reversed characters, in which
+    # None marks the end of a suffix
+    trie = {}
+
+    for suffix in suffixes:
+        node = trie
+
+        for ch in reversed(suffix):
+            node = node.setdefault(ch, {})
+
+        node[None] = len(suffix)
+
+    return trie
+
+
+SUFFIX_TRIE = _suffix_trie(SUFFIXES)
+
+
+def _suffix_lengths(word):
+    # yield the length of each known suffix that ends 'word', from shortest
+    # to longest
+    node = SUFFIX_TRIE
+
+    for ch in reversed(word):
+        node = node.get(ch)
+
+        if node is None:
+            break
+
+        if None in node:
+            yield node[None]
+
+
+# character offsets into the original input (see FinnSyll.spans())
+Spans = namedtuple('Spans', ['syllables', 'compounds', 'primary', 'secondary'])
 
 
 class FinnSyll:
@@ -31,18 +138,35 @@ class FinnSyll:
         variation=True,
         rules=False,
         stress=False,
+        budget=None,
+        segmenter=None,
             ):
-        self.DEV = bool(os.environ.get('FINNSYLL_DEV'))
-        self._split = FinnSeg().segment  # instantiate compound segmenter
+        self.DEV = instrument.DEV  # see stats()
+
+        # instantiate compound segmenter, unless one is given (e.g., one that
+        # attaches to a shared model; see FinnSeg.publish())
+        self.segmenter = segmenter or FinnSeg()
+        self._split = self.segmenter.segment
         self.split_compounds = split
         self.vary = variation
         self.track_rules = rules
         self.assign_stress = stress
 
+        # if given, a Budget limits the work done for each input (see
+        # syllabify_checked() and split_checked())
+        self.budget = budget
+
         # if "split" is True, normalizing the syllabifier's input will include
         # attempting to split the input into constituent words
         self.normalize = self.split if split else self._normalize  # TODO/CHECK
 
+        # the syllabifier receives its input pre-tokenized into alphabetic
+        # parts and delimiters; if "split" is True, the compound segmenter
+        # produces these tokens directly, inserting '=' delimiters between
+        # constituent words (this avoids joining the segmentation into a
+        # string, only for the syllabifier to tokenize it all over again)
+        self.tokenize = self._constituents if split else self._tokenize
+
         # determine whether the syllabifier will produce variation and/or track
         # which rules have applied in a syllabification
         if variation and rules:
@@ -63,6 +187,7 @@ class FinnSyll:
 
     # pre-process -------------------------------------------------------------
 
+    @instrument.timed('normalize')
     def _normalize(self, word):
         # convert word to unicode
         if isinstance(word, str):
@@ -75,47 +200,182 @@ class FinnSyll:
 
         return word
 
+    def _tokenize(self, word, budget=None):
+        word = self._normalize(word)
+
+        return [word, ] if word.isalpha() else nonalpha_split(word)
+
+    def _constituents(self, word, budget=None):
+        word = self._normalize(word)
+        tokens = self.segmenter.constituents(word, budget)
+
+        # the syllabifier's offsets (see spans()) assume that the constituents
+        # spell out the word exactly, which a custom segmenter might not
+        if '' in tokens or \
+                ''.join(tokens).replace('=', '') != word.replace('=', ''):
+            raise ValueError('%r is not a segmentation of %r' % (tokens, word))
+
+        return tokens
+
+    def _start(self):
+        # return a fresh budget for a single call, if any
+        return self.budget.start() if self.budget else None
+
+    # instrumentation ---------------------------------------------------------
+
+    def stats(self):
+        '''Return the number of calls and cumulative seconds of each pipeline
+        stage (normalize, segment, T1, T2, T4, etc.), if the FINNSYLL_DEV
+        environment variable was set when finnsyll was imported; else, {}.
+
+        The stats are shared by every FinnSyll object in the process.
+        '''
+        return instrument.stats()
+
+    def reset_stats(self):
+        '''Discard the stats returned by stats().'''
+        instrument.reset_stats()
+
     # syllabify ---------------------------------------------------------------
 
+    @instrument.traced
     def syllabify(self, word):
         '''Syllabify 'word'.'''
-        return self._syllabify(self.normalize(word))
+        budget = self._start()
 
-    def _syllabify_vary_track(self, word):
+        return self._syllabify(self.tokenize(word, budget), budget=budget)
+
+    @instrument.traced
+    def syllabify_checked(self, word):
+        '''Syllabify 'word' within the limits of the budget, returning a tuple
+        of the syllabification and the names of any limits that were hit,
+        e.g., ('ho.vi.oi.keus', ()).
+
+        If any limits were hit, the syllabification has been degraded (see
+        Budget). Without a budget, the default limits apply.
+        '''
+        budget = (self.budget or Budget()).start()
+        syllabification = self._syllabify(
+            self.tokenize(word, budget), budget=budget)
+
+        return syllabification, tuple(sorted(budget.degraded))
+
+    @instrument.traced
+    def syllabify_batch(self, words):
+        '''Return syllabify() for each of 'words', as a list.
+
+        This is faster than syllabifying each word individually when many of
+        the words share beginnings (e.g., inflected forms of the same lemma),
+        since the shared beginnings are only processed once.
+        '''
+        tokenized = {}
+
+        # tokenize each distinct word only once
+        for word in words:
+            if word not in tokenized:
+                budget = self._start()
+                tokenized[word] = self.tokenize(word, budget), budget
+
+        t1 = T1_batch(
+            t for tokens, _ in tokenized.values() for t in tokens
+            if t.isalpha())
+
+        results = {
+            word: self._syllabify(tokens, t1, budget)
+            for word, (tokens, budget) in tokenized.items()
+            }
+
+        return [results[w] for w in words]
+
+    def _syllabify_vary_track(self, tokens, t1=None, budget=None):
         # return all known variants and applied rules (as a list of tuples)
-        return list(syllabify(word, stress=self.assign_stress))
+        return list(syllabify_tokens(tokens, self.assign_stress, t1, budget))
 
-    def _syllabify_vary(self, word):
+    def _syllabify_vary(self, tokens, t1=None, budget=None):
         # return all known variants (as a list of strings), minus applied rules
-        return [s for s, _ in syllabify(word, stress=self.assign_stress)]
+        return [
+            s for s, _ in syllabify_tokens(
+                tokens, self.assign_stress, t1, budget)
+            ]
 
-    def _syllabify_track(self, word):
+    def _syllabify_track(self, tokens, t1=None, budget=None):
         # return the most preferred variant and its applied rules (as a tuple)
-        for syll, rules in syllabify(word, stress=self.assign_stress):
+        for syll, rules in syllabify_tokens(
+                tokens, self.assign_stress, t1, budget):
             return syll, rules
 
-    def _syllabify_one(self, word):
+    def _syllabify_one(self, tokens, t1=None, budget=None):
         # return the most preferred variant (as a string), minus applied rules
-        for syll, _ in syllabify(word, stress=self.assign_stress):
+        for syll, _ in syllabify_tokens(
+                tokens, self.assign_stress, t1, budget):
             return syll
 
+    @instrument.traced
+    def distribution(self, word):
+        '''Return each variant of 'word' with its probability, as a list of
+        (syllabification, probability) tuples, from most preferred to least
+        preferred (see v13.probabilities()).'''
+        budget = self._start()
+        variants = _syllabify_tokens(
+            self.tokenize(word, budget), self.assign_stress, budget=budget)
+
+        return [
+            (_post_process(syll, rules)[0], p)
+            for (syll, rules), p in zip(variants, probabilities(variants))
+            ]
+
     # split -------------------------------------------------------------------
 
+    @instrument.traced
     def split(self, word):
         '''Split 'word' into any constituent words.'''
-        return self._split(self._normalize(word))
+        return self._split(self._normalize(word), self._start())
+
+    @instrument.traced
+    def split_checked(self, word):
+        '''Split 'word' within the limits of the budget, returning a tuple of
+        the segmentation and the names of any limits that were hit, e.g.,
+        ('hovi=oikeus', ()).
+
+        If any limits were hit, the segmentation has been degraded (see
+        Budget). Without a budget, the default limits apply.
+        '''
+        budget = (self.budget or Budget()).start()
+        segmentation = self._split(self._normalize(word), budget)
+
+        return segmentation, tuple(sorted(budget.degraded))
 
+    @instrument.traced
     def is_complex(self, word):
         '''Return True if 'word' is composed of multiple words; else, False.'''
-        return not self.split(word).isalpha()
+        return self.segmenter.is_complex(self._normalize(word), self._start())
+
+    @instrument.traced
+    def is_complex_batch(self, words):
+        '''Return is_complex() for each of 'words', as a list.'''
+        words = [self._normalize(w) for w in words]
+        results = {}
+
+        # classify each distinct word only once
+        for word in words:
+            if word not in results:
+                results[word] = self.segmenter.is_complex(
+                    word, self._start())
+
+        return [results[w] for w in words]
 
     # annotation --------------------------------------------------------------
 
+    @instrument.traced
     def annotate(self, word):
         '''Annotate 'word' for syllabification, stress, weights, and vowels.'''
         info = []  # e.g., [ ('\'nak.su.`tus.ta', 'PUSU', 'HLHL', 'AUUA'), ]
 
-        for syllabification, _ in syllabify(self.normalize(word), stress=True):
+        budget = self._start()
+        tokens = self.tokenize(word, budget)
+
+        for syllabification, _ in syllabify_tokens(
+                tokens, stress=True, budget=budget):
             stresses = ''
             weights = ''
             vowels = ''
@@ -149,103 +409,1054 @@ class FinnSyll:
 
         return info
 
+    # spans -------------------------------------------------------------------
+
+    @instrument.traced
+    def spans(self, text):
+        '''Return the syllable boundary, compound boundary, and stress offsets
+        of the most preferred syllabification of 'text'.
+
+        The offsets index the original 'text' (e.g., a syllable boundary at 2
+        falls between text[1] and text[2]) and are returned as integer arrays
+        in a Spans tuple:
+
+            Spans(
+                syllables=array('i', [...]),  # every syllable boundary
+                compounds=array('i', [...]),  # compound boundaries only
+                primary=array('i', [...]),    # onsets of primary stress
+                secondary=array('i', [...]),  # onsets of secondary stress
+                )
+
+        Compound boundaries are only found if "split" is True. Delimiters
+        already present in 'text' (e.g., spaces and hyphens) are not reported.
+        '''
+        text = self._normalize(text)
+        spans = Spans(array('i'), array('i'), array('i'), array('i'))
+
+        budget = self._start()
+
+        for syllabification, _ in _syllabify_tokens(
+                self.tokenize(text, budget), stress=True, budget=budget):
+            i, n = 0, len(text)
+
+            # walk the syllabification and 'text' in parallel: any character
+            # that does not match the original input is a boundary or stress
+            # mark that the syllabifier inserted at offset i
+            for ch in syllabification:
+
+                if i < n and ch == text[i]:
+                    i += 1
+
+                elif ch == '.':
+                    spans.syllables.append(i)
+
+                elif ch == '=':
+                    spans.syllables.append(i)
+                    spans.compounds.append(i)
+
+                elif ch == '\'':
+                    spans.primary.append(i)
+
+                elif ch == '`':
+                    spans.secondary.append(i)
+
+            break
+
+        return spans
+
+
+def load_morfessor(filename):
+    '''Return the Morfessor model in 'filename': either a Morfessor binary
+    model, or a compiled lexicon (see tables.compile_lexicon()), which is
+    memory-mapped and read in place.'''
+    with open(filename, 'rb') as f:
+        if f.read(len(LEXICON_MAGIC)) == LEXICON_MAGIC:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            return load_lexicon(buffer, verify=True)[1]
+
+    return morfessor.MorfessorIO().read_binary_model_file(filename)
+
+
+def model_version(morfessor_file, ngram_file):
+    '''Return the version of the model in 'morfessor_file' and 'ngram_file'
+    (see LanguageModel), without loading it.'''
+    checksum = hashlib.sha1()
+
+    for filename in (morfessor_file, ngram_file):
+        with open(filename, 'rb') as f:
+            checksum.update(f.read())
+
+    return checksum.hexdigest()[:12]
+
+
+def read_lexicon(filename):
+    '''Return the version and the forms of the lexicon file 'filename' (see
+    FinnSeg.write_lexicon()), or None and the forms if the file records no
+    version.'''
+    with io.open(filename, encoding='utf-8') as f:
+        forms = f.read().split('\n')
+
+    version = None
+
+    if forms and forms[0].startswith('# version '):
+        version = forms.pop(0)[len('# version '):].strip()
+
+    return version, [form.strip() for form in forms if form.strip()]
+
+
+def _stat(filename):
+    # return the modification time and size of 'filename', or None if it is
+    # missing
+    try:
+        s = os.stat(filename)
+
+    except OSError:
+        return None
+
+    return s.st_mtime, s.st_size
+
+
+class LanguageModel(object):
+    '''The Morfessor model and morph n-gram counts that FinnSeg segments
+    with, loaded from 'morfessor_file' (see load_morfessor()) and
+    'ngram_file' (a slim or legacy n-gram file; see ngrams.py).
+
+    The model's "version" is a checksum of both files, so that results
+    computed with one model can be told apart from those of another.
+
+    If the model stands in for the compiled file 'compiled_file', because
+    the file is out of date (see open_compiled()), its files, and so its
+    reload() and watch(), include the compiled file.
+    '''
+
+    def __init__(
+        self,
+        morfessor_file=MORFESSOR_FILE,
+        ngram_file=NGRAM_FILE,
+        compiled_file=None,
+            ):
+        self.morfessor_file = morfessor_file
+        self.ngram_file = ngram_file
+        self.compiled_file = compiled_file
+        self.files = [morfessor_file, ngram_file]
+        self.weights = None  # see CompiledModel
+
+        if compiled_file:
+            self.files.append(compiled_file)
+
+        checksum = hashlib.sha1()
+
+        with open(morfessor_file, 'rb') as f:
+            checksum.update(f.read())
+
+        with open(ngram_file, 'rb') as f:
+            data = f.read()
+            checksum.update(data)
+
+        self.model = load_morfessor(morfessor_file)
+        self.version = checksum.hexdigest()[:12]
+
+        # the morph ids and the counts of each n-gram order (see ngrams.py)
+        self.ids, self.unigrams, self.bigrams, self.trigrams, self.total = \
+            ngrams.loads(data)
+        self.vocab_size = len(self.ids)
+
+    def __repr__(self):
+        return '<LanguageModel: version=%s>' % self.version
+
+    def compile(self, weights=None, directory=None):
+        '''Return the model as a compiled buffer (see CompiledModel), along
+        with any dictionary of constraint 'weights'. If 'directory' is given,
+        the model's files are recorded relative to it.'''
+        files = [self.morfessor_file, self.ngram_file]
+
+        if directory:
+            files = [os.path.relpath(f, directory) for f in files]
+
+        return compile_model(
+            self.model,
+            self.ids,
+            self.unigrams,
+            self.bigrams,
+            self.trigrams,
+            self.total,
+            version=self.version,
+            files=files,
+            weights=weights,
+            )
+
+    def reopen(self):
+        '''Load the model afresh from its files.'''
+        if self.compiled_file:
+            return open_compiled(self.compiled_file)
+
+        return LanguageModel(self.morfessor_file, self.ngram_file)
+
+    def stat(self):
+        # return the modification times and sizes of the model files (None
+        # for any missing file)
+        return [_stat(f) for f in self.files]
+
+    @instrument.timed('segment.morfessor')
+    def morphemes(self, comp):
+        '''Return the morphemes of 'comp', according to the Morfessor model.'''
+        morphemes = self.model.viterbi_segment(comp.lower())[0]
+
+        # preserve capitalization of comp, since viterbi_segment() is
+        # case-sensitive... WELP
+        if comp != comp.lower():
+            indices = [0, ]
+            offset = 0
+            for m in morphemes[:-1]:
+                m = len(m) + offset
+                indices.append(m)
+                offset = m
+            indices = zip(indices, indices[1:] + [None, ])
+            morphemes = [comp[i:j] for i, j in indices]
+
+        return morphemes
+
+    @instrument.timed('segment.scoring')
+    def score(self, candidate):  # Stupid Backoff smoothing
+        '''Return the log score of the morphs and delimiters of
+        'candidate'.'''
+        ids = self.ids
+        unigrams, bigrams, trigrams = \
+            self.unigrams, self.bigrams, self.trigrams
+        size = self.vocab_size
+        score = 0
+        A = B = None  # the ids of the previous two morphs, if known
+
+        for morph in candidate:
+            C = ids.get(morph.lower())
+            ABC_count = BC_count = 0
+
+            if C is not None and B is not None:
+                if A is not None:
+                    AB = A * size + B
+                    ABC_count = trigrams.get(AB * size + C, 0)
+
+                if not ABC_count:
+                    BC_count = bigrams.get(B * size + C, 0)
+
+            if ABC_count:
+                score += math.log(ABC_count)
+                score -= math.log(bigrams[AB])
+
+            elif BC_count:
+                score += math.log(BC_count * 0.4)
+                score -= math.log(unigrams[B])
+
+            else:
+                # Laplace smoothed unigram
+                C_count = 1 if C is None else unigrams[C]
+                score += math.log(C_count * 0.4 * 0.4)
+                score -= math.log(self.total + size + 1)
+
+            A, B = B, C
+
+        return round(score, 4)
+
+
+class CompiledModel(LanguageModel):
+    '''A LanguageModel read in place from a compiled 'buffer' (see
+    LanguageModel.compile()), e.g., a shared memory segment or a
+    memory-mapped file (see open()), without copying or unpickling anything.
+
+    The model holds n-gram log probabilities rather than counts, along with
+    any constraint "weights" it was compiled with. Its "version" is that of
+    the model it was compiled from. Its files, and so its reload() and
+    watch(), are those of that model, plus the file it was opened from, if
+    any.
+    '''
+
+    def __init__(self, buffer, source=None, filename=None, verify=False):
+        meta, self.ids, self.unigrams, self.bigrams, self.trigrams, \
+            self.model = load_model(buffer, verify)
+
+        # a compiled file records the model's files relative to itself
+        self.morfessor_file, self.ngram_file = [
+            join(dirname(filename), f) if filename else f
+            for f in meta['files']
+            ]
+        self.filename = self.compiled_file = filename
+        self.files = [self.morfessor_file, self.ngram_file]
+
+        if filename:
+            self.files.append(filename)
+
+        self.weights = meta['weights']
+        self.vocab_size = len(self.ids)
+        self.total = meta['total']
+        self.unknown = meta['unknown']
+        self.version = meta['version']
+        self.buffer = buffer
+
+        # keeps a shared memory segment attached, or a file mapped
+        self.source = source
+
+    def __repr__(self):
+        return '<CompiledModel: version=%s>' % self.version
+
+    @classmethod
+    def open(cls, filename):
+        '''Memory-map the compiled model file 'filename', verifying its
+        checksum.'''
+        with open(filename, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(buffer, buffer, filename, verify=True)
+
+    def compile(self):
+        # a shared memory segment may be longer than the model
+        return bytes(self.buffer[:compiled_size(self.buffer)])
+
+    @instrument.timed('segment.scoring')
+    def score(self, candidate):  # Stupid Backoff smoothing
+        ids = self.ids
+        unigrams, bigrams, trigrams = \
+            self.unigrams, self.bigrams, self.trigrams
+        size = self.vocab_size
+        score = 0
+        A = B = None  # the ids of the previous two morphs, if known
+
+        for morph in candidate:
+            C = ids.get(morph.lower())
+            p = None
+
+            if C is not None and B is not None:
+                if A is not None:
+                    p = trigrams.get((A * size + B) * size + C)
+
+                if p is None:
+                    p = bigrams.get(B * size + C)
+
+            if p is None:
+                p = self.unknown if C is None else unigrams[C]
+
+            score += p
+            A, B = B, C
+
+        return round(score, 4)
+
+
+def open_compiled(filename):
+    '''Open the compiled model file 'filename' (see CompiledModel.open()),
+    unless the model files it was compiled from have changed since (i.e.,
+    their checksum no longer matches its version), in which case warn and
+    load those instead (see LanguageModel). A compiled file whose model files
+    are missing is opened as is.'''
+    lm = CompiledModel.open(filename)
+    files = lm.morfessor_file, lm.ngram_file
+
+    if all(map(isfile, files)) and model_version(*files) != lm.version:
+        warnings.warn(
+            '%s is out of date (rebuild it with python -m finnsyll.bake); '
+            'loading %s and %s instead.' % ((filename, ) + files))
+
+        return LanguageModel(lm.morfessor_file, lm.ngram_file, filename)
+
+    return lm
+
+
+if shared_memory is not None:
+
+    class _Segment(shared_memory.SharedMemory):
+
+        def __del__(self):
+            # a compiled model's tables may still be reading the segment if
+            # they are collected along with it, in which case the mapping
+            # lasts until the last table is freed
+            try:
+                self.close()
+
+            except BufferError:
+                pass
+
+
+def _attach(name):
+    # attach to the shared memory segment 'name', without letting this
+    # process's resource tracker unlink it when the process exits
+    if shared_memory is None:
+        raise RuntimeError('Shared memory requires Python 3.8+.')
+
+    try:
+        return _Segment(name, track=False)  # Python 3.13+
+
+    except TypeError:
+        pass
+
+    # multiprocessing's child processes share their parent's tracker, which
+    # cleans up only once every process has exited; any other process starts
+    # its own tracker, which must forget the segment
+    shared = getattr(resource_tracker._resource_tracker, '_fd', None)
+    segment = _Segment(name)
+
+    if shared is None:
+        resource_tracker.unregister(segment._name, 'shared_memory')
+
+    return segment
+
 
 class FinnSeg(object):
 
-    def __init__(self):
-        DIR = dirname(__file__)
-        morfessor_file = join(DIR, 'data/finnsyll-morfessor.bin')
-        ngram_file = join(DIR, 'data/finnsyll-ngrams.pickle')
+    def __init__(
+        self,
+        min_length=4,
+        min_vowels=4,
+        lexicon=SIMPLEX_FILE,
+        dictionary=None,
+        stem_cache=0,
+        weights=None,
+        compiled_file=COMPILED_FILE,
+        morfessor_file=None,
+        ngram_file=None,
+        shared=None,
+            ):
+        # the language model, which reload() and watch() may replace while
+        # the segmenter is in use; each call reads "lm" once, so that it runs
+        # wholly on a single model
+        self.lm = None
+
+        if shared:
+            # attach to a model published in shared memory (see publish())
+            segment = _attach(shared)
+            self.lm = CompiledModel(segment.buf, segment)
+
+        # unless the model files are given, prefer the compiled model (see
+        # bake.py), falling back to the model files if it is missing, corrupt,
+        # compiled for another machine, out of date (see open_compiled()), or
+        # unreadable under Python 2
+        elif compiled_file and not (morfessor_file or ngram_file):
+            try:
+                self.lm = open_compiled(compiled_file)
+
+            except (IOError, OSError, ValueError):
+                pass
+
+        if self.lm is None:
+            self.lm = LanguageModel(
+                morfessor_file or MORFESSOR_FILE, ngram_file or NGRAM_FILE)
 
-        io = morfessor.MorfessorIO()
-        self.model = io.read_binary_model_file(morfessor_file)
+        self._reloading = threading.Lock()
+        self._watcher = None
         self.constraints = CONSTRAINTS
         self.constraint_count = len(CONSTRAINTS)
 
-        with open(ngram_file, 'rb') as f:
-            self.ngrams, self.vocab, self.total = pickle.load(f)
+        # if "weights" names a file of constraint weights (see
+        # phonology.load_weights()), or the compiled model holds constraint
+        # weights, weigh each candidate's constraint violations against its
+        # language model score, rather than filtering out every candidate
+        # that violates some constraint
+        weights = load_weights(weights) if weights else self.lm.weights
+        self.weighted = bool(weights)
+
+        if weights:
+            self.constraints = weigh(CONSTRAINTS, weights)
+
+        # components that are shorter than "min_length" characters, contain
+        # fewer than "min_vowels" vowels, or appear in the "lexicon" of known
+        # simplex forms bypass the segmenter entirely; since the MnWrd
+        # constraint requires each constituent word to contain two vowels, a
+        # component with fewer than four vowels can never be split (unless
+        # the constraints are weighted, in which case nothing bypasses it)
+        self.min_length = min_length
+        self.min_vowels = min_vowels
+        self.lexicon = frozenset()
+
+        # the lexicon is built with the constraints as hard filters (see
+        # build_lexicon()), so its forms may well split under weighted ones;
+        # likewise, a lexicon built for another model is ignored (with a
+        # warning, unless it is the bundled lexicon)
+        if lexicon and not self.weighted:
+            version, forms = read_lexicon(lexicon)
+
+            if version in (None, self.lm.version):
+                self.lexicon = frozenset(forms)
+
+            elif lexicon != SIMPLEX_FILE:
+                warnings.warn(
+                    '%s was built for model version %s, not %s; ignoring '
+                    'it.' % (lexicon, version, self.lm.version))
+
+        # tally how many components bypass the segmenter or are found in the
+        # user dictionary
+        self.counts = Counter()
+
+        # a user dictionary of known segmentations (see load_dictionary())
+        self._dictionary = ({}, {}, [])
+
+        if dictionary:
+            self.load_dictionary(dictionary)
+
+        # if "stem_cache" is a positive number, cache up to that many
+        # segmentations, so that the inflected forms of a compound (i.e., plus
+        # any known inflectional ending) can reuse its segmentation (see
+        # _cached())
+        self.stem_cache = stem_cache
+        self._words = {}
 
     def __repr__(self):
-        return '<FinnSeg>'
+        return '<FinnSeg: version=%s>' % self.version
+
+    @property
+    def version(self):
+        '''The version of the current language model (see LanguageModel).'''
+        return self.lm.version
+
+    @property
+    def model(self):
+        return self.lm.model
+
+    @property
+    def vocab_size(self):
+        return self.lm.vocab_size
+
+    @property
+    def total(self):
+        return self.lm.total
+
+    # shared memory -----------------------------------------------------------
+
+    def publish(self, name=None):
+        '''Compile the current language model into a new shared memory
+        segment named 'name' (by default, a random name), and return the
+        segment (see multiprocessing.shared_memory; Python 3.8+).
+
+        Other processes on this machine, such as multiprocessing workers, can
+        then attach to the model with FinnSeg(shared=segment.name), rather
+        than loading the model files themselves. The caller owns the segment:
+        once no process needs it, call its close() and unlink().
+        '''
+        if shared_memory is None:
+            raise RuntimeError('Shared memory requires Python 3.8+.')
+
+        data = self.lm.compile()
+        segment = shared_memory.SharedMemory(name, create=True, size=len(data))
+        segment.buf[:len(data)] = data
+
+        return segment
+
+    # hot reload --------------------------------------------------------------
+
+    def reload(
+        self,
+        morfessor_file=None,
+        ngram_file=None,
+        compiled_file=None,
+        background=False,
+            ):
+        '''Load a new language model (by default, from the current model's
+        files) and, once it is fully loaded, swap it in for new calls; calls
+        already in progress finish on the old model. Swapping in a model of a
+        different version clears the stem cache and rebuilds the simplex
+        lexicon from its current forms (see build_lexicon()), during which
+        no component bypasses the segmenter via the lexicon. The constraint
+        weights stay as they are.
+
+        If 'background' is True, load the model in a new thread and return
+        the thread; if loading fails, the old model stays in place.
+        '''
+        if compiled_file:
+            load = partial(open_compiled, compiled_file)
+
+        elif morfessor_file or ngram_file:
+            load = partial(
+                LanguageModel,
+                morfessor_file or self.lm.morfessor_file,
+                ngram_file or self.lm.ngram_file,
+                )
 
-    def segment(self, word):
+        else:
+            load = self.lm.reopen
+
+        if background:
+            thread = threading.Thread(target=self._reload, args=(load, ))
+            thread.daemon = True
+            thread.start()
+
+            return thread
+
+        self._reload(load)
+
+    def _reload(self, load):
+        lm = load()
+
+        with self._reloading:
+            if lm.version == self.lm.version:
+                return
+
+            lexicon = self.lexicon
+            self.lm = lm
+            self.lexicon = frozenset()
+            self._words = {}
+
+        # the lexicon's forms may split under the new model; unless yet
+        # another model has been swapped in since, keep those that don't
+        if lexicon:
+            lexicon = frozenset(self.build_lexicon(lexicon))
+
+            with self._reloading:
+                if self.lm is lm:
+                    self.lexicon = lexicon
+
+    def watch(self, interval=1.0):
+        '''Poll the current model's files (for a compiled model, both the
+        compiled file and the model files it was compiled from) every
+        'interval' seconds in a background thread, and reload() the model
+        whenever they change. If a changed model fails to load (e.g., because
+        it is still being written), the old model stays in place and loading
+        is retried at the next poll.
+        '''
+        self.unwatch()
+        self._watcher = stop = threading.Event()
+
+        def poll():
+            stat = self.lm.stat()
+
+            while not stop.wait(interval):
+                lm = self.lm
+
+                try:
+                    current = lm.stat()
+
+                    if current != stat:
+                        self._reload(lm.reopen)
+                        stat = current
+
+                        # the new model's files may differ from the old's
+                        if self.lm.files != lm.files:
+                            stat = self.lm.stat()
+
+                # e.g., a file is missing or only partly written
+                except Exception:
+                    pass
+
+        thread = threading.Thread(target=poll)
+        thread.daemon = True
+        thread.start()
+
+    def unwatch(self):
+        '''Stop watching the model's files (see watch()).'''
+        if self._watcher is not None:
+            self._watcher.set()
+            self._watcher = None
+
+    def stem_hit_rate(self):
+        '''Return the proportion of stem cache lookups that were hits.'''
+        try:
+            return self.counts['stem_hit'] / float(
+                self.counts['stem_hit'] + self.counts['stem_miss'])
+
+        except ZeroDivisionError:
+            return 0.0
+
+    def bypass_rate(self):
+        '''Return the proportion of components that bypassed the segmenter.'''
+        try:
+            return self.counts['bypass'] / float(self.counts['component'])
+
+        except ZeroDivisionError:
+            return 0.0
+
+    def load_dictionary(self, filename):
+        '''Load a user compound dictionary from the TSV file 'filename'.
+
+        Each line pairs a form with its segmentation, e.g.:
+
+            kuukautta\tkuu=kautta
+
+        If the first column is omitted, the form is the segmentation minus
+        its delimiters. Forms must be alphabetic, except that a form ending
+        in '-' is a stem, which applies to any word that begins with it (the
+        longest stem wins), e.g.:
+
+            sosiaalidemokraat-\tsosiaali=demokraat
+
+        Forms are matched case-insensitively, before consulting the language
+        model. Loading another dictionary replaces the current one.
+        '''
+        forms, stems = {}, {}
+
+        with io.open(filename, encoding='utf-8') as f:
+            for n, line in enumerate(f, start=1):
+                form, _, segmentation = line.strip().partition('\t')
+
+                if not segmentation:
+                    segmentation = form
+                    form = form.replace('=', '')
+
+                if not form:
+                    continue
+
+                table = forms
+
+                if form.endswith('-'):
+                    form = form[:-1]
+                    segmentation = segmentation.rstrip('-')
+                    table = stems
+
+                form = form.lower()
+
+                # components are looked up by their alphabetic runs (see
+                # constituents()), which a form with any other characters
+                # never matches
+                if list(scan(form)) != [(0, len(form), ALPHA)]:
+                    raise ValueError(
+                        '%s, line %s: "%s" is not alphabetic' % (
+                            filename, n, form))
+
+                if segmentation.replace('=', '').lower() != form or \
+                        '' in segmentation.split('='):
+                    raise ValueError(
+                        '%s, line %s: "%s" is not a segmentation of "%s"' % (
+                            filename, n, segmentation, form))
+
+                table[form] = boundary_mask(segmentation)
+
+        # swap in the new dictionary all at once
+        self._dictionary = (
+            forms,
+            stems,
+            sorted(set(len(s) for s in stems), reverse=True),
+            )
+
+    def _look_up(self, comp):
+        # return the boundary mask of 'comp' if it is in the user dictionary;
+        # else, None
+        forms, stems, stem_lengths = self._dictionary
+
+        if not (forms or stems):
+            return None
+
+        comp = comp.lower()
+        mask = forms.get(comp)
+
+        if mask is None:
+            for n in stem_lengths:
+                if n <= len(comp):
+                    mask = stems.get(comp[:n])
+
+                    if mask is not None:
+                        break
+
+        if mask is not None:
+            self.counts['dictionary'] += 1
+
+        return mask
+
+    def _bypass(self, comp):
+        # return True if 'comp' is known to be simplex; a weighted MnWrd only
+        # penalizes splits into vowelless words, so nothing is known then
+        if self.weighted:
+            return False
+
+        if len(comp) < self.min_length or \
+                count_vowels(comp) < self.min_vowels or \
+                comp.lower() in self.lexicon:
+            self.counts['bypass'] += 1
+
+            return True
+
+        return False
+
+    def build_lexicon(self, words):
+        '''Return a sorted list of the forms in 'words' that segment() would
+        leave unsplit, minus those that the length and vowel gates already
+        bypass (cf. the "lexicon" argument).
+
+        Since the result depends on the language model, the lexicon should be
+        rebuilt whenever the model is retrained (see write_lexicon()).
+
+        Weighted segmenters consult no lexicon, so raise ValueError if this
+        one is weighted.
+        '''
+        if self.weighted:
+            raise ValueError('Weighted segmenters consult no lexicon.')
+
+        lexicon = set()
+
+        for word in set(w.lower() for w in words):
+            if word.isalpha() and not self._bypass(word) and \
+                    not self.is_complex(word):
+                lexicon.add(word)
+
+        return sorted(lexicon)
+
+    def write_lexicon(self, filename, words):
+        '''Write build_lexicon() of 'words' to the file 'filename', headed by
+        the version of the current model, so that segmenters of any other
+        model ignore it, e.g., from the training data:
+
+            with io.open(TRAINING_FILE, encoding='utf-8') as f:
+                words = f.read().split()
+
+            FinnSeg(lexicon=None).write_lexicon('simplex.txt', words)
+        '''
+        version = self.version
+        lexicon = self.build_lexicon(words)
+
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write('# version %s\n' % version)
+
+            for form in lexicon:
+                f.write(form + '\n')
+
+    @instrument.traced
+    def segment(self, word, budget=None):
+        '''Split 'word' into any constituent words, delimited by '='.'''
+        # return the segmentation in string form
+        return ''.join(self.constituents(word, budget))
+
+    @instrument.traced
+    def constituents(self, word, budget=None):
+        '''Split 'word' into alphabetic constituents and delimiters.
+
+        E.g., 'linja-autoaseman' > ['linja', '-', 'auto', '=', 'aseman']
+
+        If given, 'budget' limits the work done (see Budget).
+        '''
         token = []
 
         # split the word along any overt delimiters and iterate across the
         # components
-        for comp in nonalpha_split(word):
+        for i, j, kind in scan(word):
+            comp = word[i:j]
 
-            if len(comp) > 1 and comp[0].isalpha():
+            if kind == ALPHA and j - i > 1 and comp[0].isalpha():
 
-                # use the language model to obtain the component's morphemes
-                # comp = comp.lower()
-                morphemes = self.model.viterbi_segment(comp.lower())[0]
+                # emit the constituents of the component separated by '='
+                # delimiters
+                for constituent in self._segment(comp, budget):
+                    token.append(constituent)
+                    token.append('=')
 
-                # preserve capitalization of comp, since viterbi_segment() is
-                # case-sensitive... WELP
-                if comp != comp.lower():
-                    indices = [0, ]
-                    offset = 0
-                    for m in morphemes[:-1]:
-                        m = len(m) + offset
-                        indices.append(m)
-                        offset = m
-                    indices = zip(indices, indices[1:] + [None, ])
-                    morphemes = [comp[i:j] for i, j in indices]
+                token.pop()
+                continue
 
-                candidates = []
-                delimiter_sets = product(['#', '&'], repeat=len(morphemes) - 1)
+            token.append(comp)
 
-                # produce and score each candidate segmentation
-                for d in delimiter_sets:
-                    candidate = [x for y in izip(morphemes, d) for x in y]
-                    candidate = [c for c in candidate if c]
-                    candidates.append(candidate)
+        return token
 
-                candidates = self._score_candidates(comp, candidates)
+    @instrument.timed('segment')
+    def _segment(self, comp, budget=None):
+        # return the constituent words of the alphabetic component 'comp'
+        self.counts['component'] += 1
 
-                best = max(candidates)[0]
-                candidates = [c for c in candidates if c[0] == best]
+        # consult the user dictionary first
+        mask = self._look_up(comp)
 
-                # if multiple candidates have the same score, select the
-                # least segmented candidate
-                if len(candidates) > 1:
-                    candidates.sort(key=lambda c: c[1].count('='))
-                    comp = candidates[0][1]
+        if mask is not None:
+            return mask_split(comp, mask)
 
-                else:
-                    comp = max(candidates)[1]
+        if self._bypass(comp):
+            return [comp, ]
 
-            token.append(comp)
+        if self.stem_cache:
+            mask = self._cached(comp, self.lm)
 
-        # return the segmentation in string form
-        return ''.join(token)
+            if mask is not None:
+                return mask_split(comp, mask)
+
+        # leave the component unsegmented if it is too long, or once the time
+        # is spent
+        if budget is not None and (
+                budget.exceeded('max_length', len(comp)) or budget.expired()):
+            return [comp, ]
+
+        lm = self.lm
+        morphemes = lm.morphemes(comp)
+
+        # leave the component unsegmented if it has too many candidates
+        if budget is not None and budget.exceeded(
+                'max_candidates', 2 ** (len(morphemes) - 1)):
+            return [comp, ]
+
+        segmentation = self._select(comp, morphemes, lm)
+
+        # don't cache a segmentation from a model that has since been replaced
+        if self.stem_cache and lm is self.lm:
+            self._cache(comp, boundary_mask(segmentation))
+
+        return segmentation.split('=')
+
+    def _cached(self, comp, lm):
+        # return the cached boundary mask of 'comp', or of its stem; if there
+        # is any doubt, return None
+        word = comp.lower()
+        mask = self._words.get(word)
+        morphs = None
+
+        if mask is None:
+            for n in _suffix_lengths(word):
+                stem = word[:-n]
+                mask = self._words.get(stem)
 
-    def _score_candidates(self, comp, candidates):
+                # only a complex stem's own segmentation is reused, and only if
+                # Morfessor splits off the ending as a morpheme, the ending
+                # cannot stand alone as a word, and it joins the stem's final
+                # constituent word without violating any constraints
+                if mask:
+                    if morphs is None:
+                        morphs = boundary_mask('='.join(lm.morphemes(word)))
+
+                    final = word[mask.bit_length() - 1:]
+
+                    if morphs >> len(stem) & 1 and not all(
+                            c.test(word[-n:]) for c in self.constraints) and \
+                            all(c.test(final) for c in self.constraints):
+                        break
+
+                mask = None
+
+        self.counts['stem_miss' if mask is None else 'stem_hit'] += 1
+
+        return mask
+
+    def _cache(self, comp, mask):
+        # cache the boundary mask of 'comp', which its inflected forms may
+        # reuse (see _cached())
+        if len(self._words) >= self.stem_cache:
+            self._words.clear()
+
+        self._words[comp.lower()] = mask
+
+    @instrument.traced
+    def is_complex(self, word, budget=None):
+        '''Return True if 'word' is composed of multiple words; else, False.
+
+        This is equivalent to testing whether segment(word, budget) is
+        non-alphabetic, but stops as soon as the outcome is known.
+        '''
+        # segmentation preserves any delimiters, so non-alphabetic input is
+        # always complex
+        if not word.isalpha():
+            return True
+
+        if len(word) < 2:
+            return False
+
+        self.counts['component'] += 1
+        mask = self._look_up(word)
+
+        if mask is not None:
+            return bool(mask)
+
+        if self._bypass(word):
+            return False
+
+        if self.stem_cache:
+            mask = self._cached(word, self.lm)
+
+            if mask is not None:
+                return bool(mask)
+
+        if budget is not None and (
+                budget.exceeded('max_length', len(word)) or budget.expired()):
+            return False
+
+        lm = self.lm
+        morphemes = lm.morphemes(word)
+
+        # a single morpheme cannot be split
+        if len(morphemes) == 1:
+            return False
+
+        if budget is not None and budget.exceeded(
+                'max_candidates', 2 ** (len(morphemes) - 1)):
+            return False
+
+        # weighted constraints never rule out a candidate outright, so every
+        # candidate must be scored
+        if self.weighted:
+            return '=' in self._select(word, morphemes, lm)
+
+        candidates = self._apply_constraints(self._candidates(morphemes))
+
+        # if every candidate violates some constraint, segment() backs off to
+        # the simplex candidate
+        if not candidates:
+            return False
+
+        # the simplex candidate is always last (delimited solely by '&'); if
+        # it was filtered out, the winner is necessarily complex
+        if '=' in candidates[-1][1]:
+            return True
+
+        # otherwise, the word is complex only if some complex candidate
+        # outscores the simplex candidate (ties favor the least segmented)
+        simplex = lm.score(candidates.pop()[0])
+
+        for cand, _ in candidates:
+            if lm.score(cand) > simplex:
+                return True
+
+        return False
+
+    def _select(self, comp, morphemes, lm):
+        # produce and score each candidate segmentation with the language
+        # model 'lm'
+        candidates = self._candidates(morphemes)
         count = len(candidates)
+        candidates, survived = self._score_candidates(comp, candidates, lm)
 
-        # (['#', 'm', '&', 'm', '#', 'm', '#'], 'mm=m')
-        for i, cand in enumerate(candidates):
-            cand = ''.join(cand)
-            cand = cand.replace('#', '=').replace('&', '')
-            candidates[i] = (['#', ] + candidates[i] + ['#', ], cand)
+        best = max(candidates)[0]
+        candidates = [c for c in candidates if c[0] == best]
 
-        if count > 1:
-            #         Cand1   Cand2
-            # C1      [0,     0]
-            # C2      [0,     0]
-            # C3      [0,     0]
-            tableau = [[0] * count for i in range(self.constraint_count)]
+        # if multiple candidates have the same score, select the least
+        # segmented candidate
+        if len(candidates) > 1:
+            candidates.sort(key=lambda c: c[1].count('='))
+            segmentation = candidates[0][1]
 
-            for i, const in enumerate(self.constraints):
-                for j, cand in enumerate(candidates):
-                    for seg in cand[1].split('='):
-                        tableau[i][j] += 0 if const.test(seg) else 1
+        else:
+            segmentation = max(candidates)[1]
 
-                # ignore violations when they are incurred by every candidate
-                min_violations = min(tableau[i])
-                tableau[i] = [v - min_violations for v in tableau[i]]
+        if instrument.TRACING:
+            instrument.emit(
+                'segment',
+                component=comp,
+                candidates=count,
+                survived=survived,
+                segmentation=segmentation,
+                )
+
+        return segmentation
+
+    def _candidates(self, morphemes):
+        # produce every candidate segmentation, where '#' marks a word boundary
+        # and '&' marks a word-internal morpheme boundary, e.g.,
+        # ['m', '&', 'm', '#', 'm']
+        candidates = []
+        delimiter_sets = product(['#', '&'], repeat=len(morphemes) - 1)
+
+        for d in delimiter_sets:
+            candidate = [x for y in izip(morphemes, d) for x in y]
+            candidate = [c for c in candidate if c]
+            candidates.append(candidate)
+
+        return candidates
 
+    def _score_candidates(self, comp, candidates, lm):
+        # return the scored candidates and the number of candidates that
+        # violate no constraint
+        if self.weighted:
+            return self._weigh_candidates(candidates, lm)
+
+        candidates = self._apply_constraints(candidates)
+
+        # if every candidate violates some constraint, back off to the
+        # simplex candidate
+        if len(candidates) == 0:
+            return [(1.0, comp)], 0
+
+        return [(lm.score(c1), c2) for c1, c2 in candidates], len(candidates)
+
+    def _apply_constraints(self, candidates):
+        tableau = self._tableau(candidates)
+
+        if tableau:
             # tally the number of violations for each candidate
             violations = {
                 c[1]: sum(
@@ -256,45 +1467,53 @@ class FinnSeg(object):
             # filter out candidates that violate any constraints
             candidates = [c for c in candidates if not violations[c[1]]]
 
-            # if every candidate violates some constraint, back off to the
-            # simplex candidate
-            if len(candidates) == 0:
-                return [(1.0, comp)]
+        return candidates
 
-        return [(self._score_candidate(c1), c2) for c1, c2 in candidates]
+    def _weigh_candidates(self, candidates, lm):
+        # score each candidate by its language model score plus its harmony
+        # (i.e., its negated, weighted constraint violations)
+        tableau = self._tableau(candidates)
 
-    def _score_candidate(self, candidate):  # Stupid Backoff smoothing
-        score = 0
-
-        for i, morpheme in enumerate(candidate):
-            C = morpheme.lower()
-
-            if i > 0:
-                B = candidate[i-1].lower()
+        if tableau:
+            harmonies = harmony(tableau, [c.weight for c in self.constraints])
+            survived = sum(not any(column) for column in zip(*tableau))
 
-                if i > 1:
-                    A = candidate[i-2].lower()
-                    ABC = A + ' ' + B + ' ' + C
-                    ABC_count = self.ngrams.get(ABC, 0)
+        else:
+            harmonies = [0.0] * len(candidates)
+            survived = len(candidates)
+
+        return [
+            (round(lm.score(c1) + h, 4), c2)
+            for h, (c1, c2) in zip(harmonies, candidates)
+            ], survived
+
+    @instrument.timed('segment.constraints')
+    def _tableau(self, candidates):
+        # pair each candidate with its segmentation in place, e.g.,
+        # (['#', 'm', '&', 'm', '#', 'm', '#'], 'mm=m'), and return the
+        # candidates' constraint violations (or None, if there is only one
+        # candidate)
+        count = len(candidates)
 
-                    if ABC_count:
-                        AB = A + ' ' + B
-                        AB_count = self.ngrams[AB]
-                        score += math.log(ABC_count)
-                        score -= math.log(AB_count)
-                        continue
+        for i, cand in enumerate(candidates):
+            cand = ''.join(cand)
+            cand = cand.replace('#', '=').replace('&', '')
+            candidates[i] = (['#', ] + candidates[i] + ['#', ], cand)
 
-                BC = B + ' ' + C
-                BC_count = self.ngrams.get(BC, 0)
+        if count > 1:
+            #         Cand1   Cand2
+            # C1      [0,     0]
+            # C2      [0,     0]
+            # C3      [0,     0]
+            tableau = [[0] * count for i in range(self.constraint_count)]
 
-                if BC_count:
-                    B_count = self.ngrams[B]
-                    score += math.log(BC_count * 0.4)
-                    score -= math.log(B_count)
-                    continue
+            for i, const in enumerate(self.constraints):
+                for j, cand in enumerate(candidates):
+                    for seg in cand[1].split('='):
+                        tableau[i][j] += 0 if const.test(seg) else 1
 
-            C_count = self.ngrams.get(C, 1)  # Laplace smoothed unigram
-            score += math.log(C_count * 0.4 * 0.4)
-            score -= math.log(self.total + len(self.vocab) + 1)
+                # ignore violations when they are incurred by every candidate
+                min_violations = min(tableau[i])
+                tableau[i] = [v - min_violations for v in tableau[i]]
 
-        return round(score, 4)
+            return tableau
@@ -0,0 +1,573 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import math
+import re
+import struct
+import sys
+
+from array import array
+from zlib import crc32
+
+# Compiled tables -------------------------------------------------------------
+
+# A compiled model is a single flat buffer, which can be published in shared
+# memory or memory-mapped from a file (see bake.py) and read in place by any
+# number of processes, without copying or unpickling anything:
+#
+#   a PREFIX and the metadata (JSON)
+#   a Table of morph ids (see ngrams.py)
+#   an array of unigram log probabilities, indexed by morph id
+#   an IntTable of bigram log probabilities (with backoff)
+#   an IntTable of trigram log probabilities
+#   a Table of the counts of the Morfessor model's (unsplit) morphs
+#   a Table of the counts of the Morfessor lexicon's atoms (i.e., letters)
+#
+# Each section begins with a HEADER, and every part of a section is padded to
+# a multiple of 8 bytes. The arrays use the byte order of the machine that
+# compiled them, which the metadata records.
+#
+# A compiled lexicon holds just the last two tables, i.e., the Morfessor model
+# alone (see compile_lexicon()).
+
+MAGIC = b'FSYLTBL3'
+LEXICON_MAGIC = b'FSYLLEX1'
+
+# MAGIC, the length of the metadata, the length of everything after the
+# PREFIX, and its SHA-1 checksum, padded to 8 bytes
+PREFIX = struct.Struct('<8sII20s4x')
+
+# typecode, number of items, number of hash slots, and length of the key bytes
+HEADER = struct.Struct('<4sIII')
+
+
+def _align(n):
+    # round 'n' up to a multiple of 8 bytes
+    return -(-n // 8) * 8
+
+
+def _pad(data):
+    return data + b'\0' * (_align(len(data)) - len(data))
+
+
+def _slots(n):
+    # return the size of an open-addressing hash table for 'n' items, at most
+    # half full
+    size = 1
+
+    while size < 2 * n:
+        size *= 2
+
+    return size
+
+
+def _hash(k, shift):
+    # Fibonacci hashing of the int 'k' into 32 - 'shift' bits
+    return ((k * 0x9E3779B1) & 0xFFFFFFFF) >> shift
+
+
+def pack_array(values, typecode='I'):
+    '''Return 'values' as an array section (see read_array()).'''
+    values = array(typecode, values)
+    header = HEADER.pack(typecode.encode('ascii'), len(values), 0, 0)
+
+    return _pad(header) + _pad(values.tobytes())
+
+
+def pack_table(mapping, typecode='I'):
+    '''Return the strings and numbers of 'mapping' as a Table section, whose
+    values are stored in an array of 'typecode'.'''
+    keys = [k.encode('utf-8') for k in mapping]
+    values = array(typecode, mapping.values())
+    starts = array('I', [0])
+
+    for k in keys:
+        starts.append(starts[-1] + len(k))
+
+    # slots hold key indices plus one (zero marks an empty slot)
+    size = _slots(len(keys))
+    slots = array('I', [0]) * size
+
+    for i, k in enumerate(keys):
+        h = crc32(k) & (size - 1)
+
+        while slots[h]:
+            h = (h + 1) & (size - 1)
+
+        slots[h] = i + 1
+
+    blob = b''.join(keys)
+    header = HEADER.pack(
+        typecode.encode('ascii'), len(keys), size, len(blob))
+
+    return b''.join([
+        _pad(header),
+        _pad(slots.tobytes()),
+        _pad(starts.tobytes()),
+        _pad(values.tobytes()),
+        _pad(blob),
+        ])
+
+
+def pack_int_table(mapping, typecode='I'):
+    '''Return the ints and numbers of 'mapping' as an IntTable section, whose
+    values are stored in an array of 'typecode'.'''
+    keys = array('Q', mapping.keys())
+    values = array(typecode, mapping.values())
+
+    size = _slots(len(keys))
+    shift = 33 - size.bit_length()
+    slots = array('I', [0]) * size
+
+    for i, k in enumerate(keys):
+        h = _hash(k, shift)
+
+        while slots[h]:
+            h = (h + 1) & (size - 1)
+
+        slots[h] = i + 1
+
+    header = HEADER.pack(typecode.encode('ascii'), len(keys), size, 0)
+
+    return b''.join([
+        _pad(header),
+        _pad(slots.tobytes()),
+        _pad(keys.tobytes()),
+        _pad(values.tobytes()),
+        ])
+
+
+class _Section(object):
+    # a section of a compiled buffer, which begins at 'offset'; "end" is the
+    # offset of the next section
+
+    def __init__(self, buffer, offset=0):
+        self._view = memoryview(buffer).cast('B')
+        typecode, self._count, self._size, self._length = \
+            HEADER.unpack_from(self._view, offset)
+        self.typecode = typecode.rstrip(b'\0').decode('ascii')
+        self.end = offset + _align(HEADER.size)
+
+    def _take(self, nbytes, typecode='B'):
+        # return the next 'nbytes' of the section, as an array of 'typecode'
+        start = self.end
+        self.end = _align(start + nbytes)
+
+        return self._view[start:start + nbytes].cast(typecode)
+
+    def _take_values(self):
+        itemsize = array(self.typecode).itemsize
+
+        return self._take(itemsize * self._count, self.typecode)
+
+
+def read_array(buffer, offset=0):
+    '''Return the array section of 'buffer' at 'offset', read in place, and
+    the offset of the next section.'''
+    section = _Section(buffer, offset)
+    values = section._take_values()
+
+    return values, section.end
+
+
+class Table(_Section):
+    '''A read-only mapping of strings to numbers, read in place from a
+    section produced by pack_table().'''
+
+    def __init__(self, buffer, offset=0):
+        super(Table, self).__init__(buffer, offset)
+        self._mask = self._size - 1
+        self._slots = self._take(4 * self._size, 'I')
+        self._starts = self._take(4 * (self._count + 1), 'I')
+        self._values = self._take_values()
+        self._blob = self._take(self._length)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return self._index(key) is not None
+
+    def __getitem__(self, key):
+        i = self._index(key)
+
+        if i is None:
+            raise KeyError(key)
+
+        return self._values[i]
+
+    def get(self, key, default=None):
+        # the body of _index(), inlined for speed
+        key = key.encode('utf-8')
+        slots, starts, blob, mask = \
+            self._slots, self._starts, self._blob, self._mask
+        h = crc32(key) & mask
+
+        while True:
+            i = slots[h]
+
+            if not i:
+                return default
+
+            if blob[starts[i - 1]:starts[i]] == key:
+                return self._values[i - 1]
+
+            h = (h + 1) & mask
+
+    def items(self):
+        starts, blob = self._starts, self._blob
+
+        for i, value in enumerate(self._values):
+            k = blob[starts[i]:starts[i + 1]].tobytes().decode('utf-8')
+
+            yield k, value
+
+    def _index(self, key):
+        # return the index of 'key', or None if it is absent
+        key = key.encode('utf-8')
+        slots, starts, blob, mask = \
+            self._slots, self._starts, self._blob, self._mask
+        h = crc32(key) & mask
+
+        while True:
+            i = slots[h]
+
+            if not i:
+                return None
+
+            if blob[starts[i - 1]:starts[i]] == key:
+                return i - 1
+
+            h = (h + 1) & mask
+
+
+class IntTable(_Section):
+    '''A read-only mapping of ints to numbers, read in place from a section
+    produced by pack_int_table().'''
+
+    def __init__(self, buffer, offset=0):
+        super(IntTable, self).__init__(buffer, offset)
+        self._mask = self._size - 1
+        self._shift = 33 - self._size.bit_length()
+        self._slots = self._take(4 * self._size, 'I')
+        self._keys = self._take(8 * self._count, 'Q')
+        self._values = self._take_values()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return self._index(key) is not None
+
+    def __getitem__(self, key):
+        i = self._index(key)
+
+        if i is None:
+            raise KeyError(key)
+
+        return self._values[i]
+
+    def get(self, key, default=None):
+        # the body of _index(), inlined for speed
+        slots, keys, mask = self._slots, self._keys, self._mask
+        h = _hash(key, self._shift)
+
+        while True:
+            i = slots[h]
+
+            if not i:
+                return default
+
+            if keys[i - 1] == key:
+                return self._values[i - 1]
+
+            h = (h + 1) & mask
+
+    def items(self):
+        return zip(self._keys, self._values)
+
+    def _index(self, key):
+        # return the index of 'key', or None if it is absent
+        slots, keys, mask = self._slots, self._keys, self._mask
+        h = _hash(key, self._shift)
+
+        while True:
+            i = slots[h]
+
+            if not i:
+                return None
+
+            if keys[i - 1] == key:
+                return i - 1
+
+            h = (h + 1) & mask
+
+
+# Models ----------------------------------------------------------------------
+
+def log_probabilities(ids, unigrams, bigrams, trigrams, total):
+    '''Return the Stupid Backoff log probabilities of the n-gram counts of
+    each order (see ngrams.py), given the total morph count: an array of
+    unigram log probabilities, a dictionary of bigram log probabilities, a
+    dictionary of trigram log probabilities, and the log probability of an
+    unknown morph.'''
+    size = len(ids)
+    denominator = math.log(total + size + 1)
+
+    return (
+        array('d', [math.log(c * 0.4 * 0.4) - denominator for c in unigrams]),
+        dict(
+            (k, math.log(c * 0.4) - math.log(unigrams[k // size]))
+            for k, c in bigrams.items()),
+        dict(
+            (k, math.log(c) - math.log(bigrams[k // size]))
+            for k, c in trigrams.items()),
+        math.log(1 * 0.4 * 0.4) - denominator,
+        )
+
+
+def _lexicon(model):
+    # return the sections and metadata of a Morfessor baseline 'model', or of
+    # a compiled one (see Morphs)
+    if isinstance(model, Morphs):
+        morphs, atoms = dict(model.morphs.items()), dict(model.atoms.items())
+        corpus = [
+            model.corpus_tokens, model.corpus_boundaries, model.corpus_weight]
+        lexicon = [model.lexicon_tokens, model.lexicon_boundaries]
+
+    else:
+        morphs = dict(
+            (c, a.count) for c, a in model._analyses.items() if not a.splitloc)
+
+        if any(count <= 0 for count in morphs.values()):
+            raise ValueError('The Morfessor model has non-positive counts.')
+
+        corpus, lexicon = model._corpus_coding, model._lexicon_coding
+        atoms = lexicon.atoms
+        corpus = [corpus.tokens, corpus.boundaries, corpus.weight]
+        lexicon = [lexicon.tokens, lexicon.boundaries]
+
+    return [pack_table(morphs), pack_table(atoms)], {
+        'corpus': corpus,
+        'lexicon': lexicon,
+        'nosplit': model.nosplit_re.pattern if model.nosplit_re else None,
+        }
+
+
+def _compile(magic, sections, meta):
+    meta['byteorder'] = sys.byteorder
+    body = _pad(json.dumps(meta, sort_keys=True).encode('utf-8'))
+    meta_length = len(body)
+    body += b''.join(sections)
+    checksum = hashlib.sha1(body).digest()
+
+    return PREFIX.pack(magic, meta_length, len(body), checksum) + body
+
+
+def compile_model(model, ids, unigrams, bigrams, trigrams, total, **meta):
+    '''Return a compiled model buffer, given a Morfessor baseline 'model'
+    (or a compiled one; see Morphs), the morph ids and n-gram counts of each
+    order (see ngrams.py), and the total morph count. Any other keyword
+    arguments (e.g., the model's version) are stored in the metadata.'''
+    lexicon, lexicon_meta = _lexicon(model)
+    unigrams, bigrams, trigrams, unknown = log_probabilities(
+        ids, unigrams, bigrams, trigrams, total)
+    sections = [
+        pack_table(ids),
+        pack_array(unigrams, 'd'),
+        pack_int_table(bigrams, 'd'),
+        pack_int_table(trigrams, 'd'),
+        ]
+    meta.update(lexicon_meta, total=total, unknown=unknown)
+
+    return _compile(MAGIC, sections + lexicon, meta)
+
+
+def compile_lexicon(model, **meta):
+    '''Return the Morfessor baseline 'model' as a compiled lexicon buffer,
+    which holds only what its viterbi_segment() consults (see Morphs). Any
+    keyword arguments are stored in the metadata.'''
+    lexicon, lexicon_meta = _lexicon(model)
+    meta.update(lexicon_meta)
+
+    return _compile(LEXICON_MAGIC, lexicon, meta)
+
+
+def compiled_size(buffer):
+    '''Return the length of the compiled model at the start of 'buffer'.'''
+    return PREFIX.size + PREFIX.unpack_from(buffer, 0)[2]
+
+
+def _load(buffer, magic, verify, name):
+    # return the metadata of the compiled buffer, and the offset of its first
+    # section
+    if not hasattr(memoryview, 'cast'):  # Python 2
+        raise ValueError('The compiled %s requires Python 3.' % name)
+
+    try:
+        found, length, size, checksum = PREFIX.unpack_from(buffer, 0)
+
+    except struct.error:
+        found = None
+
+    if found != magic:
+        raise ValueError('Not a compiled FinnSyll %s.' % name)
+
+    offset = PREFIX.size
+
+    if verify and \
+            hashlib.sha1(buffer[offset:offset + size]).digest() != checksum:
+        raise ValueError('The compiled %s is corrupt.' % name)
+
+    meta = json.loads(
+        bytes(buffer[offset:offset + length]).rstrip(b'\0').decode('utf-8'))
+
+    if meta['byteorder'] != sys.byteorder:
+        raise ValueError(
+            'The compiled %s is %s-endian.' % (name, meta['byteorder']))
+
+    return meta, offset + length
+
+
+def load_model(buffer, verify=False):
+    '''Return the metadata, morph ids, unigram log probabilities, bigram
+    log probabilities, trigram log probabilities, and Morfessor model (see
+    Morphs) of the compiled model 'buffer', reading the tables in place.
+
+    Raise ValueError if 'buffer' is not a compiled model that this machine
+    can read, or if 'verify' is True and its checksum does not match.
+    '''
+    meta, offset = _load(buffer, MAGIC, verify, 'model (version 3)')
+    ids = Table(buffer, offset)
+    unigrams, end = read_array(buffer, ids.end)
+    bigrams = IntTable(buffer, end)
+    trigrams = IntTable(buffer, bigrams.end)
+    morphs = Table(buffer, trigrams.end)
+    atoms = Table(buffer, morphs.end)
+
+    return meta, ids, unigrams, bigrams, trigrams, Morphs(meta, morphs, atoms)
+
+
+def load_lexicon(buffer, verify=False):
+    '''Return the metadata and Morfessor model (see Morphs) of the compiled
+    lexicon 'buffer', reading the tables in place, or raise ValueError as
+    load_model() does.'''
+    meta, offset = _load(buffer, LEXICON_MAGIC, verify, 'lexicon')
+    morphs = Table(buffer, offset)
+    atoms = Table(buffer, morphs.end)
+
+    return meta, Morphs(meta, morphs, atoms)
+
+
+class Morphs(object):
+    '''The parts of a Morfessor baseline model that its viterbi_segment()
+    consults, read from compiled tables.'''
+
+    def __init__(self, meta, morphs, atoms):
+        self.morphs = morphs
+        self.atoms = atoms
+        self.corpus_tokens, self.corpus_boundaries, self.corpus_weight = \
+            meta['corpus']
+        self.lexicon_tokens, self.lexicon_boundaries = meta['lexicon']
+        self.nosplit_re = meta['nosplit'] and re.compile(meta['nosplit'])
+
+        # the lexicon has only a few dozen atoms, whose log counts are
+        # looked up for every character of every unknown construction
+        self._log_atoms = dict((a, math.log(c)) for a, c in atoms.items())
+
+    def get_codelength(self, construction):
+        # the approximate lexicon code length of a new construction
+        n = len(construction) + 1
+        cost = n * math.log(self.lexicon_tokens + n)
+        cost -= math.log(self.lexicon_boundaries + 1)
+        log_atoms = self._log_atoms
+
+        for atom in construction:
+            cost -= log_atoms.get(atom, 0.0)  # log(1) for unknown atoms
+
+        return cost
+
+    def viterbi_segment(self, compound, addcount=1.0, maxlen=30):
+        '''Return the most probable segmentation of 'compound' and its cost,
+        as Morfessor's BaselineModel.viterbi_segment() does.'''
+        clen = len(compound)
+        grid = [(0.0, None)]
+        tokens = self.corpus_tokens + self.corpus_boundaries
+
+        if tokens + addcount > 0:
+            logtokens = math.log(tokens + addcount)
+
+        else:
+            logtokens = 0
+
+        badlikelihood = clen * logtokens + 1.0
+        get = self.morphs.get
+
+        for t in range(1, clen + 1):
+            bestpath = None
+            bestcost = None
+
+            if self.nosplit_re and t < clen and \
+                    self.nosplit_re.match(compound[(t - 1):(t + 1)]):
+                grid.append((clen * badlikelihood, t - 1))
+                continue
+
+            for pt in range(max(0, t - maxlen), t):
+                if grid[pt][0] is None:
+                    continue
+
+                cost = grid[pt][0]
+                construction = compound[pt:t]
+                count = get(construction)
+
+                if count is not None:
+                    cost += logtokens - math.log(count + addcount)
+
+                elif addcount > 0:
+                    if self.corpus_tokens == 0:
+                        cost += (
+                            addcount * math.log(addcount) +
+                            self.get_codelength(construction) /
+                            self.corpus_weight)
+
+                    else:
+                        boundaries = self.lexicon_boundaries
+                        cost += (
+                            logtokens - math.log(addcount) + (
+                                (boundaries + addcount) *
+                                math.log(boundaries + addcount) -
+                                boundaries * math.log(boundaries) +
+                                self.get_codelength(construction)
+                                ) / self.corpus_weight)
+
+                elif len(construction) == 1:
+                    cost += badlikelihood
+
+                elif self.nosplit_re:
+                    cost += len(construction) * badlikelihood
+
+                else:
+                    continue
+
+                if bestcost is None or cost < bestcost:
+                    bestcost = cost
+                    bestpath = pt
+
+            grid.append((bestcost, bestpath))
+
+        constructions = []
+        cost, path = grid[-1]
+        lt = clen + 1
+
+        while path is not None:
+            t = path
+            constructions.append(compound[t:lt])
+            path = grid[t][1]
+            lt = t
+
+        constructions.reverse()
+        cost += math.log(tokens) - math.log(self.corpus_boundaries)
+
+        return constructions, cost
@@ -0,0 +1,859 @@
+# coding=utf-8
+# python -m finnsyll.train morfessor CORPUS [CORPUS ...] --output FILE
+#     [--lexicon FILE] [--processes N] [--min-count N] [--dampening TYPE]
+#     [--sample N] [--seed N] [--max-epochs N] [--report FILE]
+# python -m finnsyll.train ngrams CORPUS [CORPUS ...] --output FILE
+#     [--morfessor FILE] [--legacy] [--processes N] [--max-ngrams N]
+#     [--sketch MEGABYTES] [--min-count N]
+from __future__ import division, print_function, unicode_literals
+
+try:
+    import cpickle as pickle
+
+except ImportError:
+    import pickle
+
+import argparse
+import hashlib
+import heapq
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+
+try:
+    import resource
+
+except ImportError:  # Windows
+    resource = None
+
+from array import array
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from timeit import default_timer as timer
+
+import morfessor
+
+from . import ngrams
+from .phonology import is_foreign
+from .syllabifier import MORFESSOR_FILE, load_morfessor
+from .tables import compile_lexicon
+from .utilities import ALPHA, scan
+
+# Training corpora ------------------------------------------------------------
+
+# A segmented corpus is text in which '=' marks the boundaries between the
+# constituent words of a compound, as in the output of FinnSeg.segment(),
+# e.g., 'työ=ministeriön linja-auto=aseman'. Any other punctuation or
+# whitespace ends a word. Each constituent is split into morphs with the
+# Morfessor model, and each word becomes a sequence of morphs bounded by '#',
+# with '#' between constituents and '&' between the morphs of a constituent,
+# as in the segmenter's candidates (see FinnSeg._candidates()):
+#
+#   'työ=ministeriön' > ['#', 'työ', '#', 'ministeriö', '&', 'n', '#']
+#
+# Corpora are read in chunks of about CHUNK_SIZE bytes, split at whitespace.
+
+CHUNK_SIZE = 1 << 24
+
+# the distinct constituents whose morphs each process remembers
+SEGMENT_CACHE = 100000
+
+WHITESPACE = re.compile(br'\s')
+
+
+def chunks(filenames, size=CHUNK_SIZE):
+    '''Return the (filename, start, end) byte ranges that split the files
+    'filenames' into chunks of about 'size' bytes (see read_chunk()).'''
+    ranges = []
+
+    for filename in filenames:
+        length = os.path.getsize(filename)
+
+        for start in range(0, length, size):
+            ranges.append((filename, start, min(start + size, length)))
+
+    return ranges
+
+
+def read_chunk(chunk):
+    '''Return the text of the byte range 'chunk' (see chunks()), moved to
+    whitespace: a token that straddles the start of the range belongs to the
+    previous range, and one that straddles its end belongs to this one.'''
+    filename, start, end = chunk
+
+    with open(filename, 'rb') as f:
+        f.seek(max(start - 1, 0))
+        data = f.read(end - start + (1 if start else 0))
+
+        if start:
+            m = WHITESPACE.search(data)
+            data = data[m.start():] if m else b''
+
+        while data and not WHITESPACE.match(data[-1:]):
+            more = f.read(4096)
+            m = WHITESPACE.search(more)
+
+            if m:
+                data += more[:m.start()]
+                break
+
+            data += more
+
+            if not more:
+                break
+
+    return data.decode('utf-8', 'replace')
+
+
+def sequences(text, segment):
+    '''Yield the morph sequence of each word in the segmented corpus 'text',
+    splitting each constituent into morphs with 'segment'.'''
+    text = text.lower()
+    sequence = ['#']
+
+    for i, j, kind in scan(text):
+        token = text[i:j]
+
+        if kind == ALPHA:
+            for morph in segment(token):
+                sequence.append(morph)
+                sequence.append('&')
+
+            sequence[-1] = '#'
+
+        elif token != '=' and len(sequence) > 1:
+            yield sequence
+            sequence = ['#']
+
+    if len(sequence) > 1:
+        yield sequence
+
+
+# Counting --------------------------------------------------------------------
+
+# the run files that an NgramCounter keeps before merging them into one
+MAX_RUNS = 64
+
+
+class NgramCounter(object):
+    '''Counts of morph unigrams, bigrams, and trigrams, keyed by space-joined
+    morphs as in the legacy n-gram pickle (see ngrams.py), which can be merged
+    with the counts of other processes (see update()).
+
+    If 'max_ngrams' is given, the counts are spilled to a sorted run file in
+    'directory' (by default, the system's temporary directory) whenever more
+    than that many distinct n-grams are held in memory, and the runs are
+    merged as the counts are read (see items()). Call close() to remove the
+    runs.
+    '''
+
+    def __init__(self, max_ngrams=None, directory=None):
+        self.counts = Counter()
+        self.total = 0  # the number of morphs and delimiters counted
+        self.runs = []
+        self.max_ngrams = max_ngrams
+        self.directory = directory
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, sequence):
+        '''Count the n-grams of the morph 'sequence'.'''
+        counts = self.counts
+
+        for n in (1, 2, 3):
+            for i in range(len(sequence) - n + 1):
+                counts[' '.join(sequence[i:i + n])] += 1
+
+        self.total += len(sequence)
+
+        if self.max_ngrams and len(counts) > self.max_ngrams:
+            self.spill()
+
+    def update(self, other):
+        '''Add the counts (and runs) of the NgramCounter 'other'.'''
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.runs.extend(other.runs)
+        other.runs = []
+
+        if self.max_ngrams and len(self.counts) > self.max_ngrams:
+            self.spill()
+
+        elif len(self.runs) > MAX_RUNS:
+            self._merge_runs()
+
+    def spill(self):
+        '''Move the counts held in memory into a new run file.'''
+        self.runs.append(self._write_run(sorted(self.counts.items())))
+        self.counts = Counter()
+
+        if len(self.runs) > MAX_RUNS:
+            self._merge_runs()
+
+    def items(self):
+        '''Yield each n-gram and its count, in sorted order.'''
+        streams = [_read_run(run) for run in self.runs]
+        streams.append(sorted(self.counts.items()))
+
+        for ngram, group in groupby(heapq.merge(*streams), itemgetter(0)):
+            yield ngram, sum(count for _, count in group)
+
+    def close(self):
+        '''Remove any run files.'''
+        for run in self.runs:
+            os.remove(run)
+
+        self.runs = []
+
+    def _write_run(self, items):
+        fd, filename = tempfile.mkstemp(suffix='.run', dir=self.directory)
+
+        with io.open(fd, 'w', encoding='utf-8') as f:
+            for ngram, count in items:
+                f.write('%s\t%d\n' % (ngram, count))
+
+        return filename
+
+    def _merge_runs(self):
+        # merge every run into one, so that items() never holds too many
+        # files open at once
+        counts, self.counts = self.counts, Counter()
+        run = self._write_run(self.items())
+        self.close()
+        self.runs, self.counts = [run], counts
+
+
+def _read_run(filename):
+    with io.open(filename, encoding='utf-8') as f:
+        for line in f:
+            ngram, count = line.rstrip('\n').split('\t')
+            yield ngram, int(count)
+
+
+class CountMinSketch(object):
+    '''A count-min sketch of 'depth' rows of 'width' counters, which
+    estimates the counts of a stream of keys in fixed memory.
+
+    An estimate is never below the key's true count, and exceeds it by more
+    than e * N / width (where N is the sum of all counts) with a probability
+    of at most e ** -depth. Sketches of the same size merge by adding their
+    counters (see update()).
+    '''
+
+    def __init__(self, width, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = array('Q', [0]) * (width * depth)
+
+    def _cells(self, key):
+        # double hashing, with a stable hash shared by every process
+        h = int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+        h1, h2 = h & 0xffffffff, (h >> 32) | 1
+        width = self.width
+
+        return [
+            row * width + (h1 + row * h2) % width
+            for row in range(self.depth)
+            ]
+
+    def add(self, key, count=1):
+        table = self.table
+
+        for i in self._cells(key):
+            table[i] += count
+
+    def estimate(self, key):
+        table = self.table
+
+        return min(table[i] for i in self._cells(key))
+
+    def update(self, other):
+        '''Add the counters of the equally sized sketch 'other'.'''
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError('Cannot merge sketches of different sizes.')
+
+        table = self.table
+
+        for i, count in enumerate(other.table):
+            if count:
+                table[i] += count
+
+
+def sketch_width(megabytes, depth=4):
+    '''Return the width of the bigram and trigram sketches that together
+    take up about 'megabytes' of memory.'''
+    return max(1, int(megabytes * 2 ** 20) // (2 * depth * 8))
+
+
+# Workers ---------------------------------------------------------------------
+
+# each process's Morfessor model and cache of segmented constituents
+_model = None
+_segments = {}
+
+
+def _init(morfessor_file):
+    global _model
+
+    _model = load_morfessor(morfessor_file)
+    _segments.clear()
+
+
+def _segment(constituent):
+    morphs = _segments.get(constituent)
+
+    if morphs is None:
+        if len(_segments) >= SEGMENT_CACHE:
+            _segments.clear()
+
+        morphs = _segments[constituent] = \
+            _model.viterbi_segment(constituent)[0]
+
+    return morphs
+
+
+def _sequences(chunks):
+    for chunk in chunks:
+        for sequence in sequences(read_chunk(chunk), _segment):
+            yield sequence
+
+
+def _count(task):
+    # count every n-gram in the chunks exactly, returning the counts (or,
+    # when spilling, just their runs)
+    chunks, max_ngrams, directory = task
+    counter = NgramCounter(max_ngrams, directory)
+
+    for sequence in _sequences(chunks):
+        counter.add(sequence)
+
+    if max_ngrams:
+        counter.spill()
+
+    return counter
+
+
+def _sketch(task):
+    # count the unigrams in the chunks exactly, and sketch their bigrams and
+    # trigrams
+    chunks, width, depth = task
+    unigrams = Counter()
+    bigrams = CountMinSketch(width, depth)
+    trigrams = CountMinSketch(width, depth)
+    total = 0
+
+    for sequence in _sequences(chunks):
+        unigrams.update(sequence)
+        total += len(sequence)
+
+        for i in range(len(sequence) - 1):
+            bigrams.add(' '.join(sequence[i:i + 2]))
+
+        for i in range(len(sequence) - 2):
+            trigrams.add(' '.join(sequence[i:i + 3]))
+
+    return unigrams, total, bigrams, trigrams
+
+
+def _collect(task):
+    # return the estimated count of each bigram and trigram in the chunks
+    # whose estimate reaches 'min_count'
+    chunks, filename, min_count = task
+
+    with open(filename, 'rb') as f:
+        sketches = pickle.load(f)
+
+    estimates = {}
+
+    for sequence in _sequences(chunks):
+        for n, sketch in zip((2, 3), sketches):
+            for i in range(len(sequence) - n + 1):
+                ngram = ' '.join(sequence[i:i + n])
+
+                if ngram not in estimates:
+                    count = sketch.estimate(ngram)
+
+                    if count >= min_count:
+                        estimates[ngram] = count
+
+    return estimates
+
+
+def _map(function, tasks, processes, morfessor_file=None):
+    # run 'function' over 'tasks', in a pool of 'processes' processes (or in
+    # this one), each of which loads the Morfessor model 'morfessor_file', if
+    # given
+    initializer, initargs = (_init, (morfessor_file, )) if morfessor_file \
+        else (None, ())
+
+    if processes == 1:
+        if initializer:
+            initializer(*initargs)
+
+        return [function(task) for task in tasks]
+
+    pool = multiprocessing.Pool(processes, initializer, initargs)
+
+    try:
+        return pool.map(function, tasks)
+
+    finally:
+        pool.close()
+        pool.join()
+
+
+# Training --------------------------------------------------------------------
+
+def count(
+    corpora,
+    morfessor_file=MORFESSOR_FILE,
+    processes=None,
+    max_ngrams=None,
+    sketch=None,
+    min_count=None,
+    directory=None,
+    chunk_size=CHUNK_SIZE,
+        ):
+    '''Count the morph n-grams of the segmented corpus files 'corpora' (see
+    sequences()) in 'processes' processes (by default, one per CPU), and
+    return a dictionary of the n-grams counted at least 'min_count' times
+    (by default, once, or twice if sketching), keyed as in the legacy n-gram
+    pickle, along with the total number of morphs and delimiters.
+
+    To bound the memory used for counting, either give 'max_ngrams', to
+    spill counts to disk (in 'directory') once a process holds that many
+    distinct n-grams (see NgramCounter), which keeps the counts exact, or
+    give 'sketch', to estimate bigram and trigram counts in count-min
+    sketches of about that many megabytes instead (see CountMinSketch). A
+    sketch reads the corpora twice and overestimates counts; estimates are
+    capped so that no n-gram outcounts the shorter n-grams it contains.
+
+    Either way, the returned dictionary is built in this process, so its
+    size is bounded only by 'min_count': spilled runs are merged as they are
+    read, keeping just the n-grams that reach it, and each process that
+    collects sketched n-grams keeps just those whose estimates reach it.
+    Since most distinct n-grams are counted once, sketching requires a
+    'min_count' of at least 2.
+    '''
+    if min_count is None:
+        min_count = 2 if sketch else 1
+
+    if sketch and min_count < 2:
+        raise ValueError('Sketching requires a min_count of at least 2.')
+
+    ranges = chunks(corpora, chunk_size)
+    processes = min(processes or multiprocessing.cpu_count(), len(ranges))
+    processes = max(processes, 1)
+    tasks = [ranges[i::processes] for i in range(processes)]
+
+    if sketch:
+        return _count_sketched(
+            tasks, morfessor_file, processes, sketch, min_count, directory)
+
+    counter = NgramCounter(max_ngrams, directory)
+    results = []
+
+    try:
+        results = _map(
+            _count,
+            [(t, max_ngrams, directory) for t in tasks],
+            processes,
+            morfessor_file,
+            )
+
+        for result in results:
+            counter.update(result)
+
+        counts = dict(
+            (ngram, c) for ngram, c in counter.items() if c >= min_count)
+
+    finally:
+        counter.close()
+
+        for result in results:
+            result.close()
+
+    return counts, counter.total
+
+
+def _count_sketched(tasks, morfessor_file, processes, sketch, min_count,
+                    directory):
+    depth = 4
+    width = sketch_width(sketch, depth)
+    results = _map(
+        _sketch, [(t, width, depth) for t in tasks], processes, morfessor_file)
+    unigrams, total, bigrams, trigrams = results.pop(0)
+
+    for u, t, b, tri in results:
+        unigrams.update(u)
+        total += t
+        bigrams.update(b)
+        trigrams.update(tri)
+
+    del results
+
+    # share the merged sketches with the processes that collect the n-grams
+    fd, filename = tempfile.mkstemp(suffix='.sketch', dir=directory)
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((bigrams, trigrams), f, 2)
+
+        del bigrams, trigrams
+        estimates = {}
+
+        for result in _map(
+                _collect,
+                [(t, filename, min_count) for t in tasks],
+                processes,
+                morfessor_file,
+                ):
+            estimates.update(result)
+
+    finally:
+        os.remove(filename)
+
+    counts = dict((m, c) for m, c in unigrams.items() if c >= min_count)
+
+    # cap each bigram by the counts of its morphs, and each trigram by the
+    # counts of its bigrams (so that dropping an n-gram drops every longer
+    # n-gram that contains it)
+    for n in (2, 3):
+        for ngram, estimate in estimates.items():
+            morphs = ngram.split(' ')
+
+            if len(morphs) == n:
+                c = min(
+                    estimate,
+                    counts.get(' '.join(morphs[:-1]), 0),
+                    counts.get(' '.join(morphs[1:]), 0),
+                    )
+
+                if c >= min_count:
+                    counts[ngram] = c
+
+    return counts, total
+
+
+def train(corpora, output, legacy=False, **kwargs):
+    '''Count the morph n-grams of the segmented corpus files 'corpora' (see
+    count(), which takes the remaining keyword arguments), write them to the
+    file 'output' as a slim n-gram file or, if 'legacy' is True, as a legacy
+    n-gram pickle (see ngrams.py), and return the counts and total.'''
+    counts, total = count(corpora, **kwargs)
+
+    with open(output, 'wb') as f:
+        if legacy:
+            vocab = set(k for k in counts if ' ' not in k)
+            pickle.dump((counts, vocab, total), f, 2)
+
+        else:
+            f.write(ngrams.dumps(*ngrams.split_orders(counts) + (total, )))
+
+    return counts, total
+
+
+# Morfessor training ----------------------------------------------------------
+
+def _log_dampening(count):
+    return int(round(math.log(count + 1, 2)))
+
+
+def _no_counts(count):
+    return 1
+
+
+# ways of dampening the counts of the training types, as in Morfessor's
+# command line interface
+DAMPENING = {
+    'none': None,
+    'log': _log_dampening,
+    'ones': _no_counts,
+    }
+
+
+def peak_rss():
+    '''Return the peak resident set size of this process, in kilobytes (or
+    None, where it is unknown).'''
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # macOS reports bytes, Linux kilobytes
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def _types(chunks):
+    # count the (lowercase) alphabetic tokens in the chunks
+    types = Counter()
+
+    for chunk in chunks:
+        text = read_chunk(chunk).lower()
+        types.update(text[i:j] for i, j, kind in scan(text) if kind == ALPHA)
+
+    return types, peak_rss()
+
+
+def _native(types):
+    # return the types that look like nativized Finnish words
+    return [t for t in types if not is_foreign(t)], peak_rss()
+
+
+def train_morfessor(
+    corpora,
+    output,
+    lexicon=None,
+    processes=None,
+    min_count=1,
+    dampening='none',
+    sample=None,
+    seed=0,
+    max_epochs=None,
+    finish_threshold=0.005,
+    corpus_weight=1.0,
+    chunk_size=CHUNK_SIZE,
+    log=None,
+        ):
+    '''Train a Morfessor baseline model on the word types of the corpus
+    files 'corpora', and write it to 'output' as a Morfessor binary model and
+    to 'lexicon' (by default, 'output' with the extension ".lexicon") as a
+    compiled lexicon, which loads faster (see syllabifier.load_morfessor()).
+
+    Training runs in stages:
+
+        count: count the lowercase alphabetic tokens of the corpora, in
+            'processes' processes (by default, one per CPU)
+        filter: drop the types counted fewer than 'min_count' times, and
+            those that are foreign or junk (see phonology.is_foreign()), in
+            'processes' processes
+        sample: if 'sample' is given, keep a random sample of that many types
+        train: train the model on the types (in this process, since Morfessor
+            trains sequentially), with their counts dampened by 'dampening'
+            (see DAMPENING), until an epoch lowers the model's cost by less
+            than 'finish_threshold' per corpus boundary, or for at most
+            'max_epochs' epochs
+        write: write the model files
+
+    The sample and training are random, and reproducible given 'seed'.
+
+    Return the model, along with a report of each stage: its name, time in
+    seconds, the number of items that it leaves (types, morphs, or
+    kilobytes written), and the peak resident memory of this process and of
+    the stage's worker processes so far (in kilobytes). If 'log' is given,
+    each stage is also printed to it as it finishes.
+    '''
+    if dampening not in DAMPENING:
+        raise ValueError('Unknown dampening: %r' % dampening)
+
+    lexicon = lexicon or os.path.splitext(output)[0] + '.lexicon'
+    ranges = chunks(corpora, chunk_size)
+    processes = min(processes or multiprocessing.cpu_count(), len(ranges))
+    processes = max(processes, 1)
+    report = []
+
+    def stage(name, start, items, workers=()):
+        workers = [rss for rss in workers if rss is not None]
+        report.append({
+            'stage': name,
+            'seconds': timer() - start,
+            'items': items,
+            'peak_rss_kb': peak_rss(),
+            'worker_peak_rss_kb': max(workers) if workers else None,
+            })
+
+        if log:
+            print('%-8s %8.1f s %10d items  peak %s KB%s' % (
+                name,
+                report[-1]['seconds'],
+                items,
+                report[-1]['peak_rss_kb'],
+                ' (workers %d KB)' % max(workers) if workers else '',
+                ), file=log)
+
+    start = timer()
+    types = Counter()
+    workers = []
+
+    for counts, rss in _map(
+            _types, [ranges[i::processes] for i in range(processes)],
+            processes):
+        types.update(counts)
+        workers.append(rss)
+
+    stage('count', start, len(types), workers)
+
+    start = timer()
+    frequent = sorted(t for t, c in types.items() if c >= min_count)
+    results = _map(
+        _native,
+        [frequent[i::processes] for i in range(processes)],
+        processes,
+        )
+    types = dict((t, types[t]) for kept, _ in results for t in kept)
+    stage('filter', start, len(types), [rss for _, rss in results])
+    del frequent, results
+
+    if sample and sample < len(types):
+        start = timer()
+        sampled = random.Random(seed).sample(sorted(types), sample)
+        types = dict((t, types[t]) for t in sampled)
+        stage('sample', start, len(types))
+
+    start = timer()
+    model = morfessor.BaselineModel(corpusweight=corpus_weight)
+    model.load_data(
+        [(c, t) for t, c in sorted(types.items())],
+        count_modifier=DAMPENING[dampening],
+        )
+    state = random.getstate()
+    random.seed(seed)
+
+    try:
+        model.train_batch(
+            finish_threshold=finish_threshold, max_epochs=max_epochs)
+
+    finally:
+        random.setstate(state)
+
+    stage('train', start, len(model.get_constructions()))
+
+    start = timer()
+    morfessor.MorfessorIO().write_binary_model_file(output, model)
+
+    with open(lexicon, 'wb') as f:
+        f.write(compile_lexicon(model))
+
+    size = os.path.getsize(output) + os.path.getsize(lexicon)
+    stage('write', start, size // 1024)
+
+    return model, report
+
+
+# Command line ----------------------------------------------------------------
+
+def _train_morfessor(args):
+    _, report = train_morfessor(
+        args.corpora,
+        args.output,
+        lexicon=args.lexicon,
+        processes=args.processes,
+        min_count=args.min_count,
+        dampening=args.dampening,
+        sample=args.sample,
+        seed=args.seed,
+        max_epochs=args.max_epochs,
+        finish_threshold=args.finish_threshold,
+        corpus_weight=args.corpus_weight,
+        log=sys.stderr,
+        )
+
+    if args.report:
+        with io.open(args.report, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(report, indent=2, sort_keys=True))
+
+
+def _train_ngrams(args):
+    start = timer()
+    counts, total = train(
+        args.corpora,
+        args.output,
+        legacy=args.legacy,
+        morfessor_file=args.morfessor,
+        processes=args.processes,
+        max_ngrams=args.max_ngrams,
+        sketch=args.sketch,
+        min_count=args.min_count,
+        directory=args.tmp,
+        )
+    print('%s: %d n-grams of %d morphs and delimiters in %.1f s' % (
+        args.output, len(counts), total, timer() - start), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Train the segmenter\'s models from corpus files.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    parser_morfessor = commands.add_parser(
+        'morfessor', help='train a Morfessor model on the types of corpora')
+    parser_morfessor.add_argument(
+        'corpora', nargs='+', help='UTF-8 text files')
+    parser_morfessor.add_argument(
+        '--output', required=True,
+        help='write the Morfessor binary model here')
+    parser_morfessor.add_argument(
+        '--lexicon',
+        help='write the compiled lexicon here (default: OUTPUT.lexicon)')
+    parser_morfessor.add_argument(
+        '--processes', type=int,
+        help='worker processes (default: one per CPU)')
+    parser_morfessor.add_argument(
+        '--min-count', type=int, default=1,
+        help='drop types counted fewer times than this')
+    parser_morfessor.add_argument(
+        '--dampening', choices=sorted(DAMPENING), default='none',
+        help='dampening of the types\' counts (default: none)')
+    parser_morfessor.add_argument(
+        '--sample', type=int,
+        help='train on a random sample of this many types')
+    parser_morfessor.add_argument(
+        '--seed', type=int, default=0, help='seed of the sample and training')
+    parser_morfessor.add_argument(
+        '--max-epochs', type=int, help='stop training after this many epochs')
+    parser_morfessor.add_argument(
+        '--finish-threshold', type=float, default=0.005,
+        help='stop training once an epoch improves the cost less than this')
+    parser_morfessor.add_argument(
+        '--corpus-weight', type=float, default=1.0,
+        help='weight of the corpus cost (default: 1.0)')
+    parser_morfessor.add_argument(
+        '--report', help='write the JSON report of each stage here')
+    parser_morfessor.set_defaults(run=_train_morfessor)
+
+    parser_ngrams = commands.add_parser(
+        'ngrams', help='count morph n-grams in segmented corpora')
+    parser_ngrams.add_argument(
+        'corpora', nargs='+',
+        help='UTF-8 text files, with compounds segmented by "="')
+    parser_ngrams.add_argument(
+        '--output', required=True, help='write the n-gram file here')
+    parser_ngrams.add_argument(
+        '--morfessor', default=MORFESSOR_FILE,
+        help='Morfessor binary model or compiled lexicon that splits '
+             'constituents into morphs')
+    parser_ngrams.add_argument(
+        '--legacy', action='store_true',
+        help='write a legacy n-gram pickle instead of a slim n-gram file')
+    parser_ngrams.add_argument(
+        '--processes', type=int,
+        help='worker processes (default: one per CPU)')
+    parser_ngrams.add_argument(
+        '--max-ngrams', type=int,
+        help='spill counts to disk once a process holds this many n-grams')
+    parser_ngrams.add_argument(
+        '--sketch', type=float, metavar='MEGABYTES',
+        help='estimate bigram and trigram counts in sketches of this size')
+    parser_ngrams.add_argument(
+        '--min-count', type=int,
+        help='drop n-grams counted fewer times than this (default: 1, or 2 '
+             'with --sketch)')
+    parser_ngrams.add_argument(
+        '--tmp', help='directory for spilled counts (default: system temp)')
+    parser_ngrams.set_defaults(run=_train_ngrams)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
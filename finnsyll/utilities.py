@@ -13,17 +13,83 @@ if sys.version_info < (3, ):
     A += r'\xc3\xa4\xcc\x88'
 
 
+# Tokenizer -------------------------------------------------------------------
+
+# token kinds yielded by scan()
+ALPHA = 'alpha'
+DELIMITER = 'delimiter'
+
+# these patterns are compiled once at import time, rather than being formatted
+# and looked up in re's internal cache on every call
+NONALPHA = re.compile(r'([%s]+)|[^%s]+' % (A, A), flags=FLAGS)
+
+SYLLABLES = re.compile(
+    r'\'[%s]+|`[%s]+|[%s]+|[^%s\'`\.]+|[^\.]{1}' % (A, A, A, A),
+    flags=FLAGS,
+    )
+
+WORDS = re.compile(r'[%s]+[%s\.]*[%s]+' % (A, A, A), flags=FLAGS)
+
+
+def scan(string):
+    '''Yield a (start, end, kind) tuple for each token in 'string'.
+
+    Tokens are maximal runs of alphabetic characters (ALPHA) or of punctuation
+    and whitespace (DELIMITER). Only offsets are produced; slice 'string' to
+    obtain a token's text.
+    '''
+    for m in NONALPHA.finditer(string):
+        yield m.start(), m.end(), ALPHA if m.lastindex else DELIMITER
+
+
 def nonalpha_split(string):
     '''Split 'string' along any punctuation or whitespace.'''
-    return re.findall(r'[%s]+|[^%s]+' % (A, A), string, flags=FLAGS)
+    return [m.group() for m in NONALPHA.finditer(string)]
 
 
 def syllable_split(string):
     '''Split 'string' into (stressed) syllables and punctuation/whitespace.'''
-    p = r'\'[%s]+|`[%s]+|[%s]+|[^%s\'`\.]+|[^\.]{1}' % (A, A, A, A)
-    return re.findall(p, string, flags=FLAGS)
+    return SYLLABLES.findall(string)
 
 
 def extract_words(string):
     '''Extract all alphabetic syllabified forms from 'string'.'''
-    return re.findall(r'[%s]+[%s\.]*[%s]+' % (A, A, A), string, flags=FLAGS)
+    return WORDS.findall(string)
+
+
+# Boundary masks --------------------------------------------------------------
+
+def boundary_mask(segmented, delimiter='='):
+    '''Encode the positions of 'delimiter' in 'segmented' as a bitmask.
+
+    Bit i is set if a boundary precedes the ith character of the undelimited
+    string, e.g., 'kuu=kautta' > 0b1000 (a boundary before character 3).
+    '''
+    mask = 0
+    i = 0
+
+    for part in segmented.split(delimiter)[:-1]:
+        i += len(part)
+        mask |= 1 << i
+
+    return mask
+
+
+def mask_split(string, mask):
+    '''Split 'string' at the boundaries encoded in 'mask'.
+
+    E.g., mask_split('Kuukautta', 0b1000) > ['Kuu', 'kautta']
+    '''
+    parts = []
+    i = 0
+
+    while mask:
+        # isolate the lowest set bit
+        j = (mask & -mask).bit_length() - 1
+        parts.append(string[i:j])
+        mask &= mask - 1
+        i = j
+
+    parts.append(string[i:])
+
+    return parts
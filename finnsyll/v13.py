@@ -1,63 +1,166 @@
 # coding=utf-8
 from __future__ import unicode_literals
 
+import io
 import re
 
-from itertools import product
+from itertools import islice, product
+from . import instrument
 from . import phonology as phon
-from .utilities import FLAGS, extract_words, nonalpha_split
+from .instrument import timed
+from .utilities import (
+    FLAGS,
+    boundary_mask,
+    extract_words,
+    mask_split,
+    nonalpha_split,
+    )
 
 
 STRESS = False
 
+# fixed syllabifications that override the rules, e.g., for loanwords and
+# names (see load_exceptions())
+EXCEPTIONS = {}
+
+# the weights of WSP, PK-PROM, and NUC when ranking variants; if None, each
+# violation counts equally (see load_weights())
+WEIGHTS = None
+
 
 # Syllabifier -----------------------------------------------------------------
 
 def syllabify(word, stress=False):
     '''Syllabify the given word, whether simplex or complex.'''
-    compound = not word.isalpha()
-    syllabify = _syllabify_complex if compound else _syllabify_simplex
-    syllabifications = list(syllabify(word, stress=stress))
+    for word, rules in _syllabify(word, stress=stress):
+        yield _post_process(word, rules)
 
-    # if variation, order variants from most preferred to least preferred
-    if len(syllabifications) > 1:
-        syllabifications = rank(syllabifications)
 
-    for word, rules in syllabifications:
+def syllabify_tokens(tokens, stress=False, t1=None, budget=None):
+    '''Syllabify the given word, already split into alphabetic parts and
+    delimiters (e.g., ['kuu', '=', 'kautta']). This is equivalent to
+    syllabify(''.join(tokens)), minus the re-tokenization.
+
+    If given, 't1' maps alphabetic parts to their precomputed T1 results
+    (see T1_batch()), and 'budget' limits the work done (see Budget).'''
+    for word, rules in _syllabify_tokens(tokens, stress, t1, budget):
         yield _post_process(word, rules)
 
 
-def _syllabify_complex(word, stress=False):
-    syllabifications = []
+def _syllabify(word, stress=False):
+    # return the ranked syllabifications of 'word', prior to post-processing
+    # (i.e., compound boundaries are still marked with '=')
+    tokens = [word, ] if word.isalpha() else nonalpha_split(word)
+
+    return _syllabify_tokens(tokens, stress=stress)
 
-    # split the word along any punctuation (e.g., a hyphen, space, or equal
-    # sign) and syllabify the individual parts separately
-    # for w in re.split(DELIM, word, flags=FLAGS):
-    for w in nonalpha_split(word):
+
+def _syllabify_tokens(tokens, stress=False, t1=None, budget=None):
+    if len(tokens) == 1 and tokens[0].isalpha():
+        syllabifications = list(
+            _syllabify_simplex(tokens[0], stress, t1, budget))
+
+        # if variation, order variants from most preferred to least preferred
+        if len(syllabifications) > 1:
+            syllabifications = rank(syllabifications)
+
+        return syllabifications
+
+    return _syllabify_complex(tokens, stress, t1, budget)
+
+
+def _syllabify_complex(tokens, stress=False, t1=None, budget=None):
+    parts = []
+
+    # the word has already been split along any punctuation (e.g., a hyphen,
+    # space, or equal sign), so syllabify the individual parts separately
+    for w in tokens:
 
         if w.isalpha():
             # append syllabified simplex word
-            syllabifications.append(_syllabify_simplex(w, stress=stress))
+            variants = list(_syllabify_simplex(w, stress, t1, budget))
+
+            # score each variant of the part once, rather than once for every
+            # combination it appears in; a part without variation adds the
+            # same violations to every combination, so it can be ignored
+            if len(variants) > 1:
+                scores = penalties([s for s, _ in variants])
+                parts.append([
+                    (s, r, v) for (s, r), v in zip(variants, scores)])
+
+            else:
+                parts.append([(s, r, 0) for s, r in variants])
+
         else:
             # append delimiter
-            syllabifications.append(([(w, ' ' + w), ]))
+            parts.append(([(w, ' ' + w, 0), ]))
+
+    # if the parts would combine into too many variants, keep only the most
+    # preferred variant of each part (the first of any ties, as in rank())
+    if budget is not None:
+        count = 1
+
+        for part in parts:
+            count *= len(part)
+
+        if budget.exceeded('max_variants', count):
+            parts = [[min(part, key=lambda x: x[2]), ] for part in parts]
+
+    syllabifications = []
+    scores = []
 
-    for x in (w for w in product(*syllabifications)):
-        word, rules = '', ''
+    for x in product(*parts):
+        word, rules, score = '', '', 0
 
-        for w, r in x:
+        for w, r, v in x:
             word += w
             rules += r
+            score += v
+
+        syllabifications.append((word, rules))
+        scores.append(score)
+
+    # if variation, order variants from most preferred to least preferred
+    if len(syllabifications) > 1:
+
+        # the violations are only additive across the parts if each part is
+        # scored as its own word; a delimiter of bare periods would instead
+        # join its neighbors into a single word (e.g., 'esim.kaksi')
+        if any(not w.strip('.') for w in tokens):
+            scores = None
+
+        syllabifications = rank(syllabifications, scores)
+
+    return syllabifications
 
-        yield word, rules
 
+def _syllabify_simplex(word, stress=False, t1=None, budget=None):
+    # consult the exception lexicon before applying any rules
+    if EXCEPTIONS:
+        variants = EXCEPTIONS.get(word.lower())
+
+        if variants:
+            for mask, rules in variants:
+                syll = '.'.join(mask_split(word, mask))
+
+                # add stress assignment
+                if stress:
+                    syll = phon.stress(syll)
+
+                yield syll, rules
+
+            return
+
+    try:
+        word, rules = t1[word]
+
+    except (KeyError, TypeError):
+        word, rules = T1(word)
 
-def _syllabify_simplex(word, stress=False):
-    word, rules = T1(word)
     word, rules = T2(word, rules)
     word, rules = T8(word, rules)
 
-    for word, rules in T4(word, rules):  # T4 produces variation
+    for word, rules in T4(word, rules, budget):  # T4 produces variation
         word, rules = T6(word, rules)
         word, rules = T11(word, rules)
 
@@ -68,6 +171,76 @@ def _syllabify_simplex(word, stress=False):
         yield word, rules or ' T0'  # T0 means no rules have applied
 
 
+def load_exceptions(filename):
+    '''Load a table of fixed syllabifications from the TSV file 'filename'.
+
+    Each line pairs a word with one of its syllabifications and, optionally,
+    the rules to report for it, e.g.:
+
+        pizza\tpiz.za\tT1
+
+    If the word is omitted, it is the syllabification minus its boundaries.
+    A word listed on several lines receives each of its variants, which are
+    ranked like any others. When a word in the table is syllabified, the rules
+    are skipped entirely.
+
+    Loading another table replaces the current one (pass None to remove it);
+    no restart is necessary.
+    '''
+    global EXCEPTIONS
+
+    exceptions = {}
+
+    if filename:
+        with io.open(filename, encoding='utf-8') as f:
+            for n, line in enumerate(f, start=1):
+                fields = line.strip().split('\t')
+
+                if not fields[0]:
+                    continue
+
+                if len(fields) == 1 or '.' in fields[0]:
+                    fields.insert(0, fields[0].replace('.', ''))
+
+                word, syll = fields[0].lower(), fields[1]
+                rules = ' ' + fields[2] if len(fields) > 2 else ' T0'
+
+                if syll.replace('.', '').lower() != word:
+                    raise ValueError(
+                        '%s, line %s: "%s" does not syllabify "%s"' % (
+                            filename, n, syll, word))
+
+                variant = (boundary_mask(syll, delimiter='.'), rules)
+                exceptions[word] = exceptions.get(word, ()) + (variant, )
+
+    # swap in the new table all at once
+    EXCEPTIONS = exceptions
+
+
+def load_weights(filename):
+    '''Load weights for ranking variants from the TSV file 'filename' (see
+    phonology.load_weights()), e.g.:
+
+        WSP\t2.0
+        PK-PROM\t1.0
+        NUC\t0.5
+
+    Variants are then ranked by their harmony, i.e., their weighted WSP,
+    PK-PROM, and NUC violations (see wsp(), pk_prom(), and nuc()). Any of
+    these constraints missing from the file receives a weight of zero, and
+    any other constraint is ignored. Pass None to weigh each violation
+    equally again.
+    '''
+    global WEIGHTS
+
+    if filename:
+        weights = phon.load_weights(filename)
+        WEIGHTS = tuple(weights.get(c, 0.0) for c in ('WSP', 'PK-PROM', 'NUC'))
+
+    else:
+        WEIGHTS = None
+
+
 def _post_process(word, rules):
     word = word.replace('=', '.')
     rules = rules[1:]
@@ -77,18 +250,84 @@ def _post_process(word, rules):
 
 # T1 --------------------------------------------------------------------------
 
+@timed('T1')
 def T1(word):
     '''Insert a syllable boundary in front of every CV sequence.'''
     # split consonants and vowels: 'balloon' -> ['b', 'a', 'll', 'oo', 'n']
-    WORD = [i for i in re.split(r'([ieaouäöy]+)', word, flags=FLAGS) if i]
+    WORD = [i for i in VOWEL_SPLIT.split(word) if i]
+    _T1(WORD)
+
+    WORD = ''.join(WORD)
+    rules = '' if word == WORD else ' T1'  # + ''.join(sub_rules)  # TODO: sort
+
+    return WORD, rules
+
+
+@timed('T1')
+def T1_batch(words):
+    '''Apply T1 to each of 'words', returning a dictionary of the results.
+
+    The words are visited in sorted order (i.e., depth-first across a trie),
+    so that each word can resume T1 from the chunks that it shares with the
+    previous word. A chunk's treatment depends only on the chunk itself,
+    whether the syllable count preceding it is even or odd, and whether it is
+    word-initial or word-final; so, only the chunks following the shared ones
+    are recomputed (always including the final chunk of either word), and
+    recurring endings are recomputed only once per parity.
+    '''
+    results = {}
+    endings = {}
+    prev_chunks, prev_WORD, prev_counts = [], [], []
+
+    for word in sorted(set(words)):
+        chunks = [i for i in VOWEL_SPLIT.split(word) if i]
+        limit = min(len(chunks), len(prev_chunks)) - 1
+        shared = 0
+
+        while shared < limit and chunks[shared] == prev_chunks[shared]:
+            shared += 1
+
+        if shared:
+            key = (tuple(chunks[shared:]), prev_counts[shared] % 2)
+
+            try:
+                ending, counts = endings[key]
+
+            except KeyError:
+                # pad the ending so that T1 treats it as word-medial
+                ending = [None, ] + chunks[shared:]
+                counts = _T1(ending, start=1, count=prev_counts[shared])
+                ending = ending[1:]
+                endings[key] = ending, counts
+
+            WORD = prev_WORD[:shared] + ending
+            counts = prev_counts[:shared] + counts
+
+        else:
+            WORD = chunks[:]
+            counts = _T1(WORD)
+
+        prev_chunks, prev_WORD, prev_counts = chunks, WORD, counts
+
+        WORD = ''.join(WORD)
+        results[word] = (WORD, '' if word == WORD else ' T1')
+
+    return results
+
+
+def _T1(WORD, start=0, count=1):
+    # apply T1 in place to the consonant and vowel chunks WORD[start:], where
+    # 'count' is the syllable count preceding WORD[start] (a count divisible
+    # by 2 indicates an even syllable); return the syllable count preceding
+    # each of these chunks
+    counts = []
 
     # keep track of which sub-rules are applying
     sub_rules = set()
 
-    # a count divisible by 2 indicates an even syllable
-    count = 1
-
-    for i, v in enumerate(WORD):
+    for i in range(start, len(WORD)):
+        v = WORD[i]
+        counts.append(count)
 
         # T1B
         # If there is a consonant cluster word-initially, the entire cluster
@@ -152,14 +391,12 @@ def T1(word):
                 WORD[i] = v[:-1] + '.' + v[-1]
                 sub_rules.add('a')
 
-    WORD = ''.join(WORD)
-    rules = '' if word == WORD else ' T1'  # + ''.join(sub_rules)  # TODO: sort
-
-    return WORD, rules
+    return counts
 
 
 # T2 --------------------------------------------------------------------------
 
+@timed('T2')
 def T2(word, rules):
     '''Split any VV sequence that is not a genuine diphthong or long vowel.
     E.g., [ta.e], [ko.et.taa]. This rule can apply within VVV+ sequences.'''
@@ -187,12 +424,13 @@ def T2(word, rules):
 
 # T4 --------------------------------------------------------------------------
 
-def T4(word, rules):
+@timed('T4')
+def T4(word, rules, budget=None):
     '''Optionally split /u,y/-final diphthongs that do not take primary stress.
-    E.g., [lau.ka.us], [va.ka.ut.taa].'''
-    WORD = re.split(
-        r'([ieaouäöy]+[^ieaouäöy]+\.*[ieaoäö]{1}(?:u|y)(?:\.*[^ieaouäöy]+|$))',  # noqa
-        word, flags=re.I | re.U)
+    E.g., [lau.ka.us], [va.ka.ut.taa].
+
+    If given, 'budget' limits the number of variants (see Budget).'''
+    WORD = T4_SPLIT.split(word)
 
     PARTS = [[] for part in range(len(WORD))]
 
@@ -208,7 +446,14 @@ def T4(word, rules):
         # include original form (non-application of rule)
         PARTS[i].append(v)
 
-    WORDS = [w for w in product(*PARTS)]
+    if budget is None:
+        WORDS = [w for w in product(*PARTS)]
+
+    else:
+        WORDS = _limited_product(PARTS, budget)
+
+    if instrument.TRACING:
+        instrument.emit('T4', word=word, variants=len(WORDS))
 
     for WORD in WORDS:
         WORD = ''.join(WORD)
@@ -217,8 +462,29 @@ def T4(word, rules):
         yield WORD, RULES
 
 
+def _limited_product(PARTS, budget):
+    # return the product of PARTS, within the limits of 'budget'
+    count = 1
+
+    for part in PARTS:
+        count *= len(part)
+
+    # once the time is spent, produce a single variant
+    limit = 1 if count > 1 and budget.expired() else count
+
+    if budget.exceeded('max_variants', limit):
+        limit = budget.max_variants
+
+    # if limited, start from the variant that applies the rule nowhere
+    if limit < count:
+        PARTS = [part[::-1] for part in PARTS]
+
+    return list(islice(product(*PARTS), limit))
+
+
 # T6 --------------------------------------------------------------------------
 
+@timed('T6')
 def T6(word, rules):
     '''If a VVV-sequence contains a long vowel, insert a syllable boundary
     between it and the third vowel. E.g. [kor.ke.aa], [yh.ti.öön], [ruu.an],
@@ -255,6 +521,7 @@ def T6(word, rules):
 
 # T8 --------------------------------------------------------------------------
 
+@timed('T8')
 def T8(word, rules):
     '''Join /ie/, /uo/, or /yö/ sequences in syllables that take primary
     stress.'''
@@ -275,6 +542,7 @@ def T8(word, rules):
 
 # T11 -------------------------------------------------------------------------
 
+@timed('T11')
 def T11(word, rules):
     '''If a VVV sequence contains a /u,y/-final diphthong, insert a syllable
     boundary between the diphthong and the third vowel.'''
@@ -292,29 +560,60 @@ def T11(word, rules):
 
 # Sequences / Regex -----------------------------------------------------------
 
+# consonant/vowel chunking used by T1
+VOWEL_SPLIT = re.compile(r'([ieaouäöy]+)', flags=FLAGS)
+
+# the environments in which T4 may split a /u,y/-final diphthong
+T4_SPLIT = re.compile(
+    r'([ieaouäöy]+[^ieaouäöy]+\.*[ieaoäö]{1}(?:u|y)(?:\.*[^ieaouäöy]+|$))',
+    flags=FLAGS,
+    )
+
+# (overlapping) VV sequences
+VV = re.compile(r'(?=([ieaouäöy]{2}))', flags=FLAGS)
+
+# any VVV sequence that contains a long vowel
+LONG_VOWEL_VVV = re.compile(
+    r'(^|[^ieaouäöy]+)([ieaouäöy]{1}(ii|ee|aa|oo|uu|ää|öö|yy)|(ii|ee|aa|oo|uu|ää|öö|yy)[ieaouäöy])([^ieaouäöy]+|$)',  # noqa
+    flags=FLAGS,
+    )
+
+# any standalone /ie/, /uo/, or /yö/ sequence in the first syllable
+TAIL_DIPHTHONG = re.compile(
+    r'^[^ieaouäöy]*(i\.e|u\.o|y\.ö)(?:\.|[^ieaouäöy]+|$)',
+    flags=FLAGS,
+    )
+
+# any /u,y/-final diphthong that does not appear under primary stress
+U_Y_FINAL_DIPHTHONG = re.compile(
+    r'(?:[^ieaouäöy\.]+\.*)(au|eu|ou|iu|iy|ey|äy|öy)(?:(\.*[^ieaouäöy\.]+|$))',  # noqa
+    flags=FLAGS,
+    )
+
+# any primary-stressed VVV sequence that contains a /u,y/-final diphthong
+PRECEDENCE_VVV = re.compile(
+    r'^[^ieaouäöy]*([ieaoäö]{1}(au|eu|ou|iu|iy|ey|äy|öy)|(au|eu|ou|iu|iy|ey|äy|öy)[ieaoäö]{1})[^ieaouäöy]',  # noqa
+    flags=FLAGS,
+    )
+
+# a superheavy (CVVC) syllable
+SUPERHEAVY = re.compile(r'[ieaouäöy]{2}[^$ieaouäöy]+', flags=FLAGS)
+
 
 def vv_sequences(word):
     # this pattern searches for (overlapping) VV sequences
-    return re.finditer(r'(?=([ieaouäöy]{2}))', word, flags=FLAGS)
+    return VV.finditer(word)
 
 
 def long_vowel_sequences(word):
     # this pattern searches for any VVV sequence that contains a long vowel
-    return re.finditer(
-        r'(^|[^ieaouäöy]+)([ieaouäöy]{1}(ii|ee|aa|oo|uu|ää|öö|yy)|(ii|ee|aa|oo|uu|ää|öö|yy)[ieaouäöy])([^ieaouäöy]+|$)',  # noqa
-        word,
-        flags=FLAGS,
-        )
+    return LONG_VOWEL_VVV.finditer(word)
 
 
 def tail_diphthongs(word):
     # this pattern searches for any standalone /ie/, /uo/, or /yö/ sequence in
     # the first syllable
-    return re.match(
-        r'^[^ieaouäöy]*(i\.e|u\.o|y\.ö)(?:\.|[^ieaouäöy]+|$)',
-        word,
-        flags=FLAGS,
-        )
+    return TAIL_DIPHTHONG.match(word)
 
 
 def u_y_final_diphthongs(word):
@@ -324,21 +623,13 @@ def u_y_final_diphthongs(word):
     # specifying the relevant diphthongs versus r'([eiaAoO]{1}(u|y)) prevents
     # unnecessary splitting of Vy and Vu loanword sequences that violate vowel
     # harmony (e.g., 'Friday')
-    return re.search(
-        r'(?:[^ieaouäöy\.]+\.*)(au|eu|ou|iu|iy|ey|äy|öy)(?:(\.*[^ieaouäöy\.]+|$))',  # noqa
-        word,
-        flags=FLAGS,
-        )
+    return U_Y_FINAL_DIPHTHONG.search(word)
 
 
 def precedence_sequences(word):
     # this pattern searches for any primary-stressed VVV sequence that contains
     # a /u,y/-final diphthong
-    return re.finditer(
-        r'^[^ieaouäöy]*([ieaoäö]{1}(au|eu|ou|iu|iy|ey|äy|öy)|(au|eu|ou|iu|iy|ey|äy|öy)[ieaoäö]{1})[^ieaouäöy]',  # noqa
-        word,
-        flags=FLAGS,
-        )
+    return PRECEDENCE_VVV.finditer(word)
 
 
 # Ranking ---------------------------------------------------------------------
@@ -357,7 +648,7 @@ def wsp(word):
 
     # SHSP (CVVC = superheavy)
     for syll in unstressed:
-        if re.search(r'[ieaouäöy]{2}[^$ieaouäöy]+', syll, flags=FLAGS):
+        if SUPERHEAVY.search(syll):
             violations += 1
 
     # # WSP (CVV = heavy)
@@ -397,8 +688,60 @@ def nuc(word):
     return word.count('.') + 1
 
 
-def rank(syllabifications):
-    '''Rank syllabifications.'''
+def violations(word):
+    '''Return wsp(word) + pk_prom(word) + nuc(word), in a single pass.'''
+    return sum(profile(word))
+
+
+def profile(word):
+    '''Return the WSP, PK-PROM, and NUC violations of 'word', as a tuple.'''
+    w, p, n = 0, 0, word.count('.') + 1
+
+    for x in extract_words(word):
+        syllables = x.split('.')
+        final = len(syllables) - 1
+
+        for i, syll in enumerate(syllables):
+
+            # WSP: unstressed superheavy syllables, where even syllables are
+            # unstressed and a final odd syllable is extrametrical
+            if i % 2 or i == final:
+                if SUPERHEAVY.search(syll):
+                    w += 1
+
+            # PK-PROM: stressed light syllables, excluding the initial one
+            elif i and phon.is_vowel(syll[-1]):
+                p += 1
+
+    return w, p, n
+
+
+def penalties(words):
+    '''Return the violations() of each of 'words', as a list; if weights
+    have been loaded (see load_weights()), return the negated harmonies.'''
+    if WEIGHTS is None:
+        return [violations(w) for w in words]
+
+    # WSP    [0, 1, ...]
+    # PK     [1, 0, ...]
+    # NUC    [4, 3, ...]
+    tableau = list(zip(*[profile(w) for w in words]))
+
+    return [-h for h in phon.harmony(tableau, WEIGHTS)]
+
+
+def probabilities(syllabifications):
+    '''Return the Maximum Entropy probability of each of the
+    'syllabifications', given their penalties().'''
+    return phon.maxent([-v for v in penalties(s for s, _ in syllabifications)])
+
+
+@timed('rank')
+def rank(syllabifications, scores=None):
+    '''Rank syllabifications.
+
+    If given, 'scores' lists the penalties() of each syllabification.
+    '''
 
     # def key(s):
     #     word = s[0]
@@ -412,7 +755,21 @@ def rank(syllabifications):
 
     # syllabifications.sort(key=key)
 
-    syllabifications.sort(key=lambda s: wsp(s[0]) + pk_prom(s[0]) + nuc(s[0]))
+    if scores is None:
+        scores = penalties([s for s, _ in syllabifications])
+
+    # sort by score, preserving the original order of any ties
+    order = sorted(range(len(syllabifications)), key=scores.__getitem__)
+
+    if instrument.TRACING:
+        instrument.emit(
+            'rank',
+            variants=[s for s, _ in syllabifications],
+            ranked=[syllabifications[i][0] for i in order],
+            reordered=order != sorted(order),
+            )
+
+    syllabifications[:] = [syllabifications[i] for i in order]
 
     return syllabifications
 
@@ -10,8 +10,10 @@ except ImportError:
 import unittest
 import finnsyll.phonology as phon
 import finnsyll.utilities as utilities
+import finnsyll.v13 as v13
 
 from finnsyll import FinnSyll
+from itertools import product
 
 
 def error_helper(self, func, cases):
@@ -38,6 +40,21 @@ def error_helper(self, func, cases):
             raise AssertionError('\n\n' + '\n\n'.join(errors))
 
 
+# the segmenter of each worker process in TestSegmenter.test_shared()
+_segmenter = None
+
+
+def _attach_segmenter(name):
+    global _segmenter
+    from finnsyll import FinnSeg
+
+    _segmenter = FinnSeg(shared=name)
+
+
+def _segment(word):
+    return _segmenter.segment(word)
+
+
 class TestSyllabifierKwargs(unittest.TestCase):
 
     def test_full_functionality(self):
@@ -510,6 +527,145 @@ class TestSyllabifierOutput(unittest.TestCase):
 
         error_helper(self, F.syllabify, cases)
 
+    def test_syllabify_batch(self):
+        # ensure that batch syllabification matches individual syllabification
+        F = FinnSyll()
+        words = [
+            'kala', 'kalassa', 'kalastaja', 'kalastajille', 'kalat', 'kala',
+            'kuukautta', 'kuukauttaan', 'runoilija', 'runoilijoiden',
+            'rei\'ille', 'Hovi-oikeus', 'a', '', 'taloissa', 'talo',
+            ]
+
+        self.assertEqual(
+            F.syllabify_batch(words),
+            [F.syllabify(w) for w in words],
+            )
+
+        # ensure that T1 resumes correctly along shared beginnings
+        words = ['kalastaja', 'kalastajille', 'kalat', 'kal', 'ka', 'kaa']
+        self.assertEqual(
+            v13.T1_batch(words),
+            {w: v13.T1(w) for w in words},
+            )
+
+    def test_budget(self):
+        # ensure that limits degrade the output deterministically, and that
+        # the limits that were hit are reported
+        from finnsyll import Budget
+
+        F = FinnSyll(budget=Budget(max_variants=2, max_candidates=4))
+
+        # within the limits
+        self.assertEqual(
+            F.syllabify_checked('hovioikeus'),
+            (['ho.vi.oi.ke.us', 'ho.vi.oi.keus'], ()),
+            )
+        self.assertEqual(F.split_checked('hovioikeus'), ('hovi=oikeus', ()))
+
+        # too many variants for a single word (T4 starts from the variant
+        # that splits no diphthongs)
+        G = FinnSyll(split=False, budget=Budget(max_variants=2))
+        self.assertEqual(
+            G.syllabify_checked('laukausrakkaus'),
+            (['lau.kaus.rak.kaus', 'lau.kaus.rak.ka.us'], ('max_variants', )),
+            )
+
+        # too many variants for a text (each word keeps its best variant)
+        self.assertEqual(
+            F.syllabify_checked('hovioikeus laukausta'),
+            (['ho.vi.oi.ke.us lau.ka.us.ta'], ('max_variants', )),
+            )
+
+        # too many candidate segmentations
+        word = 'kuukausikuukausikuukausi'
+        self.assertEqual(F.split_checked(word), (word, ('max_candidates', )))
+        self.assertFalse(F.is_complex(word))
+
+        # too long to segment
+        F = FinnSyll(budget=Budget(max_length=8))
+        self.assertEqual(
+            F.split_checked('hovioikeus'), ('hovioikeus', ('max_length', )))
+
+        # out of time (with a deadline long past, whatever the clock's
+        # resolution)
+        class Expired(Budget):
+
+            def start(self):
+                budget = Budget.start(self)
+                budget.deadline -= 3600
+
+                return budget
+
+        F = FinnSyll(budget=Expired(seconds=1))
+        self.assertEqual(
+            F.syllabify_checked('hovioikeus laukausta'),
+            (['ho.vi.oi.keus lau.kaus.ta'], ('seconds', )),
+            )
+
+        # limits are positive
+        for limit in [
+                'max_variants', 'max_candidates', 'max_length', 'seconds']:
+            self.assertRaises(ValueError, Budget, **{limit: 0})
+            self.assertRaises(ValueError, Budget, **{limit: -1})
+
+        # without a budget, nothing is limited
+        F = FinnSyll(split=False)
+        self.assertEqual(len(F.syllabify('laukausrakkaus')), 4)
+
+
+class TestExceptions(unittest.TestCase):
+
+    def tearDown(self):
+        v13.load_exceptions(None)
+
+    def test_exceptions(self):
+        # ensure that the exception lexicon overrides the syllabification
+        # rules, and that it can be reloaded
+        import io
+        import os
+        import tempfile
+
+        F = FinnSyll(split=False, variation=True, rules=True, stress=True)
+
+        fd, filename = tempfile.mkstemp(suffix='.tsv')
+        os.close(fd)
+
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write(
+                'pizza\tpiz.za\tT1\n'
+                'oikeus\toi.keus\tT1\n'
+                'oi.ke.us\tT1 T4\n'
+                'runoja\truno.ja\n'
+                )
+
+        try:
+            v13.load_exceptions(filename)
+
+        finally:
+            os.remove(filename)
+
+        cases = {
+            'Pizza': [
+                ('\'Piz.za', 'T1'),
+                ],
+            'oikeus': [
+                ('\'oi.keus', 'T1'),
+                ('\'oi.ke.us', 'T1 T4'),
+                ],
+            'RUNOJA': [
+                ('\'RUNO.JA', 'T0'),
+                ],
+            'pizza runoja': [
+                ('\'piz.za \'runo.ja', 'T1   T0'),
+                ],
+            }
+
+        error_helper(self, F.syllabify, cases)
+
+        v13.load_exceptions(None)
+
+        self.assertEqual(F.syllabify('runoja'), [('\'ru.no.ja', 'T1')])
+
 
 class TestAnotation(unittest.TestCase):
 
@@ -581,6 +737,29 @@ class TestAnotation(unittest.TestCase):
         error_helper(self, F1.annotate, cases1)
         error_helper(self, F2.annotate, cases2)
 
+    def test_spans(self):
+        # ensure that FinnSyll.spans() maps syllable boundaries, compound
+        # boundaries, and stress back onto the original input
+        F1 = FinnSyll(split=True)
+        F2 = FinnSyll(split=False)
+
+        cases1 = {
+            'hovioikeus': ([2, 4, 6, 8], [4], [0, 4], []),
+            'Hovi-OIKEUS.': ([2, 7, 9], [], [0, 5], []),
+            'liu\'uttaa': ([6], [], [0, 4], []),
+            'ääntenenemmistöllä': (
+                [3, 6, 7, 10, 13, 16], [6], [0, 6], [10],
+                ),
+            '': ([], [], [], []),
+            }
+
+        cases2 = {
+            'hovioikeus': ([2, 4, 6, 8], [], [0], [4]),
+            }
+
+        error_helper(self, lambda w: tuple(map(list, F1.spans(w))), cases1)
+        error_helper(self, lambda w: tuple(map(list, F2.spans(w))), cases2)
+
 
 class TestVariantOrdering(unittest.TestCase):  # TODO: TEST WITH STRESS
 
@@ -621,6 +800,80 @@ class TestVariantOrdering(unittest.TestCase):  # TODO: TEST WITH STRESS
         if errors:
             raise AssertionError(errors)
 
+    def test_violations(self):
+        # ensure that violations() agrees with the individual constraints
+        words = [
+            'rak.kau.den', 'rak.ka.u.den', 'lau.ka.us.ta', 'lau.kaus.ta',
+            '\'rak.kaus', '\'kaik.`keu.den', 'kuu=kaut.ta', 'a', 'vaa.ka.ta',
+            ]
+
+        for word in words:
+            self.assertEqual(
+                v13.violations(word),
+                v13.wsp(word) + v13.pk_prom(word) + v13.nuc(word),
+                )
+
+        # ensure that multi-word texts are ranked as a whole
+        F = FinnSyll(split=False, variation=True, rules=False, stress=False)
+        text = 'rakkauden laukausta avautuu'
+        variants = [''.join(v) for v in product(*[
+            [s for s, _ in v13._syllabify_simplex(w)] if w.isalpha() else [w, ]
+            for w in utilities.nonalpha_split(text)
+            ])]
+        variants.sort(
+            key=lambda s: v13.wsp(s) + v13.pk_prom(s) + v13.nuc(s))
+
+        self.assertEqual(F.syllabify(text), variants)
+
+    def test_weights(self):
+        # ensure that weighted constraints rank variants by their harmony,
+        # and that each variant receives a probability
+        import io
+        import os
+        import tempfile
+
+        F = FinnSyll(split=True, variation=True, rules=False, stress=False)
+
+        self.assertEqual(
+            F.distribution('hovioikeus'),
+            [('ho.vi.oi.ke.us', 0.5), ('ho.vi.oi.keus', 0.5)],
+            )
+
+        fd, filename = tempfile.mkstemp(suffix='.tsv')
+        os.close(fd)
+
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write('WSP\t3.0\nNUC\t1.0\n')
+
+        try:
+            v13.load_weights(filename)
+            self.assertEqual(v13.WEIGHTS, (3.0, 0.0, 1.0))
+
+            distribution = F.distribution('hovioikeus')
+            self.assertEqual(
+                [s for s, _ in distribution],
+                ['ho.vi.oi.ke.us', 'ho.vi.oi.keus'],
+                )
+            self.assertAlmostEqual(distribution[0][1], 0.8808, places=4)
+
+            # WSP outweighs NUC, so the superheavy variant is dispreferred
+            self.assertEqual(
+                F.syllabify('rakkauden laukausta'),
+                [
+                    'rak.kau.den lau.ka.us.ta',
+                    'rak.ka.u.den lau.ka.us.ta',
+                    'rak.kau.den lau.kaus.ta',
+                    'rak.ka.u.den lau.kaus.ta',
+                    ],
+                )
+
+        finally:
+            os.remove(filename)
+            v13.load_weights(None)
+
+        self.assertEqual(
+            F.syllabify('rakkauden laukausta')[1], 'rak.kau.den lau.kaus.ta')
+
 
 class TestSegmenter(unittest.TestCase):
 
@@ -659,6 +912,694 @@ class TestSegmenter(unittest.TestCase):
 
         self.assertEqual(F.split(case), expected)
 
+    def test_constituents(self):
+        # ensure that FinnSeg.constituents() tokenizes words into constituent
+        # words and delimiters, as they appear in FinnSyll.split()
+        F = FinnSyll(split=True, variation=True, rules=False, stress=False)
+
+        cases = {
+            'runoja': ['runoja', ],
+            'kuukautta': ['kuu', '=', 'kautta'],
+            'linja-AUTOASEMAN.': [
+                'linja', '-', 'AUTO', '=', 'ASEMAN', '.',
+                ],
+            '': [],
+            }
+
+        error_helper(self, F.segmenter.constituents, cases)
+
+        for word in cases:
+            self.assertEqual(
+                ''.join(F.segmenter.constituents(word)),
+                F.split(word),
+                )
+
+    def test_bypass(self):
+        # ensure that short words, words with too few vowels, and known
+        # simplex words bypass the segmenter without changing its output
+        from finnsyll import FinnSeg
+
+        S1 = FinnSeg()
+        S2 = FinnSeg(min_length=0, min_vowels=0, lexicon=None)
+
+        words = [
+            'on', 'kissa', 'runoja', 'oikeus', 'yleisölle', 'kuukautta',
+            'loppuottelussa', 'sosiaalidemokraattien', 'hovioikeus',
+            ]
+
+        for word in words:
+            self.assertEqual(S1.segment(word), S2.segment(word))
+
+        self.assertEqual(S1.counts['component'], len(words))
+        self.assertEqual(S1.counts['bypass'], 5)
+        self.assertAlmostEqual(S1.bypass_rate(), 5.0 / len(words))
+        self.assertEqual(S2.bypass_rate(), 0.0)
+        self.assertEqual(
+            S2.build_lexicon(words[:5] + ['Kissa']),
+            ['kissa', 'oikeus', 'on', 'runoja', 'yleisölle'],
+            )
+
+    def test_lexicon_version(self):
+        # ensure that a lexicon is only consulted by segmenters of the model
+        # that it was built for
+        import os
+        import shutil
+        import tempfile
+        import warnings
+
+        from finnsyll import FinnSeg
+        from finnsyll.syllabifier import (
+            LEGACY_NGRAM_FILE,
+            MORFESSOR_FILE,
+            read_lexicon,
+            )
+
+        directory = tempfile.mkdtemp()
+
+        try:
+            lexicon_file = os.path.join(directory, 'simplex.txt')
+            ngram_file = os.path.join(directory, 'ngrams.pickle')
+
+            S = FinnSeg(lexicon=None)
+            S.write_lexicon(lexicon_file, ['arkkitehtuuri', 'hovioikeus'])
+            self.assertEqual(
+                read_lexicon(lexicon_file), (S.version, ['arkkitehtuuri']))
+            self.assertEqual(
+                FinnSeg(lexicon=lexicon_file).lexicon,
+                frozenset(['arkkitehtuuri']),
+                )
+
+            # a retrained model
+            with open(LEGACY_NGRAM_FILE, 'rb') as f:
+                ngrams, vocab, total = pickle.load(f)
+
+            for key in [k for k in ngrams if 'kuu' in k.split()]:
+                del ngrams[key]
+
+            with open(ngram_file, 'wb') as f:
+                pickle.dump((ngrams, vocab, total), f)
+
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                R = FinnSeg(
+                    morfessor_file=MORFESSOR_FILE, ngram_file=ngram_file)
+                self.assertFalse(R.lexicon)
+                self.assertEqual(caught, [])
+
+                R = FinnSeg(
+                    lexicon=lexicon_file,
+                    morfessor_file=MORFESSOR_FILE,
+                    ngram_file=ngram_file,
+                    )
+                self.assertFalse(R.lexicon)
+                self.assertEqual(len(caught), 1)
+
+        finally:
+            shutil.rmtree(directory)
+
+        # the bundled lexicon was built for the bundled model
+        self.assertEqual(len(FinnSeg().lexicon), 9658)
+
+    def test_dictionary(self):
+        # ensure that the user dictionary overrides the segmenter, preserving
+        # capitalization
+        import io
+        import os
+        import tempfile
+
+        from finnsyll import FinnSeg
+
+        fd, filename = tempfile.mkstemp(suffix='.tsv')
+        os.close(fd)
+
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write(
+                'kuukautta\tkuukautta\n'
+                'hovi=oikeus\n'
+                'sosiaalidemokraat-\tsosiaali=demo=kraat\n'
+                )
+
+        try:
+            S = FinnSeg(dictionary=filename)
+
+        finally:
+            os.remove(filename)
+
+        cases = {
+            'kuukautta': 'kuukautta',
+            'HOVIOIKEUS': 'HOVI=OIKEUS',
+            'Sosiaalidemokraattien': 'Sosiaali=demo=kraattien',
+            'sosiaalidemokraat': 'sosiaali=demo=kraat',
+            'hovioikeus-Kuukautta': 'hovi=oikeus-Kuukautta',
+            'loppuottelussa': 'loppu=ottelussa',
+            }
+
+        error_helper(self, S.segment, cases)
+
+        self.assertEqual(S.is_complex('kuukautta'), False)
+        self.assertEqual(S.is_complex('hovioikeus'), True)
+        self.assertEqual(S.counts['dictionary'], 8)
+
+        # segmentations must spell out their forms, without empty parts, and
+        # forms must be alphabetic (bar a stem's '-')
+        for line in [
+                'kuukautta\tkuu=kausi', 'kuu==kautta', '=hovioikeus',
+                'linja-auto\tlinja-auto', 'linja--\tlinja-', 'kuu kausi']:
+            fd, filename = tempfile.mkstemp(suffix='.tsv')
+
+            with io.open(fd, 'w', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+            try:
+                self.assertRaises(ValueError, S.load_dictionary, filename)
+
+            finally:
+                os.remove(filename)
+
+        # as must the constituents of a custom segmenter
+        class Segmenter(FinnSeg):
+
+            def constituents(self, word, budget=None):
+                return ['kuu', '=', '', '=', 'kautta']
+
+        F = FinnSyll(segmenter=Segmenter())
+        self.assertRaises(ValueError, F.syllabify, 'kuukautta')
+        self.assertRaises(ValueError, F.spans, 'kuukautta')
+
+    def test_stem_cache(self):
+        # ensure that inflected forms reuse the cached segmentations of their
+        # stems, unless the ending would violate a constraint
+        from finnsyll import FinnSeg
+
+        S = FinnSeg(stem_cache=100)
+
+        cases = [
+            ('kuukautta', 'kuu=kautta', 'stem_miss'),
+            ('Kuukauttakin', 'Kuu=kauttakin', 'stem_hit'),
+            ('kuukautta', 'kuu=kautta', 'stem_hit'),
+            ('kuukauttaan', 'kuu=kauttaan', 'stem_hit'),
+            ('kuukauttassä', None, 'stem_miss'),  # disharmonic
+            ]
+
+        for word, expected, outcome in cases:
+            before = S.counts[outcome]
+            segmentation = S.segment(word)
+            self.assertEqual(S.counts[outcome], before + 1)
+
+            if expected:
+                self.assertEqual(segmentation, expected)
+
+        S = FinnSeg(stem_cache=1)
+        S.segment('kuukautta')
+        S.segment('loppuottelussa')
+        self.assertEqual(list(S._words), ['loppuottelussa'])
+
+        for size in (2, 5, 20):
+            S = FinnSeg(stem_cache=size)
+
+            for word in ['kuukautta', 'loppuottelussa', 'hovioikeuksien',
+                         'linja-autoasemalla', 'kuukausilla']:
+                S.segment(word)
+                self.assertLessEqual(len(S._words), size)
+
+    def test_stem_cache_inflections(self):
+        # ensure that the stem cache never changes a segmentation
+        import io
+        import random
+
+        from finnsyll import FinnSeg
+        from finnsyll.syllabifier import SUFFIXES, TRAINING_FILE
+
+        with io.open(TRAINING_FILE, encoding='utf-8') as f:
+            lemmas = sorted(set(
+                w for w in f.read().split() if w.isalpha() and len(w) > 6))
+
+        random.seed(0)
+        lemmas = random.sample(lemmas, 100)
+        lemmas += ['kuukausi', 'elokuvateatteri']
+        words = [lemma + suffix for lemma in lemmas for suffix in
+                 [''] + SUFFIXES]
+        words += ['kuukaudelta', 'kuukaudesta', 'elokuvateatteren']
+
+        S = FinnSeg(stem_cache=100000)
+        U = FinnSeg()
+
+        for word in words:
+            self.assertEqual(S.segment(word), U.segment(word), word)
+
+        self.assertTrue(S.counts['stem_hit'])
+
+    def test_weights(self):
+        # ensure that weighted constraints penalize, rather than rule out,
+        # constraint violations
+        import io
+        import os
+        import tempfile
+
+        from finnsyll import FinnSeg
+
+        fd, filename = tempfile.mkstemp(suffix='.tsv')
+        os.close(fd)
+
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write('MnWrd\t10\nSonSeq\t5\nWord#\t5\nHarmonic\t2\n')
+
+        try:
+            S = FinnSeg(weights=filename)
+
+        finally:
+            os.remove(filename)
+
+        self.assertTrue(S.weighted)
+        self.assertEqual(
+            [c.weight for c in S.constraints], [10.0, 5.0, 5.0, 2.0])
+
+        cases = {
+            'kuukautta': 'kuu=kautta',
+            'hovioikeus': 'hovi=oikeus',
+            'kilometriä': 'kilometriä',
+            }
+
+        error_helper(self, S.segment, cases)
+
+        for word in cases:
+            self.assertEqual(S.is_complex(word), '=' in S.segment(word))
+
+        # the simplex lexicon assumes hard constraints
+        self.assertFalse(S.lexicon)
+        self.assertRaises(ValueError, S.build_lexicon, ['kuukautta'])
+
+    def test_weighted_bypass(self):
+        # ensure that weighted segmenters segment the components that the
+        # min_length and min_vowels gates would otherwise let through
+        import io
+        import os
+        import tempfile
+
+        from finnsyll import FinnSeg
+
+        fd, filename = tempfile.mkstemp(suffix='.tsv')
+        os.close(fd)
+
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write('MnWrd\t0.1\n')
+
+        try:
+            S = FinnSeg(weights=filename)
+            T = FinnSeg(
+                weights=filename, min_length=0, min_vowels=0, lexicon=None)
+
+        finally:
+            os.remove(filename)
+
+        for word in ['käynnit', 'stop', 'talo', 'yö', 'kuukautta']:
+            self.assertEqual(S.constituents(word), T.constituents(word))
+
+        self.assertEqual(S.counts['bypass'], 0)
+
+    def test_ngrams(self):
+        # ensure that the slim n-gram file matches the legacy pickle
+        from finnsyll import ngrams
+        from finnsyll.syllabifier import LEGACY_NGRAM_FILE, NGRAM_FILE
+
+        with open(LEGACY_NGRAM_FILE, 'rb') as f:
+            legacy, vocab, total = pickle.load(f)
+
+        with open(NGRAM_FILE, 'rb') as f:
+            ids, unigrams, bigrams, trigrams, total_ = ngrams.loads(f.read())
+
+        self.assertEqual(total_, total)
+        self.assertEqual(len(ids), len(vocab))
+        self.assertEqual(
+            len(unigrams) + len(bigrams) + len(trigrams), len(legacy))
+
+        size = len(ids)
+
+        for ngram, count in legacy.items():
+            morphs = [ids[m] for m in ngram.split(' ')]
+            table = [unigrams, bigrams, trigrams][len(morphs) - 1]
+            k = morphs[0] if len(morphs) == 1 else ngrams.key(size, *morphs)
+            self.assertEqual(table[k], count)
+
+    def test_reload(self):
+        # ensure that reloading swaps in a changed model, clears the stem
+        # cache, and rebuilds the lexicon, and that an unchanged model is kept
+        import io
+        import os
+        import shutil
+        import tempfile
+        import time
+
+        from finnsyll import FinnSeg
+        from finnsyll.syllabifier import LEGACY_NGRAM_FILE, MORFESSOR_FILE
+
+        directory = tempfile.mkdtemp()
+
+        try:
+            morfessor_file = os.path.join(directory, 'morfessor.bin')
+            ngram_file = os.path.join(directory, 'ngrams.pickle')
+            shutil.copy(MORFESSOR_FILE, morfessor_file)
+            shutil.copy(LEGACY_NGRAM_FILE, ngram_file)
+
+            # a lexicon that wrongly lists a compound
+            lexicon_file = os.path.join(directory, 'simplex.txt')
+
+            with io.open(lexicon_file, 'w', encoding='utf-8') as f:
+                f.write('hovioikeus\narkkitehtuuri\n')
+
+            S = FinnSeg(
+                stem_cache=100,
+                lexicon=lexicon_file,
+                morfessor_file=morfessor_file,
+                ngram_file=ngram_file,
+                )
+            lm = S.lm
+            self.assertEqual(S.segment('kuukautta'), 'kuu=kautta')
+            self.assertEqual(S.segment('hovioikeus'), 'hovioikeus')
+            self.assertTrue(S._words)
+
+            S.reload()
+            self.assertIs(S.lm, lm)
+            self.assertTrue(S._words)
+            self.assertEqual(len(S.lexicon), 2)
+
+            # drop the counts that favor splitting 'kuukautta'
+            with open(ngram_file, 'rb') as f:
+                ngrams, vocab, total = pickle.load(f)
+
+            for key in [k for k in ngrams if 'kuu' in k.split()]:
+                del ngrams[key]
+
+            with open(ngram_file, 'wb') as f:
+                pickle.dump((ngrams, vocab, total), f)
+
+            S.reload(background=True).join()
+            self.assertIsNot(S.lm, lm)
+            self.assertNotEqual(S.version, lm.version)
+            self.assertFalse(S._words)
+            self.assertEqual(S.lexicon, frozenset(['arkkitehtuuri']))
+            self.assertEqual(S.segment('hovioikeus'), 'hovi=oikeus')
+
+            # restore the original counts, and wait for the watcher to
+            # notice
+            S.watch(interval=0.01)
+            shutil.copy(LEGACY_NGRAM_FILE, ngram_file)
+            os.utime(ngram_file, (time.time() + 1, ) * 2)
+
+            for _ in range(500):
+                if S.version == lm.version:
+                    break
+
+                time.sleep(0.01)
+
+            S.unwatch()
+            self.assertEqual(S.version, lm.version)
+            self.assertEqual(S.segment('kuukautta'), 'kuu=kautta')
+
+        finally:
+            shutil.rmtree(directory)
+
+    def test_watch_compiled(self):
+        # ensure that a segmenter watching a compiled model also watches the
+        # model files it was compiled from, and loads those once they change
+        import os
+        import shutil
+        import tempfile
+        import time
+        import warnings
+
+        from finnsyll import FinnSeg
+        from finnsyll.bake import bake
+        from finnsyll.syllabifier import (
+            LEGACY_NGRAM_FILE,
+            MORFESSOR_FILE,
+            CompiledModel,
+            )
+
+        directory = tempfile.mkdtemp()
+
+        try:
+            compiled_file = os.path.join(directory, 'compiled.bin')
+            morfessor_file = os.path.join(directory, 'morfessor.bin')
+            ngram_file = os.path.join(directory, 'ngrams.pickle')
+            shutil.copy(MORFESSOR_FILE, morfessor_file)
+            shutil.copy(LEGACY_NGRAM_FILE, ngram_file)
+
+            version = bake(compiled_file, morfessor_file, ngram_file)
+            S = FinnSeg(compiled_file=compiled_file)
+            self.assertIsInstance(S.lm, CompiledModel)
+            self.assertEqual(
+                sorted(S.lm.files),
+                sorted([compiled_file, morfessor_file, ngram_file]),
+                )
+
+            S.watch(interval=0.01)
+
+            with open(ngram_file, 'rb') as f:
+                ngrams, vocab, total = pickle.load(f)
+
+            for key in [k for k in ngrams if 'kuu' in k.split()]:
+                del ngrams[key]
+
+            # replace the file in one step, so that the watcher sees a single
+            # change
+            with open(ngram_file + '.new', 'wb') as f:
+                pickle.dump((ngrams, vocab, total), f)
+
+            os.utime(ngram_file + '.new', (time.time() + 1, ) * 2)
+            os.rename(ngram_file + '.new', ngram_file)
+
+            # the compiled file is now out of date (see test_stale_compiled())
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+
+                for _ in range(500):
+                    if S.version != version:
+                        break
+
+                    time.sleep(0.01)
+
+                S.unwatch()
+            self.assertNotEqual(S.version, version)
+            self.assertNotIsInstance(S.lm, CompiledModel)
+            self.assertIn(compiled_file, S.lm.files)
+
+            # once the compiled file is rebuilt, it is up to date again
+            bake(compiled_file, morfessor_file, ngram_file)
+            self.assertIsInstance(S.lm.reopen(), CompiledModel)
+
+        finally:
+            shutil.rmtree(directory)
+
+    def test_stale_compiled(self):
+        # ensure that a compiled model is skipped, with a warning, once the
+        # model files it was compiled from have changed
+        import os
+        import shutil
+        import tempfile
+        import time
+        import warnings
+
+        from finnsyll import FinnSeg
+        from finnsyll.bake import bake
+        from finnsyll.syllabifier import (
+            LEGACY_NGRAM_FILE,
+            MORFESSOR_FILE,
+            CompiledModel,
+            LanguageModel,
+            )
+
+        directory = tempfile.mkdtemp()
+
+        try:
+            compiled_file = os.path.join(directory, 'compiled.bin')
+            morfessor_file = os.path.join(directory, 'morfessor.bin')
+            ngram_file = os.path.join(directory, 'ngrams.pickle')
+            shutil.copy(MORFESSOR_FILE, morfessor_file)
+            shutil.copy(LEGACY_NGRAM_FILE, ngram_file)
+            version = bake(compiled_file, morfessor_file, ngram_file)
+
+            def load():
+                with warnings.catch_warnings(record=True) as caught:
+                    warnings.simplefilter('always')
+                    S = FinnSeg(compiled_file=compiled_file)
+
+                return S, [str(w.message) for w in caught]
+
+            # touching the model files leaves them up to date
+            os.utime(ngram_file, (time.time() + 1, ) * 2)
+            S, caught = load()
+            self.assertIsInstance(S.lm, CompiledModel)
+            self.assertEqual(caught, [])
+
+            with open(ngram_file, 'rb') as f:
+                ngrams, vocab, total = pickle.load(f)
+
+            for key in [k for k in ngrams if 'kuu' in k.split()]:
+                del ngrams[key]
+
+            with open(ngram_file, 'wb') as f:
+                pickle.dump((ngrams, vocab, total), f)
+
+            S, caught = load()
+            self.assertNotIsInstance(S.lm, CompiledModel)
+            self.assertEqual(
+                S.version, LanguageModel(morfessor_file, ngram_file).version)
+            self.assertNotEqual(S.version, version)
+            self.assertEqual(len(caught), 1)
+            self.assertIn('out of date', caught[0])
+
+            # nor does reloading the compiled file bring it back
+            S = FinnSeg(morfessor_file=morfessor_file, ngram_file=ngram_file)
+
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                S.reload(compiled_file=compiled_file)
+
+            self.assertNotIsInstance(S.lm, CompiledModel)
+
+            # without its model files, the compiled file is all there is
+            os.remove(morfessor_file)
+            os.remove(ngram_file)
+            S, caught = load()
+            self.assertIsInstance(S.lm, CompiledModel)
+            self.assertEqual(S.version, version)
+            self.assertEqual(caught, [])
+
+        finally:
+            shutil.rmtree(directory)
+
+    def test_compiled(self):
+        # ensure that a baked model segments as the model files it was
+        # compiled from, keeps their version and any constraint weights, and
+        # is skipped if it is corrupt
+        import io
+        import os
+        import shutil
+        import tempfile
+
+        from finnsyll import FinnSeg
+        from finnsyll.bake import bake
+        from finnsyll.syllabifier import CompiledModel, NGRAM_FILE
+
+        directory = tempfile.mkdtemp()
+
+        try:
+            compiled_file = os.path.join(directory, 'compiled.bin')
+            weights_file = os.path.join(directory, 'weights.tsv')
+
+            with io.open(weights_file, 'w', encoding='utf-8') as f:
+                f.write('MnWrd\t4.5\n')
+
+            version = bake(compiled_file)
+            S = FinnSeg(ngram_file=NGRAM_FILE)
+            C = FinnSeg(compiled_file=compiled_file)
+            self.assertIsInstance(C.lm, CompiledModel)
+            self.assertEqual(C.version, version)
+            self.assertEqual(C.version, S.version)
+            self.assertFalse(C.weighted)
+
+            words = [
+                'kuukautta', 'hovioikeus', 'linja-autoaseman',
+                'loppuottelussa', 'muutostöitä', 'kilometriä', 'Uusikaupunki',
+                ]
+
+            for word in words:
+                self.assertEqual(C.segment(word), S.segment(word))
+
+            bake(compiled_file, weights=weights_file)
+            W = FinnSeg(compiled_file=compiled_file)
+            self.assertTrue(W.weighted)
+            self.assertEqual(W.lm.weights, {'MnWrd': 4.5})
+            del C, W
+
+            # flip a byte of the model's body
+            with open(compiled_file, 'r+b') as f:
+                f.seek(-1, os.SEEK_END)
+                byte = f.read(1)
+                f.seek(-1, os.SEEK_END)
+                f.write(bytes(bytearray([ord(byte) ^ 1])))
+
+            self.assertRaises(ValueError, CompiledModel.open, compiled_file)
+            F = FinnSeg(compiled_file=compiled_file)
+            self.assertNotIsInstance(F.lm, CompiledModel)
+            self.assertEqual(F.version, version)
+
+        finally:
+            shutil.rmtree(directory)
+
+    def test_shared(self):
+        # ensure that segmenters attached to a model in shared memory, in
+        # this process or in spawned workers, segment as the original does
+        import multiprocessing
+
+        from finnsyll import FinnSeg
+        from finnsyll.syllabifier import NGRAM_FILE
+        from finnsyll.tables import log_probabilities
+
+        S = FinnSeg(ngram_file=NGRAM_FILE)
+        segment = S.publish()
+
+        try:
+            C = FinnSeg(shared=segment.name)
+            self.assertEqual(C.version, S.version)
+            self.assertEqual(C.vocab_size, S.vocab_size)
+            self.assertEqual(dict(C.lm.ids.items()), S.lm.ids)
+
+            unigrams, bigrams, trigrams, unknown = log_probabilities(
+                S.lm.ids, S.lm.unigrams, S.lm.bigrams, S.lm.trigrams,
+                S.lm.total)
+            self.assertEqual(list(C.lm.unigrams), list(unigrams))
+            self.assertEqual(dict(C.lm.bigrams.items()), bigrams)
+            self.assertEqual(dict(C.lm.trigrams.items()), trigrams)
+            self.assertEqual(C.lm.unknown, unknown)
+
+            words = [
+                'kuukautta', 'hovioikeus', 'linja-autoaseman',
+                'loppuottelussa', 'muutostöitä', 'kilometriä', 'Uusikaupunki',
+                ]
+
+            for word in words:
+                self.assertEqual(C.segment(word), S.segment(word))
+                self.assertEqual(C.is_complex(word), S.is_complex(word))
+
+            F = FinnSyll(segmenter=C)
+            self.assertEqual(F.syllabify('kuukautta'), ['kuu.kaut.ta'])
+
+            context = multiprocessing.get_context('spawn')
+            pool = context.Pool(
+                2, initializer=_attach_segmenter, initargs=(segment.name, ))
+
+            try:
+                self.assertEqual(
+                    pool.map(_segment, words),
+                    [S.segment(w) for w in words],
+                    )
+
+            finally:
+                pool.close()
+                pool.join()
+
+            del C, F
+
+        finally:
+            segment.close()
+            segment.unlink()
+
+        # without multiprocessing.shared_memory (before Python 3.8), neither
+        # publishing nor attaching is possible
+        from finnsyll import syllabifier
+
+        shared_memory = syllabifier.shared_memory
+        syllabifier.shared_memory = None
+
+        try:
+            self.assertRaises(RuntimeError, S.publish)
+            self.assertRaises(RuntimeError, FinnSeg, shared=segment.name)
+
+        finally:
+            syllabifier.shared_memory = shared_memory
+
     def test_is_complex(self):
         # ensure that FinnSylll.is_complex() detects compounds
         F = FinnSyll(split=True, variation=True, rules=False, stress=False)
@@ -669,11 +1610,22 @@ class TestSegmenter(unittest.TestCase):
             'kuukautta': True,
             'linja-autoaseman': True,
             'loppuottelussa': True,
+            'a': False,
+            '': True,
             'muutostöitä': True,
             }
 
         error_helper(self, F.is_complex, cases)
 
+        for word, expected in cases.items():
+            self.assertEqual(expected, not F.split(word).isalpha())
+
+        words = list(cases) * 2
+        self.assertEqual(
+            F.is_complex_batch(words),
+            [cases[w] for w in words],
+            )
+
 
 class TestConstraints(unittest.TestCase):
 
@@ -783,6 +1735,26 @@ class TestConstraints(unittest.TestCase):
 
         error_helper(self, phon.harmonic, cases)
 
+    def test_harmony(self):
+        # ensure that harmony() weighs each constraint's violations, and that
+        # maxent() converts harmonies into probabilities
+        tableau = [
+            [0, 1, 2],  # C1
+            [1, 0, 0],  # C2
+            ]
+
+        self.assertEqual(phon.harmony(tableau, [2.0, 1.0]), [-1.0, -2.0, -4.0])
+        self.assertEqual(phon.harmony(tableau, [0.0, 0.0]), [0.0, 0.0, 0.0])
+
+        probabilities = phon.maxent([-1.0, -1.0, -1000.0])
+        self.assertAlmostEqual(sum(probabilities), 1.0)
+        self.assertAlmostEqual(probabilities[0], 0.5)
+        self.assertAlmostEqual(probabilities[2], 0.0)
+
+        constraints = phon.weigh(phon.CONSTRAINTS, {'SonSeq': 3.0})
+        self.assertEqual(
+            [c.weight for c in constraints], [0.0, 3.0, 0.0, 0.0])
+
 
 class TestUtilities(unittest.TestCase):
 
@@ -840,3 +1812,607 @@ class TestUtilities(unittest.TestCase):
             ]
 
         self.assertEqual(utilities.extract_words(lines), expected)
+
+    def test_scan(self):
+        # ensure that utilities.scan() yields the offsets and kinds of the
+        # tokens found by utilities.nonalpha_split()
+        lines = (
+            'Nuo äänet on kuorona~rinnassas.\n'
+            'kun käytiin katkera kostontie.\n\n'
+            'muutostöitä'
+            )
+
+        spans = list(utilities.scan(lines))
+
+        self.assertEqual(
+            [lines[i:j] for i, j, _ in spans],
+            utilities.nonalpha_split(lines),
+            )
+        self.assertEqual(spans[:3], [
+            (0, 3, utilities.ALPHA),
+            (3, 4, utilities.DELIMITER),
+            (4, 9, utilities.ALPHA),
+            ])
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_timed(self):
+        # ensure that timed() records calls and time only when enabled, and
+        # that it times generators item by item
+        import finnsyll.instrument as instrument
+
+        DEV = instrument.DEV
+
+        try:
+            instrument.DEV = False
+
+            def untimed():
+                pass
+
+            self.assertIs(instrument.timed('test.untimed')(untimed), untimed)
+
+            instrument.DEV = True
+
+            @instrument.timed('test.function')
+            def function(x):
+                return x + 1
+
+            @instrument.timed('test.generator')
+            def generator(n):
+                for i in range(n):
+                    yield i
+
+        finally:
+            instrument.DEV = DEV
+
+        self.assertEqual(function(1), 2)
+        self.assertEqual(function(2), 3)
+        self.assertEqual(list(generator(3)), [0, 1, 2])
+        self.assertEqual(next(generator(3)), 0)  # abandoned generator
+
+        stats = instrument.stats()
+        self.assertEqual(stats['test.function']['calls'], 2)
+        self.assertEqual(stats['test.generator']['calls'], 2)
+        self.assertNotIn('test.untimed', stats)
+        self.assertGreaterEqual(stats['test.function']['seconds'], 0.0)
+
+        instrument.reset_stats()
+        self.assertEqual(instrument.stats(), {})
+
+    def test_batch_stats(self):
+        # ensure that the batch path is timed as T1 (timing is decided at
+        # import, so this runs in a fresh interpreter)
+        import os
+        import subprocess
+        import sys
+
+        code = (
+            'from finnsyll import FinnSyll\n'
+            'F = FinnSyll()\n'
+            'F.syllabify_batch(["kuukautta", "kuukaudessa"])\n'
+            'print(F.stats()["T1"]["calls"])\n'
+            )
+        env = dict(os.environ, FINNSYLL_DEV='1')
+        output = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertGreater(int(output), 0)
+
+    def test_hooks(self):
+        # ensure that hooks receive events from v13 and FinnSeg, subject to
+        # sampling, until they are removed
+        import finnsyll.instrument as instrument
+
+        F = FinnSyll()
+        events, sampled = [], []
+
+        self.assertFalse(instrument.TRACING)
+
+        instrument.add_hook(events.append)
+        instrument.add_hook(sampled.append, rate=0.0)
+
+        try:
+            self.assertTrue(instrument.TRACING)
+            F.syllabify('kuukausilaukaus')
+
+        finally:
+            instrument.remove_hook(events.append)
+            instrument.remove_hook(sampled.append)
+
+        self.assertFalse(instrument.TRACING)
+        self.assertEqual(sampled, [])
+        self.assertIn({
+            'event': 'segment',
+            'component': 'kuukausilaukaus',
+            'candidates': 4,
+            'survived': 4,
+            'segmentation': 'kuu=kausi=laukaus',
+            }, events)
+        self.assertIn(
+            {'event': 'T4', 'word': 'lau.kaus', 'variants': 2}, events)
+        self.assertEqual(events[-1]['event'], 'rank')
+        self.assertFalse(events[-1]['reordered'])
+
+        F.syllabify('kuukausilaukaus')
+        self.assertEqual(len(events), 5)
+
+    def test_sampling(self):
+        # ensure that hooks are sampled once per top-level call, so that each
+        # call delivers either all or none of its events
+        import random
+        import finnsyll.instrument as instrument
+
+        F = FinnSyll()
+        words = ['kuukausilaukaus', 'hovioikeus', 'rakkauden laukausta'] * 10
+        events, sampled = [], []
+
+        instrument.add_hook(events.append)
+        instrument.add_hook(sampled.append, rate=0.5)
+        random.seed(0)
+
+        try:
+            for word in words:
+                del events[:], sampled[:]
+                F.syllabify(word)
+                self.assertIn(sampled, ([], events))
+
+        finally:
+            instrument.remove_hook(events.append)
+            instrument.remove_hook(sampled.append)
+
+    def test_survived(self):
+        # ensure that "survived" counts the candidates that violate no
+        # constraint, whether the constraints are hard or weighted
+        import io
+        import os
+        import tempfile
+        import finnsyll.instrument as instrument
+
+        from finnsyll import FinnSeg
+
+        fd, filename = tempfile.mkstemp(suffix='.tsv')
+        os.close(fd)
+
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write('MnWrd\t10\nSonSeq\t5\nWord#\t5\nHarmonic\t2\n')
+
+        try:
+            segmenters = [FinnSeg(), FinnSeg(weights=filename)]
+
+        finally:
+            os.remove(filename)
+
+        events = []
+        instrument.add_hook(events.append)
+
+        try:
+            for S in segmenters:
+                S.segment('kilometriä')
+
+        finally:
+            instrument.remove_hook(events.append)
+
+        self.assertEqual(
+            [(e['candidates'], e['survived']) for e in events],
+            [(2, 1), (2, 1)],
+            )
+
+
+class TestServer(unittest.TestCase):
+
+    def test_server(self):
+        # ensure that the server's results match FinnSyll's, whether requests
+        # arrive alone, in batches, or concurrently
+        import threading
+        from finnsyll.server import Client, Server, ServerError
+
+        F = FinnSyll()
+        server = Server(('127.0.0.1', 0), F, window=0.01).start()
+        client = Client(server.address, pool_size=2)
+
+        try:
+            words = ['kuukausilaukaus', 'vapaus', 'talo', 'talossa', 'talo']
+
+            for word in words:
+                self.assertEqual(client.syllabify(word), F.syllabify(word))
+                self.assertEqual(client.split(word), F.split(word))
+                self.assertEqual(client.annotate(word), F.annotate(word))
+
+            self.assertEqual(
+                client.syllabify_batch(words), F.syllabify_batch(words))
+
+            results = {}
+
+            def request(i):
+                results[i] = client.syllabify(words[i % len(words)])
+
+            threads = [
+                threading.Thread(target=request, args=(i, ))
+                for i in range(20)
+                ]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+            for i, result in results.items():
+                self.assertEqual(result, F.syllabify(words[i % len(words)]))
+
+            self.assertEqual(len(results), 20)
+            self.assertLessEqual(client._pool.qsize(), 2)
+
+            with self.assertRaises(ServerError):
+                client._call('stress', words)
+
+            with self.assertRaises(ServerError):
+                client._call('split', 'talo')
+
+            with self.assertRaises(ServerError):
+                client._call('split', ['talo', 5])
+
+            self.assertEqual(client.split('hovioikeus'), 'hovi=oikeus')
+
+        finally:
+            client.close()
+            server.close()
+
+    def test_isolation(self):
+        # ensure that a request that fails does not fail the rest of its batch
+        from finnsyll.server import Batcher, _Request
+
+        batcher = Batcher(FinnSyll())
+        good, bad = _Request('split', ['hovioikeus']), _Request('split', [5])
+        batcher._process([good, bad])
+
+        self.assertEqual(good.results, ['hovi=oikeus'])
+        self.assertIsNone(good.error)
+        self.assertIsNotNone(bad.error)
+
+    def test_max_frame(self):
+        # ensure that the server rejects frames beyond its limit
+        from finnsyll.server import Client, Server, ServerError
+
+        server = Server(('127.0.0.1', 0), FinnSyll(), max_frame=64).start()
+        client = Client(server.address)
+
+        try:
+            self.assertEqual(client.split('hovioikeus'), 'hovi=oikeus')
+
+            with self.assertRaises(ServerError) as context:
+                client._call('split', ['hovioikeus'] * 10)
+
+            self.assertIn('exceeds', str(context.exception))
+
+        finally:
+            client.close()
+            server.close()
+
+
+class TestPrefork(unittest.TestCase):
+
+    def test_preload(self):
+        # ensure that preload() freezes the models without changing results
+        import gc
+        from finnsyll.prefork import preload
+
+        F = FinnSyll()
+
+        try:
+            P = preload()
+
+            if hasattr(gc, 'get_freeze_count'):
+                self.assertGreater(gc.get_freeze_count(), 0)
+
+        finally:
+            if hasattr(gc, 'unfreeze'):
+                gc.unfreeze()
+
+        self.assertTrue(gc.isenabled())
+        self.assertEqual(P.segmenter.version, F.segmenter.version)
+
+        for word in ['kuukausilaukaus', 'vapaus', 'talossa']:
+            self.assertEqual(P.syllabify(word), F.syllabify(word))
+
+
+class TestAsync(unittest.TestCase):
+
+    def test_async(self):
+        # ensure that AsyncFinnSyll's results match FinnSyll's, and that
+        # cached words skip the pool
+        import asyncio
+        from finnsyll.aio import AsyncFinnSyll
+
+        F = FinnSyll()
+        words = ['kuukausilaukaus', 'vapaus', 'talo', 'talossa', 'talo']
+
+        async def run():
+            async with AsyncFinnSyll(workers=2, max_pending=2) as A:
+                for word in words:
+                    self.assertEqual(
+                        await A.syllabify(word), F.syllabify(word))
+                    self.assertEqual(await A.split(word), F.split(word))
+                    self.assertEqual(
+                        await A.annotate(word), F.annotate(word))
+
+                self.assertEqual(
+                    await A.syllabify_batch(words + ['kala']),
+                    F.syllabify_batch(words + ['kala']))
+
+                results = await asyncio.gather(
+                    *[A.is_complex(w) for w in words * 4])
+                self.assertEqual(results, [F.is_complex(w) for w in words * 4])
+
+                executor, A._executor = A._executor, None
+
+                try:  # hot words must not touch the pool
+                    self.assertEqual(
+                        await A.syllabify('vapaus'), F.syllabify('vapaus'))
+
+                finally:
+                    A._executor = executor
+
+        asyncio.run(run())
+
+    def test_async_waiters(self):
+        # ensure that each caller waits no longer than its own timeout, that
+        # a running job keeps its turn until it finishes, and that callers
+        # cannot change cached results
+        import asyncio
+        from concurrent.futures import Future
+        from finnsyll.aio import AsyncFinnSyll
+
+        class Executor(object):
+            # runs each job when told to, rather than in a pool
+
+            def __init__(self):
+                self.jobs = []
+
+            def submit(self, func, method, words):
+                job = Future()
+                job.set_running_or_notify_cancel()
+                self.jobs.append((job, method, words))
+
+                return job
+
+            def shutdown(self, wait=True):
+                pass
+
+            def finish(self):
+                for job, method, words in self.jobs:
+                    job.set_result([getattr(F, method)(w) for w in words])
+
+                self.jobs = []
+
+        F = FinnSyll()
+
+        async def run():
+            A = AsyncFinnSyll(workers=1, max_pending=1)
+            A._executor.shutdown()
+            A._executor = executor = Executor()
+
+            # a caller that joins a pending call keeps its own timeout, in
+            # either order
+            first = asyncio.ensure_future(A.split('talo', timeout=0.01))
+            second = asyncio.ensure_future(A.split('talo'))
+
+            with self.assertRaises(asyncio.TimeoutError):
+                await first
+
+            third = asyncio.ensure_future(A.split('talo', timeout=0.01))
+
+            with self.assertRaises(asyncio.TimeoutError):
+                await third
+
+            executor.finish()
+            self.assertEqual(await second, 'talo')
+
+            # a caller that asks for a word just after its only other caller
+            # timed out starts afresh, rather than joining the cancelled call
+            with self.assertRaises(asyncio.TimeoutError):
+                await A.split('kuukausi', timeout=0.01)
+
+            fourth = asyncio.ensure_future(A.split('kuukausi'))
+            await asyncio.sleep(0.01)
+            executor.finish()
+            await asyncio.sleep(0.01)
+            executor.finish()
+            self.assertEqual(await fourth, F.split('kuukausi'))
+
+            # a job that is running when its only caller times out keeps its
+            # turn until it finishes
+            with self.assertRaises(asyncio.TimeoutError):
+                await A.syllabify('vapaus', timeout=0.01)
+
+            await asyncio.sleep(0.01)
+            self.assertTrue(A._semaphore.locked())
+            executor.finish()
+            await asyncio.sleep(0.01)
+            self.assertFalse(A._semaphore.locked())
+
+            # cached results are copied
+            pending = asyncio.ensure_future(A.syllabify('kala'))
+            await asyncio.sleep(0.01)
+            executor.finish()
+            (await pending).append('ka.la')
+            (await A.syllabify('kala')).append('ka.la')
+            self.assertEqual(await A.syllabify('kala'), F.syllabify('kala'))
+            self.assertEqual(
+                await A.syllabify_batch(['kala']), [F.syllabify('kala')])
+
+        asyncio.run(run())
+
+
+class TestTrain(unittest.TestCase):
+
+    def test_sequences(self):
+        # ensure that segmented words become bounded morph sequences, and
+        # that chunks split corpora along whitespace
+        import os
+        import tempfile
+
+        from finnsyll.train import chunks, read_chunk, sequences
+
+        morphs = {'ministeriön': ['ministeriö', 'n'], 'aseman': ['asema', 'n']}
+        text = 'Työ=ministeriön linja-auto=aseman, kala'
+
+        segments = sequences(text, lambda c: morphs.get(c, [c]))
+
+        self.assertEqual(list(segments), [
+            ['#', 'työ', '#', 'ministeriö', '&', 'n', '#'],
+            ['#', 'linja', '#'],
+            ['#', 'auto', '#', 'asema', '&', 'n', '#'],
+            ['#', 'kala', '#'],
+            ])
+
+        fd, filename = tempfile.mkstemp()
+        text = 'kuu=kautta  hovi=oikeus\nlinja-auto=aseman työ vapaus\n' * 20
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(text.encode('utf-8'))
+
+            for size in (1, 7, 64, 4096):
+                self.assertEqual(
+                    ' '.join(read_chunk(c) for c in chunks([filename], size))
+                    .split(),
+                    text.split(),
+                    )
+
+        finally:
+            os.remove(filename)
+
+    def test_count(self):
+        # ensure that counts are the same whether they are spilled or counted
+        # in several processes, that sketched counts never fall short, and
+        # that either n-gram format holds them
+        import io
+        import os
+        import shutil
+        import tempfile
+
+        from finnsyll import FinnSeg, ngrams, train
+        from finnsyll.syllabifier import TRAINING_FILE
+
+        directory = tempfile.mkdtemp()
+
+        try:
+            corpus = os.path.join(directory, 'corpus.txt')
+
+            with io.open(TRAINING_FILE, encoding='utf-8') as f:
+                words = f.read().split()[:3000]
+
+            with io.open(corpus, 'w', encoding='utf-8') as f:
+                f.write(' '.join(words + ['kuu=kautta', 'hovi=oikeus'] * 5))
+
+            counts, total = train.count([corpus], processes=1)
+            self.assertEqual(counts['kuu # kautta'], 5)
+            self.assertEqual(
+                total, sum(c for k, c in counts.items() if ' ' not in k))
+
+            spilled = train.count(
+                [corpus], processes=2, max_ngrams=100, chunk_size=2000,
+                directory=directory)
+            self.assertEqual(spilled, (counts, total))
+            self.assertEqual(os.listdir(directory), ['corpus.txt'])
+
+            sketched, _ = train.count(
+                [corpus], processes=2, sketch=0.01, chunk_size=2000)
+            self.assertEqual(sketched, train.count(
+                [corpus], processes=2, sketch=0.01, min_count=2,
+                chunk_size=2000)[0])
+            self.assertRaises(
+                ValueError, train.count, [corpus], sketch=0.01, min_count=1)
+            self.assertTrue(all(
+                sketched[k] >= c for k, c in counts.items() if c >= 2))
+
+            for ngram, c in sketched.items():
+                morphs = ngram.split(' ')
+
+                if len(morphs) > 1:
+                    self.assertLessEqual(c, sketched[' '.join(morphs[1:])])
+                    self.assertLessEqual(c, sketched[' '.join(morphs[:-1])])
+
+            slim = os.path.join(directory, 'ngrams.slim')
+            legacy = os.path.join(directory, 'ngrams.pickle')
+            train.train([corpus], slim, processes=1)
+            train.train([corpus], legacy, legacy=True, processes=1)
+
+            with open(slim, 'rb') as f:
+                tables = ngrams.loads(f.read())
+
+            with open(legacy, 'rb') as f:
+                self.assertEqual(ngrams.loads(f.read()), tables)
+
+            self.assertEqual(tables, ngrams.split_orders(counts) + (total, ))
+            S = FinnSeg(ngram_file=slim)
+            self.assertEqual(S.segment('kuukautta'), 'kuu=kautta')
+
+        finally:
+            shutil.rmtree(directory)
+
+    def test_morfessor(self):
+        # ensure that the Morfessor pipeline drops foreign types, reports
+        # each stage, is reproducible, and writes a compiled lexicon that
+        # segments as the binary model does
+        import io
+        import os
+        import shutil
+        import tempfile
+
+        from finnsyll import FinnSeg, train
+        from finnsyll.syllabifier import (
+            NGRAM_FILE,
+            TRAINING_FILE,
+            load_morfessor,
+            )
+        from finnsyll.tables import Morphs, compile_lexicon
+
+        directory = tempfile.mkdtemp()
+
+        try:
+            corpus = os.path.join(directory, 'corpus.txt')
+            output = os.path.join(directory, 'morfessor.bin')
+
+            with io.open(TRAINING_FILE, encoding='utf-8') as f:
+                words = f.read().split()[:1000]
+
+            with io.open(corpus, 'w', encoding='utf-8') as f:
+                f.write(' '.join(words + ['Kuukautta', 'kuukautta', 'york']))
+
+            model, report = train.train_morfessor(
+                [corpus], output, processes=2, sample=300, max_epochs=2,
+                chunk_size=2000)
+            self.assertEqual(
+                [r['stage'] for r in report],
+                ['count', 'filter', 'sample', 'train', 'write'])
+            self.assertLess(report[1]['items'], report[0]['items'])
+            self.assertEqual(report[2]['items'], 300)
+
+            again, _ = train.train_morfessor(
+                [corpus], os.path.join(directory, 'again.bin'), processes=1,
+                sample=300, max_epochs=2)
+            self.assertEqual(compile_lexicon(again), compile_lexicon(model))
+
+            model, _ = train.train_morfessor(
+                [corpus], output, processes=1, min_count=2, max_epochs=1)
+            compounds = set(model.get_compounds())
+            self.assertIn('kuukautta', compounds)
+            self.assertNotIn('york', compounds)
+
+            lexicon_file = os.path.join(directory, 'morfessor.lexicon')
+            binary = load_morfessor(output)
+            lexicon = load_morfessor(lexicon_file)
+            self.assertIsInstance(lexicon, Morphs)
+
+            for word in words:
+                self.assertEqual(
+                    lexicon.viterbi_segment(word.lower()),
+                    binary.viterbi_segment(word.lower()),
+                    )
+
+            S = FinnSeg(morfessor_file=lexicon_file, ngram_file=NGRAM_FILE)
+            self.assertTrue(S.segment('kuukautta'))
+
+        finally:
+            shutil.rmtree(directory)